@@ -37,6 +37,18 @@
 
 #define XRP_INT_COUNT_REG  0x30
 
+/* Interrupt event log */
+#define XRP_INT_EVENT_WRITE_COUNT_REG 0x324
+
+#define XRP_INT_EVENT_READ_COUNT_REG  0x328
+
+#define XRP_INT_EVENT_LOST_REG        0x32C
+
+/* window of XRP_INT_EVENT_DEPTH records of 4 words: source, timestamp (low),
+   timestamp (high), switch state */
+#define XRP_INT_EVENT_WINDOW          0x1000
+#define XRP_INT_EVENT_DEPTH           256
+
 /* Test data source */
 #define XRP_DS_DATA_REG    0x34
 
@@ -85,6 +97,7 @@ struct xatest_device {
     struct device *dev;
     void __iomem *regs;
     struct clk *clk;
+    struct clk *pix_clk;
 };
 
 static u32 xatest_reg_read(struct xatest_device *xadev, u32 reg)
@@ -245,6 +258,9 @@ static void xatest_ill_reg_write(struct xatest_device *xadev)
     iowrite32(0, (u8 __iomem *) xadev->regs + 0x100);
 }
 
+/* number of events dropped because the read buffer was full */
+static u32 int_event_overrun;
+
 /* Inspect hardware registers from userspace (intended for debugging only) */
 static int xatest_sr_read(struct xatest_device *xadev, u32 reg, u32 *val)
 {
@@ -270,14 +286,27 @@ static int xatest_sr_read(struct xatest_device *xadev, u32 reg, u32 *val)
         case XASR_MEM_B_COUNT:
             *val = ioread32(xadev->regs + XRP_MEM_B_COUNT_REG);
             return 0;
+        case XASR_INT_EVENT_LOST:
+            *val = ioread32(xadev->regs + XRP_INT_EVENT_LOST_REG);
+            return 0;
+        case XASR_INT_EVENT_OVERRUN:
+            *val = READ_ONCE(int_event_overrun);
+            return 0;
         default:
             dev_warn(xadev->dev, "attempted to read unknown special register");
             return -EINVAL;
     }
 }
 
+/* number of records read from the interrupt event log */
+static u32 int_event_read_count;
+
 static void xatest_enable_interrupt(struct xatest_device *xadev)
 {
+    /* skip old records in the event log */
+    int_event_read_count = ioread32(xadev->regs + XRP_INT_EVENT_WRITE_COUNT_REG);
+    iowrite32(int_event_read_count, xadev->regs + XRP_INT_EVENT_READ_COUNT_REG);
+
     iowrite32(XRP_INT_ENABLE_REG__INT_ENABLE, xadev->regs + XRP_INT_ENABLE_REG);
 }
 
@@ -440,25 +469,41 @@ static struct xatest_circ_buf event_buf = {
 static irqreturn_t xatest_inttest_isr(int irq, void *dev_id)
 {
     struct xatest_device *xadev = (struct xatest_device *) dev_id;
-    u32 swdata, timestamp;
+    u32 records[XATEST_CIRC_BUF_SIZE][4];
+    u32 write_count, slot, n, i;
     int tail;
 
     spin_lock(&inttest_irq_lock);
     /* acknowledge interrupt to hardware */
     iowrite32(XRP_INT_STATUS_REG__INT_PENDING, xadev->regs + XRP_INT_STATUS_REG);
 
-    swdata = ioread32(xadev->regs + XRP_SW_STATE_REG);
-    timestamp = ioread32(xadev->regs + XRP_TIMER_REG);
-
-    tail = READ_ONCE(event_buf.tail);
-    if(CIRC_SPACE(event_buf.head, tail, XATEST_CIRC_BUF_SIZE) >= 1) {
-        event_buf.data[event_buf.head].swdata = swdata;
-        event_buf.data[event_buf.head].timestamp = timestamp;
-        smp_store_release(&event_buf.head, (event_buf.head+1)&(XATEST_CIRC_BUF_SIZE-1));
-        wake_up_interruptible(&int_event_queue);
-    } else {
-        /* buffer overrun, data lost */
+    /* drain the event log: the gateware recorded the switch state and the
+       timer at the time of each event, read all new records in bursts */
+    write_count = ioread32(xadev->regs + XRP_INT_EVENT_WRITE_COUNT_REG);
+    while(write_count != int_event_read_count) {
+        slot = int_event_read_count & (XRP_INT_EVENT_DEPTH-1);
+        n = min3(write_count - int_event_read_count, XRP_INT_EVENT_DEPTH - slot, (u32) XATEST_CIRC_BUF_SIZE);
+        memcpy_fromio(records, xadev->regs + XRP_INT_EVENT_WINDOW + 16*slot, 16*n);
+        int_event_read_count += n;
+
+        for(i = 0; i < n; i++) {
+            tail = READ_ONCE(event_buf.tail);
+            if(CIRC_SPACE(event_buf.head, tail, XATEST_CIRC_BUF_SIZE) >= 1) {
+                event_buf.data[event_buf.head].swdata = records[i][3];
+                event_buf.data[event_buf.head].timestamp = records[i][1];
+                event_buf.data[event_buf.head].timestamp_hi = records[i][2];
+                event_buf.data[event_buf.head].source = records[i][0];
+                smp_store_release(&event_buf.head, (event_buf.head+1)&(XATEST_CIRC_BUF_SIZE-1));
+            } else {
+                /* buffer overrun, data lost */
+                WRITE_ONCE(int_event_overrun, int_event_overrun + 1);
+                dev_warn_ratelimited(xadev->dev, "interrupt event buffer overrun");
+            }
+        }
     }
+    iowrite32(int_event_read_count, xadev->regs + XRP_INT_EVENT_READ_COUNT_REG);
+    wake_up_interruptible(&int_event_queue);
+
     spin_unlock(&inttest_irq_lock);
     return IRQ_HANDLED;
 }
@@ -727,6 +772,7 @@ static int __init xatest_probe(struct platform_device *pdev)
     int irq;
     struct resource *res;
     struct clk *clk;
+    struct clk *pix_clk;
 
     /* only one device is supported */
     if(xatest_dev.dev)
@@ -748,7 +794,7 @@ static int __init xatest_probe(struct platform_device *pdev)
     if(IS_ERR(xatest_dev.regs))
         return PTR_ERR(xatest_dev.regs);
 
-    clk = devm_clk_get(&pdev->dev, NULL);
+    clk = devm_clk_get(&pdev->dev, "clk");
     if(IS_ERR(clk)) {
         dev_err(&pdev->dev, "failed to get clock");
         return PTR_ERR(clk);
@@ -769,34 +815,56 @@ static int __init xatest_probe(struct platform_device *pdev)
 
     dev_info(&pdev->dev, "fclk0 set to %ld Hz", clk_get_rate(clk));
 
+    pix_clk = devm_clk_get(&pdev->dev, "pix_clk");
+    if(IS_ERR(pix_clk)) {
+        dev_err(&pdev->dev, "failed to get pixel clock");
+        ret = PTR_ERR(pix_clk);
+        goto out;
+    }
+
+    ret = clk_set_rate(pix_clk, 50000000);
+    if(ret != 0) {
+        dev_err(&pdev->dev, "failed to set pixel clock rate");
+        goto out;
+    }
+
+    ret = clk_prepare_enable(pix_clk);
+    if(ret != 0) {
+        dev_err(&pdev->dev, "failed to enable pixel clock");
+        goto out;
+    }
+    xatest_dev.pix_clk = pix_clk;
+
+    dev_info(&pdev->dev, "fclk1 set to %ld Hz", clk_get_rate(pix_clk));
+
     irq = platform_get_irq(pdev, 0);
     if(irq <= 0) {
         ret = -ENXIO;
-        goto out;
+        goto out_pix_clk;
     }
 
     ret = devm_request_irq(&pdev->dev, irq, xatest_inttest_isr, 0, dev_name(&pdev->dev), &xatest_dev);
     if(ret != 0) {
         dev_err(&pdev->dev, "failed to register test interrupt");
-        goto out;
+        goto out_pix_clk;
     }
 
     irq = platform_get_irq(pdev, 1);
     if(irq <= 0) {
         ret = -ENXIO;
-        goto out;
+        goto out_pix_clk;
     }
 
     ret = devm_request_irq(&pdev->dev, irq, xatest_dma_isr, 0, dev_name(&pdev->dev), &xatest_dev);
     if(ret != 0) {
         dev_err(&pdev->dev, "failed to register DMA interrupt");
-        goto out;
+        goto out_pix_clk;
     }
 
     ret = misc_register(&xatest_dev.miscdev);
     if(ret != 0) {
         dev_err(&pdev->dev, "failed to register misc device");
-        goto out;
+        goto out_pix_clk;
     }
 
     xatest_enable_interrupt(&xatest_dev);
@@ -805,6 +873,8 @@ static int __init xatest_probe(struct platform_device *pdev)
 
     return 0;
 
+out_pix_clk:
+    clk_disable_unprepare(pix_clk);
 out:
     clk_disable_unprepare(clk);
 
@@ -815,6 +885,7 @@ static int xatest_remove(struct platform_device *pdev)
 {
     xatest_disable_interrupt(&xatest_dev);
     misc_deregister(&xatest_dev.miscdev);
+    clk_disable_unprepare(xatest_dev.pix_clk);
     clk_disable_unprepare(xatest_dev.clk);
     xatest_dev.dev = NULL;
     xatest_dev.miscdev.parent = NULL;
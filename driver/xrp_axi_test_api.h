@@ -46,6 +46,10 @@ struct xatest_sr_read_arg {
 #define XASR_MEM_AW_COUNT 5
 #define XASR_MEM_W_COUNT  6
 #define XASR_MEM_B_COUNT  7
+/* events dropped by the gateware event log (log full) */
+#define XASR_INT_EVENT_LOST    8
+/* events dropped by the driver (read buffer full) */
+#define XASR_INT_EVENT_OVERRUN 9
 
 #define XAIOC_READ           _IOWR('t', 0, struct xatest_read_arg)
 #define XAIOC_WRITE          _IOW('t', 1, struct xatest_write_arg)
@@ -62,6 +66,8 @@ struct xatest_sr_read_arg {
 struct xatest_event {
     __u32 swdata;
     __u32 timestamp;
+    __u32 timestamp_hi;
+    __u32 source;
 };
 
 #endif
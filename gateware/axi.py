@@ -23,8 +23,16 @@ class AXI3Burst(IntEnum):
     WRAP  = 0b10
 
 class AXI3Layout(Layout):
-    def __init__(self, id_bits=12, data_bits=32):
-        super().__init__([
+    def __init__(self, id_bits=12, data_bits=32, user_bits=0):
+        # Note: AWUSER/ARUSER are not part of AXI3, but are provided by some
+        # ports (e.g. the ACP port of the Zynq PS). They are only included if
+        # user_bits > 0.
+        if user_bits > 0:
+            user_fields = [ ("awuser", user_bits), ("aruser", user_bits) ]
+        else:
+            user_fields = []
+
+        super().__init__(user_fields + [
             # clock and reset
             ("aclk", 1),
             ("areset_n", 1),
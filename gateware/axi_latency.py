@@ -0,0 +1,189 @@
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+
+class AXIWriteLatency_ControlReg:
+    """AXI write latency: control register
+
+    Bit 12-8: BIN_SHIFT. Width of each histogram bin is 2**BIN_SHIFT clock
+              cycles (default: 3, i.e. 8 cycles).
+    Bit 1: FROM_WLAST. 0: measure from the write address (default). 1:
+           measure from the last write data beat of each burst.
+    Bit 0: CLEAR. Write 1 to clear all statistics (reads as 0).
+
+    BIN_SHIFT and FROM_WLAST should be changed together with CLEAR and only
+    while no burst is in flight.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._bin_shift = Signal(5, reset=3)
+        self._from_wlast = Signal()
+
+class AXIWriteLatency_CountReg:
+    """AXI write latency: count register (read-only)
+
+    Number of write bursts measured since the last CLEAR.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriteLatency_SumReg:
+    """AXI write latency: sum register (read-only)
+
+    Sum of the latencies (in clock cycles) of all bursts measured since the
+    last CLEAR. The mean latency is sum register / count register.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriteLatency_MinReg:
+    """AXI write latency: minimum register (read-only)
+
+    Lowest latency (in clock cycles) since the last CLEAR. 0xFFFFFFFF if no
+    burst has been measured.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriteLatency_MaxReg:
+    """AXI write latency: maximum register (read-only)
+
+    Highest latency (in clock cycles) since the last CLEAR.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriteLatency_BinReg:
+    """AXI write latency: histogram bin register (read-only)
+
+    Bin i: number of bursts since the last CLEAR with a latency from
+    i*2**BIN_SHIFT to (i+1)*2**BIN_SHIFT-1 clock cycles. The last bin also
+    counts all longer latencies.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriteLatency(Elaboratable):
+    """AXI write latency
+
+    Measures the latency of write bursts on an AXI bus: the number of clock
+    cycles from the acceptance of the write address to the acceptance of the
+    write response. This includes the time until all write data has been
+    transferred, which may be long if the master issues write addresses
+    ahead of the data. Alternatively (FROM_WLAST), the latency is measured
+    from the acceptance of the last write data beat, which shows how long
+    the slave (e.g. the memory controller) takes to respond.
+
+    The time at which each burst starts is stored in a FIFO and taken out
+    again when the matching write response arrives. This requires that write
+    responses arrive in the same order as the write addresses, which is the
+    case if all bursts use the same ID (as does the AXI writer).
+
+    The results are collected in a histogram and as minimum, maximum and
+    sum (for the mean).
+
+    axi_bus -- AXI bus to observe.
+    max_outstanding -- maximum number of outstanding bursts on the bus. Must
+        be at least the number of outstanding bursts allowed by the master.
+    n_bins -- number of histogram bins.
+    """
+    def __init__(self, axi_bus, max_outstanding=16, n_bins=8):
+        self.bus = axi_bus
+        self.max_outstanding = max_outstanding
+        self.n_bins = n_bins
+
+        # Registers
+        self.control_reg = AXIWriteLatency_ControlReg()
+        self.count_reg = AXIWriteLatency_CountReg()
+        self.sum_reg = AXIWriteLatency_SumReg()
+        self.min_reg = AXIWriteLatency_MinReg()
+        self.max_reg = AXIWriteLatency_MaxReg()
+        self.bin_regs = [ AXIWriteLatency_BinReg() for _ in range(0, n_bins) ]
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # Control register logic
+        clear = Signal()
+        m.d.comb += clear.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0])
+
+        with m.If(self.control_reg.wstrb_in[0]):
+            m.d.sync += self.control_reg._from_wlast.eq(self.control_reg.data_in[1])
+        with m.If(self.control_reg.wstrb_in[1]):
+            m.d.sync += self.control_reg._bin_shift.eq(self.control_reg.data_in[8:13])
+
+        m.d.comb += self.control_reg.data_out.eq(Cat(Const(0, 1), self.control_reg._from_wlast, Const(0, 6),
+                                                     self.control_reg._bin_shift, Const(0, 19)))
+
+        # Start times of bursts (write address or last write data beat accepted)
+        timer = Signal(32)
+        m.d.sync += timer.eq(timer + 1)
+
+        ts_fifo = SyncFIFO(width=32, depth=self.max_outstanding)
+        m.submodules.ts_fifo = ts_fifo
+
+        m.d.comb += ts_fifo.w_data.eq(timer)
+        with m.If(self.control_reg._from_wlast):
+            m.d.comb += ts_fifo.w_en.eq(self.bus.wvalid & self.bus.wready & self.bus.wlast)
+        with m.Else():
+            m.d.comb += ts_fifo.w_en.eq(self.bus.awvalid & self.bus.awready)
+        m.d.comb += ts_fifo.r_en.eq(self.bus.bvalid & self.bus.bready)
+
+        # Latency of the burst whose write response is accepted (registered)
+        sample_valid = Signal()
+        latency = Signal(32)
+
+        m.d.sync += sample_valid.eq(ts_fifo.r_en & ts_fifo.r_rdy)
+        m.d.sync += latency.eq(timer - ts_fifo.r_data)
+
+        # Statistics
+        count = Signal(32)
+        lat_sum = Signal(32)
+        lat_min = Signal(32, reset=0xFFFFFFFF)
+        lat_max = Signal(32)
+        bins = Array([ Signal(32, name="bin%d" % i) for i in range(0, self.n_bins) ])
+
+        m.d.comb += self.count_reg.data_out.eq(count)
+        m.d.comb += self.sum_reg.data_out.eq(lat_sum)
+        m.d.comb += self.min_reg.data_out.eq(lat_min)
+        m.d.comb += self.max_reg.data_out.eq(lat_max)
+        for i in range(0, self.n_bins):
+            m.d.comb += self.bin_regs[i].data_out.eq(bins[i])
+
+        bin_index = Signal(range(self.n_bins))
+        lat_scaled = Signal(32)
+        m.d.comb += lat_scaled.eq(latency >> self.control_reg._bin_shift)
+        with m.If(lat_scaled >= self.n_bins - 1):
+            m.d.comb += bin_index.eq(self.n_bins - 1)
+        with m.Else():
+            m.d.comb += bin_index.eq(lat_scaled)
+
+        with m.If(clear):
+            m.d.sync += count.eq(0)
+            m.d.sync += lat_sum.eq(0)
+            m.d.sync += lat_min.eq(0xFFFFFFFF)
+            m.d.sync += lat_max.eq(0)
+            for i in range(0, self.n_bins):
+                m.d.sync += bins[i].eq(0)
+        with m.Elif(sample_valid):
+            m.d.sync += count.eq(count + 1)
+            m.d.sync += lat_sum.eq(lat_sum + latency)
+            with m.If(latency < lat_min):
+                m.d.sync += lat_min.eq(latency)
+            with m.If(latency > lat_max):
+                m.d.sync += lat_max.eq(latency)
+            m.d.sync += bins[bin_index].eq(bins[bin_index] + 1)
+
+        return m
@@ -0,0 +1,277 @@
+from nmigen import *
+from axi import AXI3Response, AXI3Burst, AXI3Prot
+from int_ctrl import IntCoalescer
+
+class AXIReader_AddrReg:
+    """AXI reader: address register
+
+    Start address for DMA transaction. Must be 64 bit aligned. Therefore, the 3 lowest bits are forced to zero.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(29)
+
+class AXIReader_CountReg:
+    """AXI reader: count register
+
+    Contains number of 64 bit words to transfer MINUS 1, i.e. set count register = 0 to transfer one word.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class AXIReader_StatusReg:
+    """AXI reader: status register (read-only)
+
+    Bit 10, 9: AXI response.
+    Bit 8: ERROR. Set if an AXI error occured.
+    Bit 0: BUSY. 1: DMA in progress.
+
+    If an error response (0b10, SLVERR or 0b11, DECERR) is received during DMA,
+    the ERROR bit is set and the AXI response bits record the response
+    received. Further errors will not update the AXI reponse bits, i.e. they
+    contain the first error received in case of multiple errors. The ERROR bit
+    and the AXI response bits are automatically cleared on DMA start. The data
+    received with an error response is still put into the FIFO.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIReader_ControlReg:
+    """AXI reader: control register (write-only)
+
+    Bit 0: START. Write 1 to start DMA transaction.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIReader_ConfigReg:
+    """AXI reader: configuration register
+
+    Bit 0: INT_ENABLE. Set to 1 to enable interrupt once DMA transaction is completed.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIReader_IntStatusReg:
+    """AXI reader: interrupt status register
+
+    Bit 0: INT_PENDING. 1: A completion interrupt is pending. Write 1 to clear.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIReader(Elaboratable):
+    """AXI reader
+
+    Reads 64 bit words from main memory and puts them into the FIFO.
+
+    START reads count register + 1 words from the address given in the address
+    register. Bursts are split in the same way as in the AXI writer (see
+    there). Read data is accepted as long as the FIFO has room, i.e. at one
+    word per cycle if the FIFO is emptied at the same rate.
+
+    If INT_ENABLE is set, the completion interrupt is raised once all data has
+    been received. Completion events can be coalesced into fewer interrupts
+    (see IntCoalescer).
+
+    The write channels of the AXI bus are not used.
+
+    max_outstanding -- maximum number of bursts issued on the read address
+        channel for which the last read data beat has not been received yet.
+    """
+    def __init__(self, axi_bus, fifo, max_outstanding=8):
+        self.bus = axi_bus
+        self.max_outstanding = max_outstanding
+
+        # Interrupt coalescing
+        self._coalescer = IntCoalescer()
+
+        # Registers
+        self.addr_reg = AXIReader_AddrReg()
+        self.count_reg = AXIReader_CountReg()
+        self.status_reg = AXIReader_StatusReg()
+        self.control_reg = AXIReader_ControlReg()
+        self.config_reg = AXIReader_ConfigReg()
+        self.int_status_reg = AXIReader_IntStatusReg()
+        self.int_coalesce_count_reg = self._coalescer.count_reg
+        self.int_coalesce_time_reg = self._coalescer.time_reg
+        self.int_coalesce_merged_reg = self._coalescer.merged_reg
+
+        # Data FIFO
+        self.fifo = fifo
+
+        # Interrupt output
+        self.int_out = Signal()
+
+    def elaborate(self, platform):
+        # Implementation note: bursts are issued on the read address channel
+        # as long as fewer than max_outstanding bursts are in flight. Each
+        # burst is as long as the distance to the next 128 byte boundary,
+        # limited by the number of words remaining, so bursts never cross a
+        # 4 KiB address boundary (see the AXI writer for details).
+        # The read data channel is only throttled by the FIFO.
+
+        m = Module()
+
+        start = Signal()
+        busy = Signal()
+        error = Signal()
+        error_resp = Signal(2)
+        int_enable = Signal()
+        int_pending = Signal()
+        addr_reg_data = Signal(32)
+
+        # Address register logic
+        # Note that the lowest 3 bits of the address are always zero (64 bit
+        # alignment), and self.addr_reg._data therefore stores only the upper
+        # 29 bits. Writes to the lowest 3 bits of the address register are
+        # ignored.
+        with m.If(self.addr_reg.wstrb_in[0] == 1):
+            m.d.sync += self.addr_reg._data[0:5].eq(self.addr_reg.data_in[3:8])
+        for i in range(1, 4):
+            with m.If(self.addr_reg.wstrb_in[i] == 1):
+                m.d.sync += self.addr_reg._data[8*i-3:8*(i+1)-3].eq(self.addr_reg.data_in[8*i:8*(i+1)])
+
+        m.d.comb += addr_reg_data.eq(Cat(Const(0, 3), self.addr_reg._data))
+
+        m.d.comb += self.addr_reg.data_out.eq(addr_reg_data)
+
+        # Count register logic
+        for i in range(0, 4):
+            with m.If(self.count_reg.wstrb_in[i] == 1):
+                m.d.sync += self.count_reg._data[8*i:8*(i+1)].eq(self.count_reg.data_in[8*i:8*(i+1)])
+
+        m.d.comb += self.count_reg.data_out.eq(self.count_reg._data)
+
+        # Status register logic
+        m.d.comb += self.status_reg.data_out.eq(Cat(busy, Const(0, 7), error, error_resp, Const(0, 21)))
+
+        # Control register logic
+        m.d.comb += start.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0] & ~busy)
+        m.d.comb += self.control_reg.data_out.eq(0)
+
+        # Config register logic
+        with m.If(self.config_reg.wstrb_in[0]):
+            m.d.sync += int_enable.eq(self.config_reg.data_in[0])
+
+        m.d.comb += self.config_reg.data_out.eq(Cat(int_enable, Const(0, 31)))
+
+        # Burst generator (read address channel)
+        gen_active = Signal()
+        gen_addr = Signal(32)
+        gen_n = Signal(33)
+
+        # number of bursts issued for which the last beat has not been received
+        n_bursts = Signal(range(self.max_outstanding+1))
+
+        # number of 64-bit words to 128 byte boundary
+        n_to_128 = Signal(5)
+        m.d.comb += n_to_128.eq((0x80 - gen_addr[0:7]) >> 3)
+
+        burst_words = Signal(5)
+        with m.If(gen_n < n_to_128):
+            m.d.comb += burst_words.eq(gen_n)
+        with m.Else():
+            m.d.comb += burst_words.eq(n_to_128)
+
+        burst_last = Signal()
+        m.d.comb += burst_last.eq(gen_n == burst_words)
+
+        ar_free = Signal()
+        m.d.comb += ar_free.eq((self.bus.arvalid == 0) | (self.bus.arready == 1))
+
+        issue = Signal()
+        m.d.comb += issue.eq(gen_active & ar_free & (n_bursts < self.max_outstanding))
+
+        with m.If(start):
+            m.d.sync += gen_active.eq(1)
+            m.d.sync += gen_addr.eq(addr_reg_data)
+            # NOTE: count register is number of 64-bit words to transfer MINUS 1
+            m.d.sync += gen_n.eq(self.count_reg._data + 1)
+        with m.Elif(issue):
+            m.d.sync += gen_addr.eq(gen_addr + (burst_words << 3))
+            m.d.sync += gen_n.eq(gen_n - burst_words)
+            with m.If(burst_last):
+                m.d.sync += gen_active.eq(0)
+
+        with m.If(issue):
+            m.d.sync += self.bus.araddr.eq(gen_addr)
+            m.d.sync += self.bus.arlen.eq(burst_words-1)
+            m.d.sync += self.bus.arvalid.eq(1)
+        with m.Elif(ar_free):
+            m.d.sync += self.bus.arvalid.eq(0)
+
+        m.d.comb += self.bus.arid.eq(0)
+        m.d.comb += self.bus.arsize.eq(3)
+        m.d.comb += self.bus.arburst.eq(AXI3Burst.INCR)
+        m.d.comb += self.bus.arlock.eq(0)
+
+        # ARCACHE: normal non-cacheable non-bufferable
+        m.d.comb += self.bus.arcache.eq(0b0010)
+
+        m.d.comb += self.bus.arprot.eq(AXI3Prot.UNPRIV | AXI3Prot.SECURE | AXI3Prot.DATA)
+        m.d.comb += self.bus.arqos.eq(0)
+
+        # Read data channel
+        r_last = Signal()
+
+        m.d.comb += self.bus.rready.eq(self.fifo.w_rdy)
+        m.d.comb += self.fifo.w_data.eq(self.bus.rdata)
+        m.d.comb += self.fifo.w_en.eq(self.bus.rvalid & self.bus.rready)
+        m.d.comb += r_last.eq(self.bus.rvalid & self.bus.rready & self.bus.rlast)
+
+        with m.If(issue & ~r_last):
+            m.d.sync += n_bursts.eq(n_bursts + 1)
+        with m.Elif(~issue & r_last):
+            m.d.sync += n_bursts.eq(n_bursts - 1)
+
+        with m.If(start):
+            m.d.sync += error.eq(0)
+            m.d.sync += error_resp.eq(0)
+
+        # Record first error response
+        with m.If((self.bus.rready == 1) & (self.bus.rvalid == 1) & (self.bus.rresp[1] == 1)):
+            m.d.sync += error.eq(1)
+            with m.If(error == 0):
+                m.d.sync += error_resp.eq(self.bus.rresp)
+
+        with m.If(gen_active | (n_bursts != 0)):
+            m.d.comb += busy.eq(1)
+        with m.Else():
+            m.d.comb += busy.eq(0)
+
+        # Interrupt logic
+        busy_delay = Signal()
+
+        m.d.sync += busy_delay.eq(busy)
+
+        m.submodules.coalescer = self._coalescer
+
+        with m.If((busy == 0) & (busy_delay == 1) & (int_enable == 1)):
+            m.d.comb += self._coalescer.event_in.eq(1)
+
+        with m.If(self.int_status_reg.data_in[0] & self.int_status_reg.wstrb_in[0]):
+            m.d.comb += self._coalescer.clear_in.eq(1)
+
+        m.d.comb += int_pending.eq(self._coalescer.pending_out)
+
+        m.d.comb += self.int_out.eq(int_pending)
+
+        m.d.comb += self.int_status_reg.data_out.eq(Cat(int_pending, Const(0, 31)))
+
+        return m
@@ -1,4 +1,5 @@
 from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
 from axi import AXI3Response, AXI3Burst
 
 class Register_RO(Elaboratable):
@@ -35,140 +36,404 @@ class Register_RW(Elaboratable):
 
         return m
 
+class MemoryWindow:
+    """Memory window: block RAM in the address space of a register bank
+
+    Bulk data (e.g. lookup tables or descriptors) is stored in a Memory
+    instead of registers. The register bank writes it with byte strobes and
+    reads it through a synchronous read port, one beat per cycle in both
+    directions, with the same burst support as for registers.
+
+    The bank uses both ports of the block RAM. The gateware can read the
+    memory through a further read port of mem, but the tools will then
+    duplicate the RAM. In a window that is not writable from the bus (writes
+    are ignored), the gateware writes the memory through the inputs below,
+    e.g. data for software to read. The bank owns the write port in both
+    cases.
+
+    The memory can be wider than the bus (e.g. 128 bits for records of 4
+    words), so that the gateware reads or writes several consecutive words
+    in a single cycle. The bus accesses the words of a memory row in order of
+    increasing address.
+
+    depth -- number of 32 bit words (power of 2).
+    init -- initial content (list of memory rows).
+    writable -- False if the window is read-only on the bus.
+    width -- width of the memory (32 bits times a power of 2).
+
+    Inputs (only if not writable):
+    w_addr_in -- memory row to write.
+    w_data_in -- data to write (a whole memory row).
+    w_en_in -- 1 to write.
+    """
+    def __init__(self, depth, init=None, writable=True, width=32):
+        if depth < 1 or depth & (depth-1) != 0:
+            raise ValueError("depth must be a power of 2")
+        words = width // 32
+        if width % 32 != 0 or words & (words-1) != 0 or words > depth:
+            raise ValueError("width must be 32 bits times a power of 2 (at most depth)")
+
+        self.depth = depth
+        self.writable = writable
+        self.words = words
+        self.mem = Memory(width=width, depth=depth//words, init=init)
+
+        if not writable:
+            self.w_addr_in = Signal(range(depth//words))
+            self.w_data_in = Signal(width)
+            self.w_en_in = Signal()
+
+    def __len__(self):
+        return self.depth
+
 class AXIRegBank(Elaboratable):
-    def __init__(self, axi_bus, regs, base_addr):
+    """AXI register bank
+
+    Maps 32 bit registers into the address space of an AXI slave. The
+    registers are grouped into regions. Each region decodes only its own
+    address bits (comparing the upper address bits with a constant) and has
+    its own registered read mux, so the decode logic stays shallow for large
+    register maps. Accesses outside of all regions get a DECERR response.
+
+    axi_bus -- AXI bus (gateware is slave).
+    regs -- register map. Either a list of registers at consecutive addresses
+        starting at base_addr, or a list of (offset, regs) pairs, each a list
+        of registers at consecutive addresses starting at base_addr + offset,
+        or a MemoryWindow (which forms a single region of its own).
+    base_addr -- base address of the register map.
+    region_size -- maximum number of registers per region (power of 2).
+        Longer lists of registers are split into several regions. A region
+        of n registers must start at an address that is a multiple of 4
+        times n (rounded up to a power of 2).
+    ar_queue_depth -- number of read addresses that can be queued.
+    """
+    def __init__(self, axi_bus, regs, base_addr, region_size=32, ar_queue_depth=2):
+        if region_size < 1 or region_size & (region_size-1) != 0:
+            raise ValueError("region_size must be a power of 2")
+
         self.bus = axi_bus
-        self.regs = Array(regs)
         self.base_addr = base_addr
+        self.region_size = region_size
+        self.ar_queue_depth = ar_queue_depth
+
+        if len(regs) > 0 and not isinstance(regs[0], tuple):
+            regs = [ (0, regs) ]
+
+        # Regions: (address, address bits decoded in the region, registers)
+        self.regions = []
+        for (offset, region_regs) in regs:
+            if isinstance(region_regs, MemoryWindow):
+                chunks = [ (0, region_regs) ]
+            else:
+                chunks = [ (i, region_regs[i:i+region_size]) for i in range(0, len(region_regs), region_size) ]
+            for (i, chunk) in chunks:
+                addr = base_addr + offset + 4*i
+                bits = max(2, (4*len(chunk)-1).bit_length())
+                if addr % (1 << bits) != 0:
+                    raise ValueError("region at 0x%08x is not aligned to its size" % addr)
+                for (other_addr, other_bits, other_regs) in self.regions:
+                    if addr < other_addr + 4*len(other_regs) and other_addr < addr + 4*len(chunk):
+                        raise ValueError("region at 0x%08x overlaps region at 0x%08x" % (addr, other_addr))
+                self.regions.append((addr, bits, chunk))
+
+        self.regs = [ reg for (_, _, region_regs) in self.regions if not isinstance(region_regs, MemoryWindow)
+                      for reg in region_regs ]
 
     def elaborate(self, platform):
         m = Module()
 
+        active = Signal()
+
+        with m.If(self.bus.areset_n == 0):
+            m.d.sync += active.eq(0)
+        with m.Else():
+            m.d.sync += active.eq(1)
+
         # Write handling
+        #
+        # The write path is pipelined: AW and the first W beat are accepted in
+        # the same cycle, and the address of the next burst is accepted with
+        # the last W beat of the current one. The write response is held in
+        # bvalid/bid/bresp while the next burst proceeds; only the last W beat
+        # of a burst has to wait until the response register is free. A
+        # stream of single-beat writes therefore takes one cycle per write.
+        #
+        # aw_pending is set when an address has been accepted, but its burst
+        # has not been completed yet. Otherwise, the address is taken directly
+        # from the bus.
+        aw_pending = Signal()
+        awid = Signal(self.bus.awid.shape())
         awaddr = Signal(self.bus.awaddr.shape())
         awsize = Signal(self.bus.awsize.shape())
         w_wrap_mask = Signal(self.bus.awaddr.shape())
-
-        for i in range(0, len(self.regs)):
-            for j in range(0, 4):
-                m.d.comb += self.regs[i].data_in.eq(self.bus.wdata)
-                m.d.comb += self.regs[i].wstrb_in[j].eq(0)
-
-        with m.FSM(reset="RESET"):
-            with m.State("RESET"):
-                with m.If(self.bus.areset_n == 1):
-                    m.next = "WAIT_ADDR"
-
-            with m.State("WAIT_ADDR"):
-                with m.If(self.bus.areset_n == 0):
-                    m.next = "RESET"
-                with m.Elif(self.bus.awvalid == 1):
-                    m.d.sync += awaddr.eq(self.bus.awaddr)
-                    m.d.sync += awsize.eq(self.bus.awsize)
-
-                    with m.If(self.bus.awburst == AXI3Burst.FIXED):
-                        m.d.sync += w_wrap_mask.eq(0)
-                    with m.Elif(self.bus.awburst == AXI3Burst.INCR):
-                        m.d.sync += w_wrap_mask.eq(~0)
-                    with m.Else():  # AXI3Burst.WRAP
-                        # The AXI spec guarantees that awlen+1 will be a power of 2 for wrapping bursts.
-                        m.d.sync += w_wrap_mask.eq(((self.bus.awlen+1) << (self.bus.awsize))-1)
-
-                    m.d.sync += self.bus.bresp.eq(AXI3Response.OKAY)
-                    m.d.sync += self.bus.bid.eq(self.bus.awid)
-                    m.d.sync += self.bus.awready.eq(1)
-                    m.d.sync += self.bus.wready.eq(1)
-                    m.next = "WAIT_DATA"
-
-            with m.State("WAIT_DATA"):
-                m.d.sync += self.bus.awready.eq(0)
-
-                with m.If(self.bus.areset_n == 0):
-                    m.d.sync += self.bus.wready.eq(0)
-                    m.next = "RESET"
-                with m.Elif(self.bus.wvalid == 1):
-                    with m.If((awaddr >= self.base_addr) & ((awaddr - self.base_addr) < 4*len(self.regs))):
-                        reg_addr = (awaddr - self.base_addr) >> 2
-                        m.d.comb += self.regs[reg_addr].wstrb_in.eq(self.bus.wstrb)
-                    with m.Else():
-                        m.d.sync += self.bus.bresp.eq(AXI3Response.DECERR)
-
-                    m.d.sync += awaddr.eq((awaddr & ~w_wrap_mask) | ((awaddr + (1<<awsize)) & w_wrap_mask))
-
-                    with m.If(self.bus.wlast == 1):
-                        m.d.sync += self.bus.wready.eq(0)
-                        m.d.sync += self.bus.bvalid.eq(1)
-                        m.next = "WAIT_RESP_READY"
-
-            with m.State("WAIT_RESP_READY"):
-                with m.If(self.bus.areset_n == 0):
-                    m.d.sync += self.bus.bvalid.eq(0)
-                    m.next = "RESET"
-                with m.Elif(self.bus.bready == 1):
-                    m.d.sync += self.bus.bvalid.eq(0)
-                    m.next = "WAIT_ADDR"
+        w_err = Signal()
+
+        bus_wrap_mask = Signal(self.bus.awaddr.shape())
+        with m.If(self.bus.awburst == AXI3Burst.FIXED):
+            m.d.comb += bus_wrap_mask.eq(0)
+        with m.Elif(self.bus.awburst == AXI3Burst.INCR):
+            m.d.comb += bus_wrap_mask.eq(~0)
+        with m.Else():  # AXI3Burst.WRAP
+            # The AXI spec guarantees that awlen+1 will be a power of 2 for wrapping bursts.
+            m.d.comb += bus_wrap_mask.eq(((self.bus.awlen+1) << (self.bus.awsize))-1)
+
+        # Burst the current W beat belongs to
+        cur_id = Signal(self.bus.awid.shape())
+        cur_addr = Signal(self.bus.awaddr.shape())
+        cur_size = Signal(self.bus.awsize.shape())
+        cur_wrap_mask = Signal(self.bus.awaddr.shape())
+        cur_err = Signal()
+        next_addr = Signal(self.bus.awaddr.shape())
+
+        with m.If(aw_pending == 1):
+            m.d.comb += cur_id.eq(awid)
+            m.d.comb += cur_addr.eq(awaddr)
+            m.d.comb += cur_size.eq(awsize)
+            m.d.comb += cur_wrap_mask.eq(w_wrap_mask)
+            m.d.comb += cur_err.eq(w_err)
+        with m.Else():
+            m.d.comb += cur_id.eq(self.bus.awid)
+            m.d.comb += cur_addr.eq(self.bus.awaddr)
+            m.d.comb += cur_size.eq(self.bus.awsize)
+            m.d.comb += cur_wrap_mask.eq(bus_wrap_mask)
+            m.d.comb += cur_err.eq(0)
+
+        m.d.comb += next_addr.eq((cur_addr & ~cur_wrap_mask) | ((cur_addr + (1<<cur_size)) & cur_wrap_mask))
+
+        # Handshakes (ready may depend on valid, but not the other way round)
+        aw_fire = Signal()
+        w_fire = Signal()
+        w_last = Signal()
+        b_free = Signal()
+
+        m.d.comb += b_free.eq((self.bus.bvalid == 0) | (self.bus.bready == 1))
+        m.d.comb += self.bus.wready.eq(active & self.bus.areset_n & (aw_pending | self.bus.awvalid) &
+                                       (b_free | ~self.bus.wlast))
+        m.d.comb += w_fire.eq(self.bus.wvalid & self.bus.wready)
+        m.d.comb += w_last.eq(w_fire & self.bus.wlast)
+        m.d.comb += self.bus.awready.eq(active & self.bus.areset_n & (~aw_pending | w_last))
+        m.d.comb += aw_fire.eq(self.bus.awvalid & self.bus.awready)
+
+        # Address decoding: region hit (upper address bits), then register
+        # within the region
+        beat_err = Signal()
+        w_hits = []
+        for (addr, bits, region_regs) in self.regions:
+            hit = Signal()
+            index = cur_addr[2:bits]
+            m.d.comb += hit.eq((cur_addr[bits:] == (addr >> bits)) & (index < len(region_regs)))
+            w_hits.append(hit)
+
+            if isinstance(region_regs, MemoryWindow):
+                if not region_regs.writable:
+                    # written by the gateware
+                    wr_port = region_regs.mem.write_port()
+                    m.submodules += wr_port
+
+                    m.d.comb += wr_port.addr.eq(region_regs.w_addr_in)
+                    m.d.comb += wr_port.data.eq(region_regs.w_data_in)
+                    m.d.comb += wr_port.en.eq(region_regs.w_en_in)
+                    continue
+
+                wr_port = region_regs.mem.write_port(granularity=8)
+                m.submodules += wr_port
+
+                # word index: low bits select the word in the memory row
+                w_bits = (region_regs.words-1).bit_length()
+                m.d.comb += wr_port.addr.eq(index[w_bits:])
+                m.d.comb += wr_port.data.eq(Repl(self.bus.wdata, region_regs.words))
+                with m.If(w_fire & hit):
+                    if w_bits == 0:
+                        m.d.comb += wr_port.en.eq(self.bus.wstrb)
+                    else:
+                        m.d.comb += wr_port.en.eq(self.bus.wstrb << Cat(Const(0, 2), index[0:w_bits]))
+                continue
+
+            for (i, reg) in enumerate(region_regs):
+                m.d.comb += reg.data_in.eq(self.bus.wdata)
+                with m.If(w_fire & hit & (index == i)):
+                    m.d.comb += reg.wstrb_in.eq(self.bus.wstrb)
+                with m.Else():
+                    m.d.comb += reg.wstrb_in.eq(0)
+
+        m.d.comb += beat_err.eq(~Cat(*w_hits).any())
+
+        with m.If(active == 0):
+            m.d.sync += aw_pending.eq(0)
+        with m.Elif(w_last == 1):
+            # burst complete; take the address of the next one, if any (if
+            # the burst came directly from the bus, aw_fire is its own
+            # address handshake)
+            with m.If((aw_pending == 1) & (aw_fire == 1)):
+                m.d.sync += aw_pending.eq(1)
+                m.d.sync += awid.eq(self.bus.awid)
+                m.d.sync += awaddr.eq(self.bus.awaddr)
+                m.d.sync += awsize.eq(self.bus.awsize)
+                m.d.sync += w_wrap_mask.eq(bus_wrap_mask)
+                m.d.sync += w_err.eq(0)
+            with m.Else():
+                m.d.sync += aw_pending.eq(0)
+        with m.Elif(w_fire == 1):
+            m.d.sync += aw_pending.eq(1)
+            m.d.sync += awid.eq(cur_id)
+            m.d.sync += awaddr.eq(next_addr)
+            m.d.sync += awsize.eq(cur_size)
+            m.d.sync += w_wrap_mask.eq(cur_wrap_mask)
+            m.d.sync += w_err.eq(cur_err | beat_err)
+        with m.Elif(aw_fire == 1):
+            m.d.sync += aw_pending.eq(1)
+            m.d.sync += awid.eq(self.bus.awid)
+            m.d.sync += awaddr.eq(self.bus.awaddr)
+            m.d.sync += awsize.eq(self.bus.awsize)
+            m.d.sync += w_wrap_mask.eq(bus_wrap_mask)
+            m.d.sync += w_err.eq(0)
+
+        # Write response
+        with m.If((active == 0) | (self.bus.areset_n == 0)):
+            m.d.sync += self.bus.bvalid.eq(0)
+        with m.Elif(w_last == 1):
+            m.d.sync += self.bus.bvalid.eq(1)
+            m.d.sync += self.bus.bid.eq(cur_id)
+            with m.If((cur_err | beat_err) == 1):
+                m.d.sync += self.bus.bresp.eq(AXI3Response.DECERR)
+            with m.Else():
+                m.d.sync += self.bus.bresp.eq(AXI3Response.OKAY)
+        with m.Elif(self.bus.bready == 1):
+            m.d.sync += self.bus.bvalid.eq(0)
 
         # Read handling
+        #
+        # Read addresses are accepted into a small queue (ar_queue), so the
+        # next address is accepted while the current burst is sent. The
+        # current burst is taken from the burst registers (r_pending) or
+        # directly from the head of the queue. Read data passes through two
+        # register stages (see below), so a stream of single-beat reads takes
+        # one cycle per read.
+        ar_queue = SyncFIFO(width=len(self.bus.arid) + 32 + 4 + 2 + 32, depth=self.ar_queue_depth)
+        m.submodules.ar_queue = ResetInserter(~self.bus.areset_n)(ar_queue)
+
+        bus_r_wrap_mask = Signal(self.bus.araddr.shape())
+        with m.If(self.bus.arburst == AXI3Burst.FIXED):
+            m.d.comb += bus_r_wrap_mask.eq(0)
+        with m.Elif(self.bus.arburst == AXI3Burst.INCR):
+            m.d.comb += bus_r_wrap_mask.eq(~0)
+        with m.Else():  # AXI3Burst.WRAP
+            # The AXI spec guarantees that arlen+1 will be a power of 2 for wrapping bursts.
+            m.d.comb += bus_r_wrap_mask.eq(((self.bus.arlen+1) << (self.bus.arsize))-1)
+
+        m.d.comb += self.bus.arready.eq(active & self.bus.areset_n & ar_queue.w_rdy)
+        m.d.comb += ar_queue.w_en.eq(self.bus.arvalid & self.bus.arready)
+        m.d.comb += ar_queue.w_data.eq(Cat(self.bus.arid, self.bus.araddr, self.bus.arlen, self.bus.arsize,
+                                           bus_r_wrap_mask))
+
+        # Burst registers (remainder of a burst taken from the queue)
+        r_pending = Signal()
         arid = Signal(self.bus.arid.shape())
         araddr = Signal(self.bus.araddr.shape())
         arlen = Signal(self.bus.arlen.shape())
         arsize = Signal(self.bus.arsize.shape())
         r_wrap_mask = Signal(self.bus.araddr.shape())
 
-        with m.FSM(reset="RESET"):
-            with m.State("RESET"):
-                with m.If(self.bus.areset_n == 1):
-                    m.d.sync += self.bus.arready.eq(1)
-                    m.next = "WAIT_VALID"
-
-            with m.State("WAIT_VALID"):
-                with m.If(self.bus.areset_n == 0):
-                    m.d.sync += self.bus.arready.eq(0)
-                    m.next = "RESET"
-                with m.Elif(self.bus.arvalid == 1):
-                    m.d.sync += arid.eq(self.bus.arid)
-                    m.d.sync += araddr.eq(self.bus.araddr)
-                    m.d.sync += arlen.eq(self.bus.arlen)
-                    m.d.sync += arsize.eq(self.bus.arsize)
-
-                    with m.If(self.bus.arburst == AXI3Burst.FIXED):
-                        m.d.sync += r_wrap_mask.eq(0)
-                    with m.Elif(self.bus.arburst == AXI3Burst.INCR):
-                        m.d.sync += r_wrap_mask.eq(~0)
-                    with m.Else():  # AXI3Burst.WRAP
-                        # The AXI spec guarantees that arlen+1 will be a power of 2 for wrapping bursts.
-                        m.d.sync += r_wrap_mask.eq(((self.bus.arlen+1) << (self.bus.arsize))-1)
-
-                    m.d.sync += self.bus.arready.eq(0)
-                    m.d.sync += self.bus.rvalid.eq(1)
-                    m.next = "SEND_DATA"
-
-            with m.State("SEND_DATA"):
-                with m.If(self.bus.areset_n == 0):
-                    m.d.sync += self.bus.rvalid.eq(0)
-                    m.next = "RESET"
-                with m.Elif(self.bus.rready == 1):
-                    with m.If(arlen == 0):
-                        m.d.sync += self.bus.rvalid.eq(0)
-                        m.d.sync += self.bus.arready.eq(1)
-                        m.next = "WAIT_VALID"
-                    with m.Else():
-                        m.d.sync += araddr.eq((araddr & ~r_wrap_mask) | ((araddr + (1<<arsize)) & r_wrap_mask))
-                        m.d.sync += arlen.eq(arlen-1)
-                        m.next = "SEND_DATA"
-
-        with m.If((araddr >= self.base_addr) & ((araddr - self.base_addr) < 4*len(self.regs))):
-            m.d.comb += self.bus.rdata.eq(self.regs[(araddr - self.base_addr) >> 2].data_out)
-            m.d.comb += self.bus.rresp.eq(AXI3Response.OKAY)
-        with m.Else():
-            m.d.comb += self.bus.rdata.eq(0xDEADBEEF)
-            m.d.comb += self.bus.rresp.eq(AXI3Response.DECERR)
-
-        m.d.comb += self.bus.rid.eq(arid)
-
-        with m.If(arlen == 0):
-            m.d.comb += self.bus.rlast.eq(1)
+        # Burst the next beat belongs to
+        cur_valid = Signal()
+        cur_id = Signal(self.bus.arid.shape())
+        cur_addr = Signal(self.bus.araddr.shape())
+        cur_len = Signal(self.bus.arlen.shape())
+        cur_size = Signal(self.bus.arsize.shape())
+        cur_wrap_mask = Signal(self.bus.araddr.shape())
+
+        with m.If(r_pending == 1):
+            m.d.comb += cur_valid.eq(1)
+            m.d.comb += Cat(cur_id, cur_addr, cur_len, cur_size, cur_wrap_mask).eq(
+                Cat(arid, araddr, arlen, arsize, r_wrap_mask))
         with m.Else():
-            m.d.comb += self.bus.rlast.eq(0)
+            m.d.comb += cur_valid.eq(ar_queue.r_rdy)
+            m.d.comb += Cat(cur_id, cur_addr, cur_len, cur_size, cur_wrap_mask).eq(ar_queue.r_data)
+
+        # Read data pipeline: r_issue reads the addressed register of each
+        # region into the region's read register (stage 1); the output
+        # register then selects the region that was hit (stage 2). Both
+        # stages advance together whenever the output register is free or
+        # being emptied.
+        r_advance = Signal()
+        m.d.comb += r_advance.eq((self.bus.rvalid == 0) | (self.bus.rready == 1))
+
+        s1_valid = Signal()
+        s1_id = Signal(self.bus.arid.shape())
+        s1_last = Signal()
+
+        r_issue = Signal()
+        m.d.comb += r_issue.eq(active & cur_valid & ((s1_valid == 0) | r_advance))
+        m.d.comb += ar_queue.r_en.eq(r_issue & ~r_pending)
+
+        with m.If(active == 0):
+            m.d.sync += r_pending.eq(0)
+        with m.Elif(r_issue == 1):
+            with m.If(cur_len == 0):
+                m.d.sync += r_pending.eq(0)
+            with m.Else():
+                m.d.sync += r_pending.eq(1)
+                m.d.sync += arid.eq(cur_id)
+                m.d.sync += araddr.eq((cur_addr & ~cur_wrap_mask) | ((cur_addr + (1<<cur_size)) & cur_wrap_mask))
+                m.d.sync += arlen.eq(cur_len-1)
+                m.d.sync += arsize.eq(cur_size)
+                m.d.sync += r_wrap_mask.eq(cur_wrap_mask)
+
+        r_hits = []
+        r_data = []
+        for (addr, bits, region_regs) in self.regions:
+            hit = Signal()
+            data = Signal(32)
+            index = cur_addr[2:bits]
+            with m.If(r_issue == 1):
+                m.d.sync += hit.eq((cur_addr[bits:] == (addr >> bits)) & (index < len(region_regs)))
+
+            if isinstance(region_regs, MemoryWindow):
+                # the read port of the block RAM is the read register
+                rd_port = region_regs.mem.read_port(transparent=False)
+                m.submodules += rd_port
+
+                w_bits = (region_regs.words-1).bit_length()
+                m.d.comb += rd_port.addr.eq(index[w_bits:])
+                m.d.comb += rd_port.en.eq(r_issue)
+                if w_bits == 0:
+                    m.d.comb += data.eq(rd_port.data)
+                else:
+                    word = Signal(w_bits)
+                    with m.If(r_issue == 1):
+                        m.d.sync += word.eq(index[0:w_bits])
+                    m.d.comb += data.eq(rd_port.data.word_select(word, 32))
+            else:
+                with m.If(r_issue == 1):
+                    m.d.sync += data.eq(Array([ reg.data_out for reg in region_regs ])[index])
+            r_hits.append(hit)
+            r_data.append(data)
+
+        with m.If((active == 0) | (self.bus.areset_n == 0)):
+            m.d.sync += s1_valid.eq(0)
+        with m.Elif(r_issue == 1):
+            m.d.sync += s1_valid.eq(1)
+            m.d.sync += s1_id.eq(cur_id)
+            m.d.sync += s1_last.eq(cur_len == 0)
+        with m.Elif(r_advance == 1):
+            m.d.sync += s1_valid.eq(0)
+
+        with m.If((active == 0) | (self.bus.areset_n == 0)):
+            m.d.sync += self.bus.rvalid.eq(0)
+        with m.Elif(r_advance == 1):
+            m.d.sync += self.bus.rvalid.eq(s1_valid)
+            m.d.sync += self.bus.rid.eq(s1_id)
+            m.d.sync += self.bus.rlast.eq(s1_last)
+
+            with m.If(Cat(*r_hits).any()):
+                # at most one region is hit, so the read registers can be ORed
+                rdata = 0
+                for (hit, data) in zip(r_hits, r_data):
+                    rdata = rdata | Mux(hit, data, 0)
+                m.d.sync += self.bus.rdata.eq(rdata)
+                m.d.sync += self.bus.rresp.eq(AXI3Response.OKAY)
+            with m.Else():
+                m.d.sync += self.bus.rdata.eq(0xDEADBEEF)
+                m.d.sync += self.bus.rresp.eq(AXI3Response.DECERR)
 
         return m
@@ -0,0 +1,331 @@
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+import axi
+from axi_writer import AXIWriter
+from int_ctrl import IntCoalescer
+
+class AXIStripeWriter_AddrReg:
+    """AXI stripe writer: address register
+
+    Start address for DMA transaction. Must be 64 bit aligned. Therefore, the 3 lowest bits are forced to zero.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIStripeWriter_CountReg:
+    """AXI stripe writer: count register
+
+    Contains number of 64 bit words to transfer MINUS 1, i.e. set count register = 0 to transfer one word.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIStripeWriter_StatusReg:
+    """AXI stripe writer: status register (read-only)
+
+    Bit 10, 9: AXI response.
+    Bit 8: ERROR. Set if an AXI error occured on any port.
+    Bit 0: BUSY. 1: DMA in progress.
+
+    The AXI response bits record the first error received on the port with
+    the lowest number that received an error. The ERROR bit and the AXI
+    response bits are automatically cleared on DMA start.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIStripeWriter_ControlReg:
+    """AXI stripe writer: control register (write-only)
+
+    Bit 0: START. Write 1 to start DMA transaction.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIStripeWriter_ConfigReg:
+    """AXI stripe writer: configuration register
+
+    Bit 0: INT_ENABLE. Set to 1 to enable interrupt once DMA transaction is completed.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIStripeWriter_IntStatusReg:
+    """AXI stripe writer: interrupt status register
+
+    Bit 0: INT_PENDING. 1: A completion interrupt is pending. Write 1 to clear.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIStripeWriter_PortFIFO(Elaboratable):
+    """AXI stripe writer: FIFO for one AXI writer
+
+    Takes entries of `words' 64 bit words (of which the first w_words + 1
+    are valid) and returns them one word at a time, as a FIFO of 64 bit
+    words for the AXI writer.
+    """
+    def __init__(self, words, depth):
+        self.words = words
+
+        self._fifo = SyncFIFO(width=64*words + (words-1).bit_length(), depth=depth)
+
+        # Write side (entries)
+        self.w_data = Signal(64*words)
+        self.w_words = Signal((words-1).bit_length())
+        self.w_en = Signal()
+        self.w_rdy = Signal()
+
+        # Read side (words)
+        self.r_data = Signal(64)
+        self.r_en = Signal()
+        self.r_rdy = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.fifo = self._fifo
+
+        m.d.comb += self._fifo.w_data.eq(Cat(self.w_data, self.w_words))
+        m.d.comb += self._fifo.w_en.eq(self.w_en)
+        m.d.comb += self.w_rdy.eq(self._fifo.w_rdy)
+
+        m.d.comb += self.r_rdy.eq(self._fifo.r_rdy)
+
+        if self.words == 1:
+            m.d.comb += self.r_data.eq(self._fifo.r_data)
+            m.d.comb += self._fifo.r_en.eq(self.r_en)
+        else:
+            # word of the entry at the head of the FIFO
+            sel = Signal(range(self.words))
+            last = Signal(range(self.words))
+            m.d.comb += last.eq(self._fifo.r_data[64*self.words:])
+            m.d.comb += self.r_data.eq(self._fifo.r_data[0:64*self.words].word_select(sel, 64))
+
+            with m.If(self.r_en & self._fifo.r_rdy):
+                with m.If(sel == last):
+                    m.d.sync += sel.eq(0)
+                    m.d.comb += self._fifo.r_en.eq(1)
+                with m.Else():
+                    m.d.sync += sel.eq(sel + 1)
+
+        return m
+
+class AXIStripeWriter(Elaboratable):
+    """AXI stripe writer
+
+    Writes 64 bit words from the FIFO to main memory through several AXI
+    buses (e.g. the HP ports of the PS) in parallel, for higher bandwidth
+    than a single AXI bus can sustain.
+
+    Each entry of the FIFO holds one or more consecutive 64 bit words (the
+    first word in the lowest bits), and one entry is taken per cycle. With
+    as many words per entry as buses, every bus can write one word per cycle,
+    so the aggregate bandwidth is that of all buses together. With fewer
+    words per entry (e.g. a 64 bit FIFO), the bandwidth is limited to that
+    many words per cycle, and the buses only help when some of them stall.
+
+    START writes count register + 1 words to the address given in the address
+    register, just like the AXI writer in register mode. The address range is
+    divided into stripes of stripe_words words, which are assigned to the
+    buses in turn: stripe 0 to bus 0, stripe 1 to bus 1, ..., stripe
+    len(axi_buses) to bus 0 again. Each bus is served by an AXI writer with
+    its own FIFO. The entries from the input FIFO are distributed into these
+    FIFOs in the same order, so a bus that stalls temporarily does not hold up
+    the other buses until its FIFO is full.
+
+    Only the write channels of the AXI buses are used, so the read channels
+    are available to other masters (e.g. an AXI reader).
+
+    axi_buses -- list of AXI buses (2 or 4).
+    fifo -- FIFO with the data, 64 bits times a power of 2 wide (at most
+        stripe_words words).
+    stripe_words -- number of 64 bit words in each stripe (power of 2). The
+        default of 16 words gives one maximum length burst per stripe if the
+        start address is 128 byte aligned.
+    port_fifo_depth -- depth of the FIFO for each bus (in 64 bit words).
+    """
+    def __init__(self, axi_buses, fifo, stripe_words=16, port_fifo_depth=32):
+        if not len(axi_buses) in (2, 4):
+            raise ValueError("number of AXI buses must be 2 or 4")
+        words = fifo.width // 64
+        if fifo.width % 64 != 0 or words & (words-1) != 0 or words > stripe_words:
+            raise ValueError("FIFO width must be 64 bits times a power of 2 (at most stripe_words words)")
+
+        self.buses = axi_buses
+        self.stripe_words = stripe_words
+        self.words = words
+
+        # Interrupt coalescing
+        self._coalescer = IntCoalescer()
+
+        # Registers
+        self.addr_reg = AXIStripeWriter_AddrReg()
+        self.count_reg = AXIStripeWriter_CountReg()
+        self.status_reg = AXIStripeWriter_StatusReg()
+        self.control_reg = AXIStripeWriter_ControlReg()
+        self.config_reg = AXIStripeWriter_ConfigReg()
+        self.int_status_reg = AXIStripeWriter_IntStatusReg()
+        self.int_coalesce_count_reg = self._coalescer.count_reg
+        self.int_coalesce_time_reg = self._coalescer.time_reg
+        self.int_coalesce_merged_reg = self._coalescer.merged_reg
+
+        # Data FIFO
+        self.fifo = fifo
+
+        # Interrupt output
+        self.int_out = Signal()
+
+        # 1 while the transfer waits for data from the FIFO (for telemetry)
+        self.data_req_out = Signal()
+
+        # One AXI writer per bus. The writers are connected to the buses
+        # through their own bus records, so that only the write channels are
+        # connected.
+        self._port_buses = []
+        self._port_fifos = []
+        self.writers = []
+        for i in range(0, len(axi_buses)):
+            bus = axi.AXI3Bus(id_bits=len(axi_buses[i].awid), data_bits=len(axi_buses[i].wdata))
+            port_fifo = AXIStripeWriter_PortFIFO(words, depth=max(1, port_fifo_depth // words))
+            self._port_buses.append(bus)
+            self._port_fifos.append(port_fifo)
+            self.writers.append(AXIWriter(bus, port_fifo, stripe_index=i, stripe_count=len(axi_buses), stripe_words=stripe_words))
+
+    def elaborate(self, platform):
+        m = Module()
+
+        n_ports = len(self.buses)
+
+        for i in range(0, n_ports):
+            m.submodules["port_fifo%d" % i] = self._port_fifos[i]
+            m.submodules["writer%d" % i] = self.writers[i]
+
+        start = Signal()
+        busy = Signal()
+        error = Signal()
+        error_resp = Signal(2)
+        int_enable = Signal()
+        int_pending = Signal()
+
+        # Bus connections (write channels only)
+        for (bus, port_bus) in zip(self.buses, self._port_buses):
+            m.d.comb += port_bus.areset_n.eq(bus.areset_n)
+            for name in ("awid", "awaddr", "awlen", "awsize", "awburst", "awlock", "awcache", "awprot", "awqos",
+                         "awvalid", "wid", "wdata", "wstrb", "wlast", "wvalid", "bready"):
+                m.d.comb += getattr(bus, name).eq(getattr(port_bus, name))
+            for name in ("awready", "wready", "bid", "bresp", "bvalid"):
+                m.d.comb += getattr(port_bus, name).eq(getattr(bus, name))
+
+        # Address and count registers: writes are passed on to all writers,
+        # which compute the address range of their stripes on START.
+        for w in self.writers:
+            m.d.comb += w.addr_reg.data_in.eq(self.addr_reg.data_in)
+            m.d.comb += w.addr_reg.wstrb_in.eq(self.addr_reg.wstrb_in)
+            m.d.comb += w.count_reg.data_in.eq(self.count_reg.data_in)
+            m.d.comb += w.count_reg.wstrb_in.eq(self.count_reg.wstrb_in)
+
+        m.d.comb += self.addr_reg.data_out.eq(self.writers[0].addr_reg.data_out)
+        m.d.comb += self.count_reg.data_out.eq(self.writers[0].count_reg.data_out)
+
+        # Status register logic
+        m.d.comb += self.status_reg.data_out.eq(Cat(busy, Const(0, 7), error, error_resp, Const(0, 21)))
+
+        for w in reversed(self.writers):
+            # NOTE: bit 8 of the writer status register is ERROR
+            with m.If(w.status_reg.data_out[8] == 1):
+                m.d.comb += error.eq(1)
+                m.d.comb += error_resp.eq(w.status_reg.data_out[9:11])
+
+        # Control register logic
+        m.d.comb += start.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0] & ~busy)
+        m.d.comb += self.control_reg.data_out.eq(0)
+
+        for w in self.writers:
+            m.d.comb += w.control_reg.data_in.eq(Cat(start, Const(0, 31)))
+            m.d.comb += w.control_reg.wstrb_in.eq(Cat(start, Const(0, 3)))
+
+        # Config register logic
+        with m.If(self.config_reg.wstrb_in[0]):
+            m.d.sync += int_enable.eq(self.config_reg.data_in[0])
+
+        m.d.comb += self.config_reg.data_out.eq(Cat(int_enable, Const(0, 31)))
+
+        # Distribution of the input entries into the FIFOs of the writers
+        words = self.words
+        dist_active = Signal()
+        dist_n = Signal(33)
+        dist_port = Signal(range(n_ports))
+        dist_k = Signal(range(self.stripe_words // words))
+
+        port_w_rdy = Array([ f.w_rdy for f in self._port_fifos ])
+
+        move = Signal()
+        m.d.comb += move.eq(dist_active & self.fifo.r_rdy & port_w_rdy[dist_port])
+
+        # number of valid words in the entry MINUS 1 (only the last entry of
+        # the transfer may be incomplete)
+        n_valid = Signal(range(words))
+        with m.If(dist_n < words):
+            m.d.comb += n_valid.eq(dist_n - 1)
+        with m.Else():
+            m.d.comb += n_valid.eq(words - 1)
+
+        m.d.comb += self.fifo.r_en.eq(move)
+        m.d.comb += self.data_req_out.eq(dist_active & port_w_rdy[dist_port])
+        for i in range(0, n_ports):
+            m.d.comb += self._port_fifos[i].w_data.eq(self.fifo.r_data)
+            m.d.comb += self._port_fifos[i].w_words.eq(n_valid)
+            m.d.comb += self._port_fifos[i].w_en.eq(move & (dist_port == i))
+
+        with m.If(start):
+            m.d.sync += dist_active.eq(1)
+            # NOTE: count register is number of 64-bit words to transfer MINUS 1
+            m.d.sync += dist_n.eq(self.writers[0].count_reg.data_out + 1)
+            m.d.sync += dist_port.eq(0)
+            m.d.sync += dist_k.eq(0)
+        with m.Elif(move):
+            m.d.sync += dist_n.eq(dist_n - words)
+            with m.If(dist_n <= words):
+                m.d.sync += dist_active.eq(0)
+            with m.If(dist_k == self.stripe_words // words - 1):
+                m.d.sync += dist_k.eq(0)
+                m.d.sync += dist_port.eq(dist_port + 1)
+            with m.Else():
+                m.d.sync += dist_k.eq(dist_k + 1)
+
+        # NOTE: bit 0 of the writer status register is BUSY
+        m.d.comb += busy.eq(dist_active | Cat(*[ w.status_reg.data_out[0] for w in self.writers ]).any())
+
+        # Interrupt logic
+        busy_delay = Signal()
+
+        m.d.sync += busy_delay.eq(busy)
+
+        m.submodules.coalescer = self._coalescer
+
+        with m.If((busy == 0) & (busy_delay == 1) & (int_enable == 1)):
+            m.d.comb += self._coalescer.event_in.eq(1)
+
+        with m.If(self.int_status_reg.data_in[0] & self.int_status_reg.wstrb_in[0]):
+            m.d.comb += self._coalescer.clear_in.eq(1)
+
+        m.d.comb += int_pending.eq(self._coalescer.pending_out)
+
+        m.d.comb += self.int_out.eq(int_pending)
+
+        m.d.comb += self.int_status_reg.data_out.eq(Cat(int_pending, Const(0, 31)))
+
+        return m
@@ -1,10 +1,18 @@
 from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.utils import log2_int
 from axi import AXI3Response, AXI3Burst, AXI3Prot
+from int_ctrl import IntCoalescer
 
 class AXIWriter_AddrReg:
     """AXI writer: address register
 
     Start address for DMA transaction. Must be 64 bit aligned. Therefore, the 3 lowest bits are forced to zero.
+
+    In descriptor mode (see config register), this is the address of the first
+    descriptor in the chain. Descriptors must be 16 byte aligned.
+
+    In ring mode, this is the address of the first slot of the ring.
     """
     def __init__(self):
         self.data_in = Signal(32)
@@ -17,6 +25,162 @@ class AXIWriter_CountReg:
     """AXI writer: count register
 
     Contains number of 64 bit words to transfer MINUS 1, i.e. set count register = 0 to transfer one word.
+
+    In ring mode, this is the size of each slot (number of 64 bit words MINUS
+    1). Not used in descriptor mode and for 2D transfers.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class AXIWriter_LineLenReg:
+    """AXI writer: line length register
+
+    Contains number of 64 bit words per line MINUS 1 (2D transfers only).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class AXIWriter_LineCountReg:
+    """AXI writer: line count register
+
+    Contains number of lines MINUS 1 (2D transfers only).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class AXIWriter_LineStrideReg:
+    """AXI writer: line stride register
+
+    Distance in bytes between the start addresses of consecutive lines (2D
+    transfers only). Must be 64 bit aligned. Therefore, the 3 lowest bits are
+    forced to zero. The stride may be smaller than the line length (or
+    negative, modulo 2**32) to write lines bottom-up.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(29)
+
+class AXIWriter_StartTimeReg:
+    """AXI writer: start time registers (read-only)
+
+    Timestamp (64 bit, see Timestamp) of the last START. Two registers: low
+    (bits 31-0) and high (bits 63-32).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriter_FirstDataTimeReg:
+    """AXI writer: first data time registers (read-only)
+
+    Timestamp (64 bit, see Timestamp) of the first write data beat after the
+    last START, or 0 if no data has been written yet. Two registers: low
+    (bits 31-0) and high (bits 63-32).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriter_LastRespTimeReg:
+    """AXI writer: last response time registers (read-only)
+
+    Timestamp (64 bit, see Timestamp) of the most recent write response
+    since the last START, or 0 if there was none. Once the transfer is
+    completed, this is the time of its completion. Two registers: low (bits
+    31-0) and high (bits 63-32).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriter_CompletionAddrReg:
+    """AXI writer: completion address register
+
+    Address of the first completion record (see description of the AXIWriter
+    class). Must be 32 byte aligned. Therefore, the 5 lowest bits are forced
+    to zero.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(27)
+
+class AXIWriter_CompletionSlotsReg:
+    """AXI writer: completion slots register
+
+    Contains number of completion records MINUS 1. Records are written to
+    consecutive addresses and wrap around to the completion address register
+    after the last one. Set to 0 to always write the same record.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class AXIWriter_CmdAddrReg:
+    """AXI writer: command address register (write-only)
+
+    Bit 31-3: buffer address of the next command (64 bit aligned).
+    Bit 0: IRQ. Raise completion interrupt once this command is completed.
+
+    See description of the AXIWriter class (command mode).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriter_CmdCountReg:
+    """AXI writer: command count register (write-only)
+
+    Number of 64 bit words to transfer MINUS 1 for the next command. Writing
+    this register (as a 32 bit word) pushes the command, together with the
+    last value written to any command address register, into the command
+    FIFO.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriter_CmdStatusReg:
+    """AXI writer: command status register (read-only)
+
+    Bit 31: OVERFLOW. Set if a command was pushed while the command FIFO was
+            full (the command is discarded). Cleared on START.
+    Bit 15-0: number of free entries in the command FIFO.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriter_RingSlotsReg:
+    """AXI writer: ring slots register
+
+    Contains number of slots in the ring MINUS 1 (ring mode only).
     """
     def __init__(self):
         self.data_in = Signal(32)
@@ -25,11 +189,27 @@ class AXIWriter_CountReg:
 
         self._data = Signal(32)
 
+class AXIWriter_RingWritePtrReg:
+    """AXI writer: ring write pointer register (read-only)
+
+    Index of the slot currently being written in ring mode, i.e. the slot that
+    will be completed next. All other slots contain completed data (once the
+    ring has wrapped around). Cleared on START.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
 class AXIWriter_StatusReg:
     """AXI writer: status register (read-only)
 
+    Bit 11: DESC_ERROR. Set if the error occured while fetching a descriptor.
     Bit 10, 9: AXI response.
     Bit 8: ERROR. Set if an AXI error occured.
+    Bit 1: SHADOW_FULL. 1: a transfer has been armed while busy (register
+           mode) and waits for the current one. Further START is ignored
+           until it has been started and this bit is cleared.
     Bit 0: BUSY. 1: DMA in progress.
 
     If an error response (0b10, SLVERR or 0b11, DECERR) is received during DMA,
@@ -37,6 +217,10 @@ class AXIWriter_StatusReg:
     received. Further errors will not update the AXI reponse bits, i.e. they
     contain the first error received in case of multiple errors. The ERROR bit
     and the AXI response bits are automatically cleared on DMA start.
+
+    An error response while fetching a descriptor additionally sets DESC_ERROR
+    and aborts the descriptor chain. Transfers already in progress are
+    completed.
     """
     def __init__(self):
         self.data_in = Signal(32)
@@ -46,7 +230,11 @@ class AXIWriter_StatusReg:
 class AXIWriter_ControlReg:
     """AXI writer: control register (write-only)
 
-    Bit 0: START. Write 1 to start DMA transaction.
+    Bit 1: STOP. Write 1 to stop ring mode. The slot currently being written
+           is completed, no further slots are started.
+    Bit 0: START. Write 1 to start DMA transaction. In register mode, START
+           while busy arms the next transfer unless SHADOW_FULL is set in the
+           status register, in which case it is ignored.
     """
     def __init__(self):
         self.data_in = Signal(32)
@@ -56,6 +244,16 @@ class AXIWriter_ControlReg:
 class AXIWriter_ConfigReg:
     """AXI writer: configuration register
 
+    Bit 5: WRITEBACK. Set to 1 to write a completion record after each
+           transfer (see description of the AXIWriter class).
+    Bit 4: LINES. In register mode, set to 1 for 2D transfers (see
+           description of the AXIWriter class).
+    Bit 3: SLOT_INT. In ring mode, set to 1 to additionally raise the
+           completion interrupt after each slot (requires INT_ENABLE). In
+           register mode, the same applies to each transfer armed back to
+           back (see description of the AXIWriter class).
+    Bit 2, 1: MODE. 0: register mode, 1: descriptor mode, 2: ring mode, 3:
+           command mode (see description of the AXIWriter class).
     Bit 0: INT_ENABLE. Set to 1 to enable interrupt once DMA transaction is completed.
     """
     def __init__(self):
@@ -73,9 +271,161 @@ class AXIWriter_IntStatusReg:
         self.wstrb_in = Signal(4)
         self.data_out = Signal(32)
 
+class AXIWriter_DescAddrReg:
+    """AXI writer: descriptor address register (read-only)
+
+    Address of the descriptor most recently fetched in descriptor mode.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class AXIWriter_DoneCountReg:
+    """AXI writer: completion count register (read-only)
+
+    Number of transfers completed (i.e. all write responses received) since
+    the last START: descriptors in descriptor mode, slots in ring mode,
+    transfers in register mode. Cleared on START (except when arming a
+    transfer while busy).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
 class AXIWriter(Elaboratable):
-    def __init__(self, axi_bus, fifo):
+    """AXI writer
+
+    Writes 64 bit words from the FIFO to main memory.
+
+    In register mode (DESC_MODE = 0), START writes count register + 1 words to
+    the address given in the address register.
+
+    If LINES is set in the config register, register mode performs a 2D
+    transfer instead: START writes line count register + 1 lines of line
+    length register + 1 words each. The first line starts at the address given
+    in the address register, each further line line stride register bytes
+    after the start of the previous line. This allows to write images with
+    padded lines, or a region of interest into a larger image.
+
+    In register mode, the next transfer can be armed while the current one is
+    running: while SHADOW_FULL is clear in the status register, write the
+    address and count (or line) registers and START again. The transfer is
+    held in the job slot and started as soon as the last burst of the current
+    transfer has been issued, so consecutive transfers follow each other
+    without idle cycles. Arming does not clear the status, the completion
+    count and the timestamps, which thus cover the whole sequence of
+    transfers. Set SLOT_INT to be interrupted after each of them.
+
+    In descriptor mode (DESC_MODE = 1), START fetches a chain of descriptors
+    through the read channels of the AXI bus, beginning at the address given in
+    the address register, and performs the transfers they describe without
+    any CPU involvement. The next descriptor is fetched while the current
+    transfer is running, so consecutive transfers follow each other without
+    idle cycles on the write data channel. A descriptor consists of 16 bytes
+    (16 byte aligned):
+
+    0x0: buffer address (64 bit aligned)
+    0x4: number of 64 bit words to transfer MINUS 1
+    0x8: address of next descriptor (16 byte aligned, ignored if LAST is set)
+    0xC: flags. Bit 1: LAST. Last descriptor in the chain.
+                Bit 0: IRQ. Raise completion interrupt once this transfer is
+                       completed.
+
+    If INT_ENABLE is set, the completion interrupt is raised once the chain is
+    completed, and additionally after each descriptor with the IRQ flag set.
+    Completion events can be coalesced into fewer interrupts (see IntCoalescer).
+
+    In ring mode (MODE = 2), START continuously writes to a ring of equally
+    sized slots at consecutive addresses, beginning at the address given in the
+    address register, and wraps around after the last slot until STOP. The
+    ring write pointer register gives the slot currently being written and the
+    completion count register the total number of slots completed, so
+    software can consume slots without stopping the engine.
+
+    In command mode (MODE = 3), transfers are pushed into a command FIFO
+    through the registers instead of being fetched from memory. A command
+    consists of a command address register (buffer address and IRQ flag)
+    and a command count register, and is pushed by the write to the count
+    register. There are cmd_window pairs of these registers at consecutive
+    addresses, all feeding the same FIFO, so that software can push up to
+    cmd_window commands with a single burst write (e.g. memcpy_toio). The
+    command status register gives the number of free entries. Commands are
+    processed back to back as soon as they are pushed; START is not
+    required, but clears the status, the completion count and OVERFLOW. The
+    AXI writer is busy until the command FIFO is empty and all transfers are
+    completed, so the completion interrupt is raised once the queue has run
+    empty, and additionally after each command with the IRQ flag set.
+
+    If WRITEBACK is set in the config register, the AXI writer writes a
+    completion record to main memory after each transfer (register mode
+    transfer, descriptor or ring slot), once all its write responses have
+    been received. Software can then check for completion with a (cached)
+    memory read instead of reading the status register. The records are
+    written to a ring of completion slots register + 1 records, beginning at
+    the address given in the completion address register, so that a batch
+    of completions can be scanned in one pass. A record consists of 32 bytes
+    (32 byte aligned), written in this order:
+
+    0x00: number of bytes written since START, including this transfer
+          (excluding completion records).
+    0x04: 0
+    0x08: timestamp of the last write response of this transfer (64 bit).
+    0x10: timestamp of START (64 bit).
+    0x18: status. Bit 0: DONE (always 1).
+                  Bit 11-8: as in the status register (errors since START,
+                            including this transfer).
+    0x1C: sequence number, i.e. number of transfers completed since START,
+          including this one.
+
+    The status word is written last, so the record is complete once DONE or
+    the sequence number is seen.
+
+    With WRITEBACK, a transfer counts as completed (completion count
+    register, completion interrupt, BUSY) only once its record has been
+    written, so the record is always valid when software is notified. Clear
+    the DONE bit (or remember the sequence number) to detect new records
+    when polling.
+
+    max_outstanding -- maximum number of bursts issued on the write address
+        channel for which no write response has been received yet.
+    stripe_index, stripe_count, stripe_words -- used by AXIStripeWriter. If
+        stripe_count > 1, the transfer given by the address and count
+        registers (register mode) is divided into stripes of stripe_words
+        words, and only every stripe_count-th stripe, beginning with stripe
+        number stripe_index, is written. The FIFO must supply exactly the
+        words of these stripes. stripe_count and stripe_words must be powers
+        of 2.
+    coherent -- if True, all accesses (data and descriptors) are marked as
+        cacheable (write-back, allocate) and, if the AXI bus has AWUSER/ARUSER
+        signals, as shared. Use this for the ACP port of the Zynq PS, so that
+        written data is coherent with the CPU caches without cache maintenance
+        operations.
+    timestamp -- 64 bit timestamp (value of a Timestamp) for the start time,
+        first data time and last response time registers. If None, the AXI
+        writer uses its own counter.
+    cmd_depth -- number of entries of the command FIFO.
+    cmd_window -- number of command address/count register pairs.
+    """
+    def __init__(self, axi_bus, fifo, max_outstanding=8, stripe_index=0, stripe_count=1, stripe_words=16, coherent=False,
+                 timestamp=None, cmd_depth=16, cmd_window=8):
         self.bus = axi_bus
+        self.timestamp = timestamp
+        self.max_outstanding = max_outstanding
+        self.coherent = coherent
+        self.cmd_depth = cmd_depth
+
+        if stripe_count & (stripe_count-1) != 0 or stripe_words & (stripe_words-1) != 0:
+            raise ValueError("stripe_count and stripe_words must be powers of 2")
+        if not 0 <= stripe_index < stripe_count:
+            raise ValueError("stripe_index must be less than stripe_count")
+        self.stripe_index = stripe_index
+        self.stripe_count = stripe_count
+        self.stripe_words = stripe_words
+
+        # Interrupt coalescing
+        self._coalescer = IntCoalescer()
 
         # Registers
         self.addr_reg = AXIWriter_AddrReg()
@@ -84,6 +434,28 @@ class AXIWriter(Elaboratable):
         self.control_reg = AXIWriter_ControlReg()
         self.config_reg = AXIWriter_ConfigReg()
         self.int_status_reg = AXIWriter_IntStatusReg()
+        self.desc_addr_reg = AXIWriter_DescAddrReg()
+        self.done_count_reg = AXIWriter_DoneCountReg()
+        self.ring_slots_reg = AXIWriter_RingSlotsReg()
+        self.ring_wr_ptr_reg = AXIWriter_RingWritePtrReg()
+        self.line_len_reg = AXIWriter_LineLenReg()
+        self.line_count_reg = AXIWriter_LineCountReg()
+        self.line_stride_reg = AXIWriter_LineStrideReg()
+        self.comp_addr_reg = AXIWriter_CompletionAddrReg()
+        self.comp_slots_reg = AXIWriter_CompletionSlotsReg()
+        self.cmd_status_reg = AXIWriter_CmdStatusReg()
+        self.cmd_regs = []
+        for i in range(0, cmd_window):
+            self.cmd_regs += [ AXIWriter_CmdAddrReg(), AXIWriter_CmdCountReg() ]
+        self.start_time_lo_reg = AXIWriter_StartTimeReg()
+        self.start_time_hi_reg = AXIWriter_StartTimeReg()
+        self.first_data_time_lo_reg = AXIWriter_FirstDataTimeReg()
+        self.first_data_time_hi_reg = AXIWriter_FirstDataTimeReg()
+        self.last_resp_time_lo_reg = AXIWriter_LastRespTimeReg()
+        self.last_resp_time_hi_reg = AXIWriter_LastRespTimeReg()
+        self.int_coalesce_count_reg = self._coalescer.count_reg
+        self.int_coalesce_time_reg = self._coalescer.time_reg
+        self.int_coalesce_merged_reg = self._coalescer.merged_reg
 
         # Data FIFO
         self.fifo = fifo
@@ -91,6 +463,9 @@ class AXIWriter(Elaboratable):
         # Interrupt output
         self.int_out = Signal()
 
+        # 1 while a write burst waits for data from the FIFO (for telemetry)
+        self.data_req_out = Signal()
+
     def elaborate(self, platform):
         # Implementation note on AXI bursts: the maximum burst length supported
         # by AXI3 is 16 transfers, or 128 bytes if each transfer is 8 bytes (64
@@ -108,16 +483,43 @@ class AXIWriter(Elaboratable):
         # (Note that the first and the last burst may each transfer up to and
         # including 128 bytes, and that we finish after the first burst if we
         # are already done.)
+        # All three cases are covered by making each burst as long as the
+        # distance to the next 128 byte boundary, limited by the number of
+        # words remaining.
+        #
+        # Implementation note on the engine structure: transfers (jobs) are
+        # handed to the burst generator through a single job slot, which is
+        # filled by START (register mode), the descriptor fetcher or the ring
+        # slot generator.
+        # The burst generator issues bursts on the write address channel and
+        # records each burst in two FIFOs: one holding the burst length for the
+        # write data channel, one holding the end-of-job marker for the write
+        # response channel. The three channels thus run independently, and the
+        # next job is taken from the slot as soon as the last burst of the
+        # current job has been issued.
+        # Completion records are written as additional bursts of 4 words,
+        # which take precedence over the bursts of the burst generator. Their
+        # data is taken from a FIFO of records instead of the data FIFO.
 
         m = Module()
 
         start = Signal()
+        arm = Signal()
+        stop = Signal()
         busy = Signal()
+        shadow_full = Signal()
+        shadow_free = Signal()
         error = Signal()
         error_resp = Signal(2)
+        desc_error = Signal()
         int_enable = Signal()
         int_pending = Signal()
+        mode = Signal(2)
+        slot_int = Signal()
+        lines_2d = Signal()
+        writeback = Signal()
         addr_reg_data = Signal(32)
+        line_stride = Signal(32)
 
         # Address register logic
         # Note that the lowest 3 bits of the address are always zero (64 bit
@@ -141,163 +543,647 @@ class AXIWriter(Elaboratable):
 
         m.d.comb += self.count_reg.data_out.eq(self.count_reg._data)
 
+        # Ring slots register logic
+        for i in range(0, 4):
+            with m.If(self.ring_slots_reg.wstrb_in[i] == 1):
+                m.d.sync += self.ring_slots_reg._data[8*i:8*(i+1)].eq(self.ring_slots_reg.data_in[8*i:8*(i+1)])
+
+        m.d.comb += self.ring_slots_reg.data_out.eq(self.ring_slots_reg._data)
+
+        # Line length and line count register logic
+        for reg in (self.line_len_reg, self.line_count_reg):
+            for i in range(0, 4):
+                with m.If(reg.wstrb_in[i] == 1):
+                    m.d.sync += reg._data[8*i:8*(i+1)].eq(reg.data_in[8*i:8*(i+1)])
+
+            m.d.comb += reg.data_out.eq(reg._data)
+
+        # Line stride register logic
+        # (64 bit aligned, same as address register)
+        with m.If(self.line_stride_reg.wstrb_in[0] == 1):
+            m.d.sync += self.line_stride_reg._data[0:5].eq(self.line_stride_reg.data_in[3:8])
+        for i in range(1, 4):
+            with m.If(self.line_stride_reg.wstrb_in[i] == 1):
+                m.d.sync += self.line_stride_reg._data[8*i-3:8*(i+1)-3].eq(self.line_stride_reg.data_in[8*i:8*(i+1)])
+
+        m.d.comb += line_stride.eq(Cat(Const(0, 3), self.line_stride_reg._data))
+
+        m.d.comb += self.line_stride_reg.data_out.eq(line_stride)
+
+        # Completion address register logic
+        # (32 byte aligned, lowest 5 bits of the address are always zero)
+        comp_addr = Signal(32)
+
+        with m.If(self.comp_addr_reg.wstrb_in[0] == 1):
+            m.d.sync += self.comp_addr_reg._data[0:3].eq(self.comp_addr_reg.data_in[5:8])
+        for i in range(1, 4):
+            with m.If(self.comp_addr_reg.wstrb_in[i] == 1):
+                m.d.sync += self.comp_addr_reg._data[8*i-5:8*(i+1)-5].eq(self.comp_addr_reg.data_in[8*i:8*(i+1)])
+
+        m.d.comb += comp_addr.eq(Cat(Const(0, 5), self.comp_addr_reg._data))
+
+        m.d.comb += self.comp_addr_reg.data_out.eq(comp_addr)
+
+        # Completion slots register logic
+        for i in range(0, 4):
+            with m.If(self.comp_slots_reg.wstrb_in[i] == 1):
+                m.d.sync += self.comp_slots_reg._data[8*i:8*(i+1)].eq(self.comp_slots_reg.data_in[8*i:8*(i+1)])
+
+        m.d.comb += self.comp_slots_reg.data_out.eq(self.comp_slots_reg._data)
+
         # Status register logic
-        m.d.comb += self.status_reg.data_out.eq(Cat(busy, Const(0, 7), error, error_resp, Const(0, 21)))
+        m.d.comb += self.status_reg.data_out.eq(Cat(busy, shadow_full, Const(0, 6), error, error_resp, desc_error,
+                                                    Const(0, 20)))
 
         # Control register logic
-        m.d.comb += start.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0])
+        m.d.comb += start.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0] & ~busy)
+        m.d.comb += arm.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0] & busy & shadow_free)
+        m.d.comb += stop.eq(self.control_reg.data_in[1] & self.control_reg.wstrb_in[0])
         m.d.comb += self.control_reg.data_out.eq(0)
 
         # Config register logic
         with m.If(self.config_reg.wstrb_in[0]):
             m.d.sync += int_enable.eq(self.config_reg.data_in[0])
+            m.d.sync += mode.eq(self.config_reg.data_in[1:3])
+            m.d.sync += slot_int.eq(self.config_reg.data_in[3])
+            m.d.sync += lines_2d.eq(self.config_reg.data_in[4])
+            m.d.sync += writeback.eq(self.config_reg.data_in[5])
 
-        m.d.comb += self.config_reg.data_out.eq(Cat(int_enable, Const(0, 31)))
+        m.d.comb += self.config_reg.data_out.eq(Cat(int_enable, mode, slot_int, lines_2d, writeback, Const(0, 26)))
 
-        # Interrupt logic
-        busy_delay = Signal()
+        # Job slot
+        job_valid = Signal()
+        job_addr = Signal(32)
+        job_count = Signal(32)
+        job_irq = Signal()
+        job_take = Signal()
 
-        m.d.sync += busy_delay.eq(busy)
+        # Job slot used for a transfer armed while busy (register mode)
+        if self.stripe_count == 1:
+            m.d.comb += shadow_full.eq((mode == 0) & job_valid)
+            m.d.comb += shadow_free.eq((mode == 0) & ((job_valid == 0) | (job_take == 1)))
+
+        # Line structure of the job (2D transfers and striping): the job
+        # consists of lines of job_line_len words, with job_line_skip bytes
+        # between the end of a line and the start of the next line. The job
+        # ends after job_count + 1 words or after job_lines + 1 lines,
+        # whichever comes first.
+        job_line_len = Signal(33)
+        job_line_skip = Signal(32)
+        job_lines = Signal(32)
+
+        def fill_job(addr, count, irq, line_len=2**33-1, line_skip=0, lines=2**32-1):
+            return [
+                job_valid.eq(1),
+                job_addr.eq(addr),
+                job_count.eq(count),
+                job_irq.eq(irq),
+                job_line_len.eq(line_len),
+                job_line_skip.eq(line_skip),
+                job_lines.eq(lines)
+            ]
+
+        # Burst tracking FIFOs
+        # wlen_fifo: burst length MINUS 1 (bits 3-0), completion record (bit 4)
+        # resp_fifo: end of job (bit 0), IRQ (bit 1), completion record (bit 2),
+        #            burst length MINUS 1 (bits 6-3)
+        wlen_fifo = SyncFIFO(width=5, depth=self.max_outstanding)
+        m.submodules.wlen_fifo = wlen_fifo
+
+        resp_fifo = SyncFIFO(width=7, depth=self.max_outstanding)
+        m.submodules.resp_fifo = resp_fifo
+
+        # Job end (end of job marker seen on write response channel) and job
+        # completion (job end, or completion record written with WRITEBACK)
+        job_end = Signal()
+        job_done = Signal()
+        job_done_irq = Signal()
+
+        # Completion records: the contents of each record are captured at the
+        # end of the job and stored in rec_fifo until the record has been
+        # written on the write data channel. rec_irq_fifo holds the IRQ flag of
+        # the job until the write response for the record has been received.
+        # rec_pending counts the records not yet issued on the write address
+        # channel.
+        rec_depth = self.max_outstanding + 2
+        rec_fifo = SyncFIFO(width=132, depth=rec_depth)
+        m.submodules.rec_fifo = rec_fifo
 
-        with m.If((busy == 0) & (busy_delay == 1) & (int_enable == 1)):
-            m.d.sync += int_pending.eq(1)
+        rec_irq_fifo = SyncFIFO(width=1, depth=rec_depth)
+        m.submodules.rec_irq_fifo = rec_irq_fifo
+
+        rec_pending = Signal(range(rec_depth + 1))
+        rec_issue = Signal()
+        rec_addr = Signal(32)
+        rec_slot = Signal(32)
+        bytes_done = Signal(32)
+
+        # Burst generator (write address channel)
+        gen_active = Signal()
+        gen_addr = Signal(32)
+        gen_n = Signal(33)
+        gen_irq = Signal()
+        gen_line_left = Signal(33)
+        gen_line_len = Signal(33)
+        gen_line_skip = Signal(32)
+        gen_lines = Signal(32)
+
+        # number of 64-bit words to 128 byte boundary
+        n_to_128 = Signal(5)
+        m.d.comb += n_to_128.eq((0x80 - gen_addr[0:7]) >> 3)
+
+        # limit to number of words remaining in the job
+        burst_words_n = Signal(5)
+        with m.If(gen_n < n_to_128):
+            m.d.comb += burst_words_n.eq(gen_n)
         with m.Else():
-            with m.If(self.int_status_reg.data_in[0] & self.int_status_reg.wstrb_in[0]):
-                m.d.sync += int_pending.eq(0)
+            m.d.comb += burst_words_n.eq(n_to_128)
 
-        m.d.comb += self.int_out.eq(int_pending)
+        # limit to number of words remaining in the line
+        burst_words = Signal(5)
+        with m.If(gen_line_left < burst_words_n):
+            m.d.comb += burst_words.eq(gen_line_left)
+        with m.Else():
+            m.d.comb += burst_words.eq(burst_words_n)
 
-        m.d.comb += self.int_status_reg.data_out.eq(Cat(int_pending, Const(0, 31)))
+        line_end = Signal()
+        m.d.comb += line_end.eq(gen_line_left == burst_words)
+
+        burst_last = Signal()
+        m.d.comb += burst_last.eq((gen_n == burst_words) | (line_end & (gen_lines == 0)))
+
+        aw_free = Signal()
+        m.d.comb += aw_free.eq((self.bus.awvalid == 0) | (self.bus.awready == 1))
+
+        aw_rdy = Signal()
+        m.d.comb += aw_rdy.eq(aw_free & wlen_fifo.w_rdy & resp_fifo.w_rdy)
+
+        # completion records take precedence
+        m.d.comb += rec_issue.eq((rec_pending != 0) & aw_rdy)
+
+        issue = Signal()
+        m.d.comb += issue.eq(gen_active & aw_rdy & (rec_pending == 0))
+
+        with m.If(rec_issue):
+            m.d.comb += wlen_fifo.w_data.eq(Cat(Const(3, 4), Const(1, 1)))
+            m.d.comb += resp_fifo.w_data.eq(Cat(Const(0, 2), Const(1, 1), Const(3, 4)))
+        with m.Else():
+            m.d.comb += wlen_fifo.w_data.eq(Cat((burst_words-1)[0:4], Const(0, 1)))
+            m.d.comb += resp_fifo.w_data.eq(Cat(burst_last, gen_irq, Const(0, 1), (burst_words-1)[0:4]))
+        m.d.comb += wlen_fifo.w_en.eq(issue | rec_issue)
+        m.d.comb += resp_fifo.w_en.eq(issue | rec_issue)
+
+        with m.If(rec_issue):
+            m.d.sync += self.bus.awaddr.eq(rec_addr)
+            m.d.sync += self.bus.awlen.eq(3)
+            m.d.sync += self.bus.awvalid.eq(1)
+        with m.Elif(issue):
+            m.d.sync += self.bus.awaddr.eq(gen_addr)
+            m.d.sync += self.bus.awlen.eq(burst_words-1)
+            m.d.sync += self.bus.awvalid.eq(1)
+            m.d.sync += gen_addr.eq(gen_addr + (burst_words << 3))
+            m.d.sync += gen_n.eq(gen_n - burst_words)
+            with m.If(burst_last):
+                m.d.sync += gen_active.eq(0)
+            with m.If(line_end):
+                # continue with next line
+                m.d.sync += gen_addr.eq(gen_addr + (burst_words << 3) + gen_line_skip)
+                m.d.sync += gen_line_left.eq(gen_line_len)
+                m.d.sync += gen_lines.eq(gen_lines - 1)
+            with m.Else():
+                m.d.sync += gen_line_left.eq(gen_line_left - burst_words)
+        with m.Elif(aw_free):
+            m.d.sync += self.bus.awvalid.eq(0)
+
+        # Take the next job as soon as the last burst of the current job is
+        # issued. Job sources below may refill the slot in the same cycle.
+        m.d.comb += job_take.eq(job_valid & (~gen_active | (issue & burst_last)))
+
+        with m.If(job_take):
+            m.d.sync += job_valid.eq(0)
+            m.d.sync += gen_active.eq(1)
+            m.d.sync += gen_addr.eq(job_addr)
+            # NOTE: job_count is number of 64-bit words to transfer MINUS 1
+            m.d.sync += gen_n.eq(job_count + 1)
+            m.d.sync += gen_irq.eq(job_irq)
+            m.d.sync += gen_line_left.eq(job_line_len)
+            m.d.sync += gen_line_len.eq(job_line_len)
+            m.d.sync += gen_line_skip.eq(job_line_skip)
+            m.d.sync += gen_lines.eq(job_lines)
 
-        # DMA engine
-        n_data = Signal(32)
-        n_addr = Signal(32)
+        m.d.comb += self.bus.awid.eq(0)
+        m.d.comb += self.bus.awsize.eq(3)
+        m.d.comb += self.bus.awburst.eq(AXI3Burst.INCR)
+        m.d.comb += self.bus.awlock.eq(0)
+
+        if self.coherent:
+            # AxCACHE: write-back read and write-allocate
+            # AxUSER: bit 0: shared (coherent with CPU caches)
+            cache = 0b1111
+            user = 0b00001
+        else:
+            # AxCACHE: normal non-cacheable non-bufferable
+            cache = 0b0010
+            user = 0b00000
+
+        m.d.comb += self.bus.awcache.eq(cache)
+        if hasattr(self.bus, "awuser"):
+            m.d.comb += self.bus.awuser.eq(user)
+
+        m.d.comb += self.bus.awprot.eq(AXI3Prot.UNPRIV | AXI3Prot.SECURE | AXI3Prot.DATA)
+        m.d.comb += self.bus.awqos.eq(0)
+
+        # Register mode: START fills the job slot, also while busy (arm)
+        if self.stripe_count == 1:
+            with m.If((start | arm) & (mode == 0) & (lines_2d == 0)):
+                m.d.sync += fill_job(addr_reg_data, self.count_reg._data, slot_int)
+            with m.If((start | arm) & (mode == 0) & (lines_2d == 1)):
+                # NOTE: line length and line count registers are MINUS 1
+                m.d.sync += fill_job(addr_reg_data, 0xFFFFFFFF, slot_int,
+                    line_len=self.line_len_reg._data + 1,
+                    line_skip=line_stride - ((self.line_len_reg._data + 1) << 3),
+                    lines=self.line_count_reg._data)
+        else:
+            # number of words in this writer's stripes: stripe_words for
+            # each complete round over all writers, plus a complete or
+            # partial stripe from the last round
+            s_bits = log2_int(self.stripe_words)
+            c_bits = log2_int(self.stripe_count)
+
+            total_words = Signal(33)
+            n_stripes = Signal(33)
+            n_rounds = Signal(33)
+            last_stripe = Signal(range(self.stripe_count))
+            port_words = Signal(33)
+
+            m.d.comb += total_words.eq(self.count_reg._data + 1)
+            m.d.comb += n_stripes.eq(total_words >> s_bits)
+            m.d.comb += n_rounds.eq(n_stripes >> c_bits)
+            m.d.comb += last_stripe.eq(n_stripes[0:c_bits])
+
+            with m.If(last_stripe > self.stripe_index):
+                m.d.comb += port_words.eq((n_rounds << s_bits) + self.stripe_words)
+            with m.Elif(last_stripe == self.stripe_index):
+                m.d.comb += port_words.eq((n_rounds << s_bits) + total_words[0:s_bits])
+            with m.Else():
+                m.d.comb += port_words.eq(n_rounds << s_bits)
+
+            # each stripe is a line; skip the stripes of the other writers
+            with m.If(start & (mode == 0) & (port_words != 0)):
+                m.d.sync += fill_job(addr_reg_data + 8*self.stripe_index*self.stripe_words, port_words - 1, 0,
+                    line_len=self.stripe_words,
+                    line_skip=8*(self.stripe_count-1)*self.stripe_words)
+
+        # Descriptor mode: descriptor fetcher fills the job slot
+        desc_ptr = Signal(32)
+        desc_addr = Signal(32)
+        desc_n = Signal(32)
+        desc_next = Signal(32)
+        desc_irq = Signal()
+        desc_last = Signal()
+
+        m.d.comb += self.desc_addr_reg.data_out.eq(desc_ptr)
+
+        m.d.comb += self.bus.arid.eq(0)
+        m.d.comb += self.bus.araddr.eq(Cat(Const(0, 4), desc_ptr[4:32]))
+        m.d.comb += self.bus.arlen.eq(1)
+        m.d.comb += self.bus.arsize.eq(3)
+        m.d.comb += self.bus.arburst.eq(AXI3Burst.INCR)
+        m.d.comb += self.bus.arlock.eq(0)
+        m.d.comb += self.bus.arcache.eq(cache)
+        if hasattr(self.bus, "aruser"):
+            m.d.comb += self.bus.aruser.eq(user)
+        m.d.comb += self.bus.arprot.eq(AXI3Prot.UNPRIV | AXI3Prot.SECURE | AXI3Prot.DATA)
+        m.d.comb += self.bus.arqos.eq(0)
+
+        with m.FSM(reset="IDLE") as desc_fsm:
+            with m.State("IDLE"):
+                with m.If(start & (mode == 1)):
+                    m.d.sync += desc_ptr.eq(addr_reg_data)
+                    m.d.sync += self.bus.arvalid.eq(1)
+                    m.next = "FETCH"
+
+            with m.State("FETCH"):
+                with m.If(self.bus.arready == 1):
+                    m.d.sync += self.bus.arvalid.eq(0)
+                    m.d.sync += self.bus.rready.eq(1)
+                    m.next = "READ"
+
+            with m.State("READ"):
+                with m.If((self.bus.rvalid == 1) & (self.bus.rready == 1)):
+                    with m.If(self.bus.rresp[1] == 1):
+                        m.d.sync += desc_error.eq(1)
+
+                    with m.If(self.bus.rlast == 0):
+                        m.d.sync += desc_addr.eq(Cat(Const(0, 3), self.bus.rdata[3:32]))
+                        m.d.sync += desc_n.eq(self.bus.rdata[32:64])
+                    with m.Else():
+                        m.d.sync += desc_next.eq(self.bus.rdata[0:32])
+                        m.d.sync += desc_irq.eq(self.bus.rdata[32])
+                        m.d.sync += desc_last.eq(self.bus.rdata[33])
+                        m.d.sync += self.bus.rready.eq(0)
+                        m.next = "VALID"
+
+            with m.State("VALID"):
+                with m.If(desc_error == 1):
+                    # abort chain
+                    m.next = "IDLE"
+                with m.Elif((job_valid == 0) | (job_take == 1)):
+                    m.d.sync += fill_job(desc_addr, desc_n, desc_irq)
+                    with m.If(desc_last == 1):
+                        m.next = "IDLE"
+                    with m.Else():
+                        # prefetch next descriptor while this one is processed
+                        m.d.sync += desc_ptr.eq(desc_next)
+                        m.d.sync += self.bus.arvalid.eq(1)
+                        m.next = "FETCH"
+
+        # Ring mode: slot generator fills the job slot
+        ring_active = Signal()
+        ring_base = Signal(32)
+        ring_addr = Signal(32)
+        ring_slot = Signal(32)
+        ring_last = Signal(32)
+        ring_n = Signal(32)
+        ring_irq = Signal()
+
+        with m.If(start & (mode == 2)):
+            m.d.sync += ring_active.eq(1)
+            m.d.sync += ring_base.eq(addr_reg_data)
+            m.d.sync += ring_addr.eq(addr_reg_data)
+            m.d.sync += ring_slot.eq(0)
+            m.d.sync += ring_last.eq(self.ring_slots_reg._data)
+            m.d.sync += ring_n.eq(self.count_reg._data)
+            m.d.sync += ring_irq.eq(slot_int)
+        with m.Elif(ring_active & ((job_valid == 0) | (job_take == 1))):
+            m.d.sync += fill_job(ring_addr, ring_n, ring_irq)
+            with m.If(ring_slot == ring_last):
+                m.d.sync += ring_slot.eq(0)
+                m.d.sync += ring_addr.eq(ring_base)
+            with m.Else():
+                m.d.sync += ring_slot.eq(ring_slot + 1)
+                m.d.sync += ring_addr.eq(ring_addr + ((ring_n + 1) << 3))
+
+        # Command mode: command FIFO fills the job slot
+        # (entries: address bits 31-3, IRQ, count)
+        cmd_fifo = SyncFIFO(width=62, depth=self.cmd_depth)
+        m.submodules.cmd_fifo = cmd_fifo
+
+        cmd_addr = Signal(29)
+        cmd_irq = Signal()
+        cmd_overflow = Signal()
+
+        for reg in self.cmd_regs[0::2]:
+            with m.If(reg.wstrb_in[0] == 1):
+                m.d.sync += cmd_irq.eq(reg.data_in[0])
+                m.d.sync += cmd_addr[0:5].eq(reg.data_in[3:8])
+            for i in range(1, 4):
+                with m.If(reg.wstrb_in[i] == 1):
+                    m.d.sync += cmd_addr[8*i-3:8*(i+1)-3].eq(reg.data_in[8*i:8*(i+1)])
+            m.d.comb += reg.data_out.eq(0)
+
+        for reg in self.cmd_regs[1::2]:
+            with m.If(reg.wstrb_in[0] == 1):
+                m.d.comb += cmd_fifo.w_data.eq(Cat(cmd_addr, cmd_irq, reg.data_in))
+                m.d.comb += cmd_fifo.w_en.eq(1)
+            m.d.comb += reg.data_out.eq(0)
+
+        with m.If(start):
+            m.d.sync += cmd_overflow.eq(0)
+        with m.Elif(cmd_fifo.w_en & ~cmd_fifo.w_rdy):
+            m.d.sync += cmd_overflow.eq(1)
+
+        cmd_free = Signal(16)
+        m.d.comb += cmd_free.eq(self.cmd_depth - cmd_fifo.level)
+
+        m.d.comb += self.cmd_status_reg.data_out.eq(Cat(cmd_free, Const(0, 15), cmd_overflow))
+
+        with m.If((mode == 3) & cmd_fifo.r_rdy & ((job_valid == 0) | (job_take == 1))):
+            m.d.sync += fill_job(Cat(Const(0, 3), cmd_fifo.r_data[0:29]), cmd_fifo.r_data[30:62], cmd_fifo.r_data[29])
+            m.d.comb += cmd_fifo.r_en.eq(1)
+
+        with m.If(stop & ring_active):
+            # discard slot not yet started
+            m.d.sync += ring_active.eq(0)
+            m.d.sync += job_valid.eq(0)
+
+        with m.If(start):
+            m.d.sync += error.eq(0)
+            m.d.sync += error_resp.eq(0)
+            m.d.sync += desc_error.eq(0)
+
+        # Record first error response on write response or read data channel
+        b_error = Signal()
+        r_error = Signal()
+        m.d.comb += b_error.eq((self.bus.bready == 1) & (self.bus.bvalid == 1) & (self.bus.bresp[1] == 1))
+        m.d.comb += r_error.eq((self.bus.rready == 1) & (self.bus.rvalid == 1) & (self.bus.rresp[1] == 1))
+
+        with m.If(b_error | r_error):
+            m.d.sync += error.eq(1)
+
+        # record response for first error that occurs (if both channels
+        # report an error in the same cycle, the write response wins)
+        with m.If(error == 0):
+            with m.If(b_error):
+                m.d.sync += error_resp.eq(self.bus.bresp)
+            with m.Elif(r_error):
+                m.d.sync += error_resp.eq(self.bus.rresp)
+
+        # Write data channel
+        w_active = Signal()
+        w_record = Signal()
         n_wlast = Signal(4)
-        addr = Signal(32)
-        n_resp = Signal(32)
-        data_en = Signal()
+        rec_word = Signal(64)
+
+        m.d.comb += self.bus.wid.eq(0)
+        m.d.comb += self.bus.wstrb.eq(0xFF)
 
         with m.If(n_wlast == 0):
             m.d.comb += self.bus.wlast.eq(1)
         with m.Else():
             m.d.comb += self.bus.wlast.eq(0)
 
-        with m.If((data_en == 0) & (n_resp == 0)):
-            m.d.comb += busy.eq(0)
+        with m.If(w_record):
+            m.d.comb += self.bus.wdata.eq(rec_word)
+            m.d.comb += self.bus.wvalid.eq(w_active)
+            m.d.comb += rec_fifo.r_en.eq(self.bus.wready & self.bus.wvalid & (n_wlast == 0))
         with m.Else():
-            m.d.comb += busy.eq(1)
-
-        m.d.comb += self.bus.wdata.eq(self.fifo.r_data)
-        m.d.comb += self.bus.wvalid.eq(data_en & self.fifo.r_rdy)
-        m.d.comb += self.fifo.r_en.eq(self.bus.wready & self.bus.wvalid)
-
-        with m.FSM(reset="WAIT_START"):
-            with m.State("WAIT_START"):
-                with m.If(start == 1):
-                    m.d.sync += n_data.eq(self.count_reg._data)
-
-                    m.d.sync += error.eq(0)
-                    m.d.sync += error_resp.eq(0)
-
-                    m.d.sync += self.bus.awid.eq(0)
-                    m.d.sync += self.bus.awaddr.eq(addr_reg_data)
-
-                    # number of 64-bit words to 128 byte boundary
-                    n_to_128 = ((0x80 - (addr_reg_data & 0x7F)) >> 3)
-
-                    # NOTE: self.nr._data is number of 64-bit words to transfer MINUS 1
-                    with m.If((self.count_reg._data > 15) & (n_to_128 == 16)):
-                        # perform 16 word (= 128 byte) burst
-                        m.d.sync += self.bus.awlen.eq(15)
-                        m.d.sync += addr.eq(addr_reg_data+128)
-                        m.d.sync += n_addr.eq(self.count_reg._data+1-16)
-                        m.d.sync += n_wlast.eq(15)
-                    with m.Elif(self.count_reg._data >= n_to_128):
-                        # perform burst to 128 byte boundary
-                        m.d.sync += self.bus.awlen.eq(n_to_128-1)
-                        m.d.sync += addr.eq(addr_reg_data + (n_to_128<<3))
-                        m.d.sync += n_addr.eq(self.count_reg._data+1 - n_to_128)
-                        m.d.sync += n_wlast.eq(n_to_128-1)
-                    with m.Else():
-                        # perform complete transfer in one burst
-                        m.d.sync += self.bus.awlen.eq(self.count_reg._data)
-                        m.d.sync += n_addr.eq(0)
-                        m.d.sync += n_wlast.eq(self.count_reg._data)
-
-                    m.d.sync += self.bus.awsize.eq(3)
-                    m.d.sync += self.bus.awburst.eq(AXI3Burst.INCR)
-                    m.d.sync += self.bus.awlock.eq(0)
-
-                    # AWCACHE: normal non-cacheable non-bufferable
-                    m.d.sync += self.bus.awcache.eq(0b0010)
-
-                    m.d.sync += self.bus.awprot.eq(AXI3Prot.UNPRIV | AXI3Prot.SECURE | AXI3Prot.DATA)
-                    m.d.sync += self.bus.awqos.eq(0)
-                    m.d.sync += self.bus.awvalid.eq(1)
-
-                    m.d.sync += self.bus.wid.eq(0)
-                    m.d.sync += self.bus.wstrb.eq(0xFF)
-                    m.d.sync += data_en.eq(1)
-
-                    m.next = "RUN"
-
-            with m.State("RUN"):
-                # address
-                with m.If(self.bus.awready == 1):
-                    with m.If(n_addr > 15):
-                        # perform 16 word (= 128 byte) burst
-                        m.d.sync += self.bus.awaddr.eq(addr)
-                        m.d.sync += self.bus.awlen.eq(15)
-                        m.d.sync += addr.eq(addr+128)
-                        m.d.sync += n_addr.eq(n_addr-16)
-                    with m.Elif(n_addr > 0):
-                        # perform rest of burst
-                        m.d.sync += self.bus.awaddr.eq(addr)
-                        m.d.sync += self.bus.awlen.eq(n_addr-1)
-                        m.d.sync += n_addr.eq(0)
-                    with m.Else():
-                        # done
-                        m.d.sync += self.bus.awvalid.eq(0)
+            m.d.comb += self.bus.wdata.eq(self.fifo.r_data)
+            m.d.comb += self.bus.wvalid.eq(w_active & self.fifo.r_rdy)
+            m.d.comb += self.fifo.r_en.eq(self.bus.wready & self.bus.wvalid)
+        m.d.comb += self.data_req_out.eq(w_active & ~w_record)
 
-                # data
-                with m.If((self.bus.wready == 1) & (self.bus.wvalid == 1)):
-                    with m.If(n_data > 0):
-                        m.d.sync += n_data.eq(n_data-1)
-                    with m.Else():
-                        m.d.sync += data_en.eq(0)
+        with m.If((self.bus.wready == 1) & (self.bus.wvalid == 1)):
+            with m.If(n_wlast > 0):
+                m.d.sync += n_wlast.eq(n_wlast-1)
+            with m.Elif(wlen_fifo.r_rdy):
+                # continue with next burst without idle cycle
+                m.d.comb += wlen_fifo.r_en.eq(1)
+                m.d.sync += n_wlast.eq(wlen_fifo.r_data[0:4])
+                m.d.sync += w_record.eq(wlen_fifo.r_data[4])
+            with m.Else():
+                m.d.sync += w_active.eq(0)
+        with m.Elif((w_active == 0) & wlen_fifo.r_rdy):
+            m.d.comb += wlen_fifo.r_en.eq(1)
+            m.d.sync += n_wlast.eq(wlen_fifo.r_data[0:4])
+            m.d.sync += w_record.eq(wlen_fifo.r_data[4])
+            m.d.sync += w_active.eq(1)
 
-                    with m.If(n_wlast > 0):
-                        m.d.sync += n_wlast.eq(n_wlast-1)
-                    with m.Else():
-                        with m.If(n_data > 15):
-                            m.d.sync += n_wlast.eq(15)
-                        with m.Else():
-                            with m.If(n_data > 0):
-                                m.d.sync += n_wlast.eq(n_data-1)
-                            with m.Else():
-                                m.d.sync += n_wlast.eq(0)
-
-                # completion check
-                with m.If((self.bus.awvalid == 0) & (data_en == 0)):
-                    m.next = "WAIT_START"
-
-        with m.If(self.bus.areset_n):
+        # Write response channel
+        # (with a margin of one entry in the completion record FIFOs, since
+        # bready is registered)
+        with m.If(self.bus.areset_n & (rec_irq_fifo.level < rec_depth - 1)):
             m.d.sync += self.bus.bready.eq(1)
         with m.Else():
             m.d.sync += self.bus.bready.eq(0)
 
-        with m.If((self.bus.bready == 1) & (self.bus.bvalid == 1) & (self.bus.bresp[1] == 1)):
-            m.d.sync += error.eq(1)
-            # record response for first error that occurs
-            with m.If(error == 0):
-                m.d.sync += error_resp.eq(self.bus.bresp)
+        with m.If((self.bus.bready == 1) & (self.bus.bvalid == 1)):
+            m.d.comb += resp_fifo.r_en.eq(1)
+            with m.If(resp_fifo.r_data[2] == 1):
+                # completion record written
+                m.d.comb += rec_irq_fifo.r_en.eq(1)
+                m.d.comb += job_done.eq(1)
+                m.d.comb += job_done_irq.eq(rec_irq_fifo.r_data)
+            with m.Else():
+                m.d.comb += job_end.eq(resp_fifo.r_data[0])
+                with m.If(writeback == 0):
+                    m.d.comb += job_done.eq(resp_fifo.r_data[0])
+                    m.d.comb += job_done_irq.eq(resp_fifo.r_data[1])
+
+        # Number of outstanding write responses
+        n_resp = resp_fifo.level
+
+        done_count = Signal(32)
+        ring_wr_ptr = Signal(32)
+
+        m.d.comb += self.done_count_reg.data_out.eq(done_count)
+        m.d.comb += self.ring_wr_ptr_reg.data_out.eq(ring_wr_ptr)
 
-        n_resp_incr = ((self.bus.awready == 1) & (self.bus.awvalid == 1))
-        n_resp_decr = ((self.bus.bready == 1) & (self.bus.bvalid == 1))
+        with m.If(start):
+            m.d.sync += done_count.eq(0)
+            m.d.sync += ring_wr_ptr.eq(0)
+        with m.Elif(job_done):
+            m.d.sync += done_count.eq(done_count + 1)
+            with m.If(ring_wr_ptr == ring_last):
+                m.d.sync += ring_wr_ptr.eq(0)
+            with m.Else():
+                m.d.sync += ring_wr_ptr.eq(ring_wr_ptr + 1)
 
-        with m.If((n_resp_incr == 1) & (n_resp_decr == 0)):
-            m.d.sync += n_resp.eq(n_resp + 1)
-        with m.Elif((n_resp_incr == 0) & (n_resp_decr == 1)):
-            m.d.sync += n_resp.eq(n_resp - 1)
+        # Timestamps
+        if self.timestamp is None:
+            timestamp = Signal(64)
+            m.d.sync += timestamp.eq(timestamp + 1)
+        else:
+            timestamp = self.timestamp
+
+        start_time = Signal(64)
+        first_data_time = Signal(64)
+        last_resp_time = Signal(64)
+        first_data_seen = Signal()
+
+        m.d.comb += self.start_time_lo_reg.data_out.eq(start_time[0:32])
+        m.d.comb += self.start_time_hi_reg.data_out.eq(start_time[32:64])
+        m.d.comb += self.first_data_time_lo_reg.data_out.eq(first_data_time[0:32])
+        m.d.comb += self.first_data_time_hi_reg.data_out.eq(first_data_time[32:64])
+        m.d.comb += self.last_resp_time_lo_reg.data_out.eq(last_resp_time[0:32])
+        m.d.comb += self.last_resp_time_hi_reg.data_out.eq(last_resp_time[32:64])
+
+        with m.If(start):
+            m.d.sync += start_time.eq(timestamp)
+            m.d.sync += first_data_time.eq(0)
+            m.d.sync += last_resp_time.eq(0)
+            m.d.sync += first_data_seen.eq(0)
+        with m.Else():
+            with m.If((self.bus.wvalid == 1) & (self.bus.wready == 1) & (first_data_seen == 0)):
+                m.d.sync += first_data_time.eq(timestamp)
+                m.d.sync += first_data_seen.eq(1)
+            with m.If((self.bus.bvalid == 1) & (self.bus.bready == 1)):
+                m.d.sync += last_resp_time.eq(timestamp)
+
+        # Completion records
+        rec_seq = Signal(32)
+        rec_bytes = Signal(32)
+        rec_error = Signal()
+        rec_error_resp = Signal(2)
+
+        data_resp = Signal()
+        m.d.comb += data_resp.eq((self.bus.bready == 1) & (self.bus.bvalid == 1) & (resp_fifo.r_data[2] == 0))
+
+        # state after this write response, including this burst
+        m.d.comb += rec_error.eq(error | self.bus.bresp[1])
+        with m.If((error == 0) & (self.bus.bresp[1] == 1)):
+            m.d.comb += rec_error_resp.eq(self.bus.bresp)
+        with m.Else():
+            m.d.comb += rec_error_resp.eq(error_resp)
+        with m.If(data_resp):
+            m.d.comb += rec_bytes.eq(bytes_done + ((resp_fifo.r_data[3:7] + 1) << 3))
+        with m.Else():
+            m.d.comb += rec_bytes.eq(bytes_done)
+
+        with m.If(start):
+            m.d.sync += rec_seq.eq(0)
+            m.d.sync += bytes_done.eq(0)
+        with m.Else():
+            with m.If(job_end):
+                m.d.sync += rec_seq.eq(rec_seq + 1)
+            m.d.sync += bytes_done.eq(rec_bytes)
+
+        m.d.comb += rec_fifo.w_data.eq(Cat(rec_error, rec_error_resp, desc_error, (rec_seq + 1)[0:32], rec_bytes, timestamp))
+        m.d.comb += rec_fifo.w_en.eq(job_end & writeback)
+        m.d.comb += rec_irq_fifo.w_data.eq(resp_fifo.r_data[1])
+        m.d.comb += rec_irq_fifo.w_en.eq(job_end & writeback)
+
+        with m.If(rec_fifo.w_en & ~rec_issue):
+            m.d.sync += rec_pending.eq(rec_pending + 1)
+        with m.Elif(~rec_fifo.w_en & rec_issue):
+            m.d.sync += rec_pending.eq(rec_pending - 1)
+
+        with m.If(start):
+            m.d.sync += rec_addr.eq(comp_addr)
+            m.d.sync += rec_slot.eq(0)
+        with m.Elif(rec_issue):
+            with m.If(rec_slot == self.comp_slots_reg._data):
+                m.d.sync += rec_addr.eq(comp_addr)
+                m.d.sync += rec_slot.eq(0)
+            with m.Else():
+                m.d.sync += rec_addr.eq(rec_addr + 32)
+                m.d.sync += rec_slot.eq(rec_slot + 1)
+
+        # record word on the write data channel (n_wlast counts down from 3)
+        with m.Switch(n_wlast[0:2]):
+            with m.Case(3):
+                m.d.comb += rec_word.eq(Cat(rec_fifo.r_data[36:68], Const(0, 32)))
+            with m.Case(2):
+                m.d.comb += rec_word.eq(rec_fifo.r_data[68:132])
+            with m.Case(1):
+                m.d.comb += rec_word.eq(start_time)
+            with m.Case(0):
+                m.d.comb += rec_word.eq(Cat(Const(1, 1), Const(0, 7), rec_fifo.r_data[0:4], Const(0, 20),
+                                            rec_fifo.r_data[4:36]))
+
+        with m.If(job_valid | gen_active | (n_resp != 0) | ~desc_fsm.ongoing("IDLE") | ring_active | (rec_pending != 0) |
+                 ((mode == 3) & cmd_fifo.r_rdy)):
+            m.d.comb += busy.eq(1)
+        with m.Else():
+            m.d.comb += busy.eq(0)
+
+        # Interrupt logic
+        busy_delay = Signal()
+
+        m.d.sync += busy_delay.eq(busy)
+
+        m.submodules.coalescer = self._coalescer
+
+        with m.If((((busy == 0) & (busy_delay == 1)) | (job_done & job_done_irq)) & (int_enable == 1)):
+            m.d.comb += self._coalescer.event_in.eq(1)
+
+        with m.If(self.int_status_reg.data_in[0] & self.int_status_reg.wstrb_in[0]):
+            m.d.comb += self._coalescer.clear_in.eq(1)
+
+        m.d.comb += int_pending.eq(self._coalescer.pending_out)
+
+        m.d.comb += self.int_out.eq(int_pending)
+
+        m.d.comb += self.int_status_reg.data_out.eq(Cat(int_pending, Const(0, 31)))
 
         return m
@@ -0,0 +1,173 @@
+from nmigen import *
+
+class DMAPerf_ControlReg:
+    """DMA performance counters: control register (write-only)
+
+    Bit 0: CLEAR. Write 1 to clear all counters.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class DMAPerf_BusyCyclesReg:
+    """DMA performance counters: busy cycles register (read-only)
+
+    Number of clock cycles in which the DMA engine was busy.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class DMAPerf_AWStallCyclesReg:
+    """DMA performance counters: write address stall register (read-only)
+
+    Number of clock cycles in which a write address was not accepted by the
+    slave (awvalid = 1, awready = 0) on any of the buses.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class DMAPerf_WStallCyclesReg:
+    """DMA performance counters: write data stall register (read-only)
+
+    Number of clock cycles in which write data was not accepted by the slave
+    (wvalid = 1, wready = 0) on any of the buses.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class DMAPerf_DataStallCyclesReg:
+    """DMA performance counters: data stall register (read-only)
+
+    Number of clock cycles in which the DMA engine could not send write data
+    because its FIFO was empty.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class DMAPerf_BytesReg:
+    """DMA performance counters: bytes register (read-only)
+
+    Number of bytes written (enabled byte lanes of all write data beats
+    accepted by the slave). Wraps around after 4 GiB.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class DMAPerf_OutstandingReg:
+    """DMA performance counters: outstanding writes register (read-only)
+
+    Bit 31-16: Highest number of outstanding write bursts (write address
+               accepted, write response not yet received) since the last
+               CLEAR.
+    Bit 15-0: Current number of outstanding write bursts.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class DMAPerf(Elaboratable):
+    """DMA performance counters
+
+    Observes the write channels of the AXI buses of a DMA engine and counts
+    busy cycles, stall cycles and bytes. The achieved bandwidth is the number
+    of bytes divided by the number of busy cycles (times the clock
+    frequency). The stall counters show which side limits it: the
+    interconnect/memory (write address or write data stalls) or the data
+    source (data stalls).
+
+    axi_buses -- list of AXI buses of the DMA engine (e.g. all HP ports used
+        by an AXI stripe writer).
+
+    Inputs:
+    busy_in -- 1 while the DMA engine is busy.
+    data_stall_in -- 1 while the DMA engine waits for data because its FIFO
+        is empty (e.g. data_req_out of AXIWriter and not r_rdy of the FIFO).
+    """
+    def __init__(self, axi_buses):
+        self.buses = axi_buses
+
+        # Registers
+        self.control_reg = DMAPerf_ControlReg()
+        self.busy_cycles_reg = DMAPerf_BusyCyclesReg()
+        self.aw_stall_cycles_reg = DMAPerf_AWStallCyclesReg()
+        self.w_stall_cycles_reg = DMAPerf_WStallCyclesReg()
+        self.data_stall_cycles_reg = DMAPerf_DataStallCyclesReg()
+        self.bytes_reg = DMAPerf_BytesReg()
+        self.outstanding_reg = DMAPerf_OutstandingReg()
+
+        self.busy_in = Signal()
+        self.data_stall_in = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        clear = Signal()
+        m.d.comb += clear.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0])
+        m.d.comb += self.control_reg.data_out.eq(0)
+
+        busy_cycles = Signal(32)
+        aw_stall_cycles = Signal(32)
+        w_stall_cycles = Signal(32)
+        data_stall_cycles = Signal(32)
+        n_bytes = Signal(32)
+        outstanding = Signal(16)
+        max_outstanding = Signal(16)
+
+        m.d.comb += self.busy_cycles_reg.data_out.eq(busy_cycles)
+        m.d.comb += self.aw_stall_cycles_reg.data_out.eq(aw_stall_cycles)
+        m.d.comb += self.w_stall_cycles_reg.data_out.eq(w_stall_cycles)
+        m.d.comb += self.data_stall_cycles_reg.data_out.eq(data_stall_cycles)
+        m.d.comb += self.bytes_reg.data_out.eq(n_bytes)
+        m.d.comb += self.outstanding_reg.data_out.eq(Cat(outstanding, max_outstanding))
+
+        aw_stall = Signal()
+        w_stall = Signal()
+        m.d.comb += aw_stall.eq(Cat(*[ bus.awvalid & ~bus.awready for bus in self.buses ]).any())
+        m.d.comb += w_stall.eq(Cat(*[ bus.wvalid & ~bus.wready for bus in self.buses ]).any())
+
+        # Bytes written in this cycle (number of enabled byte lanes)
+        beat_bytes = []
+        for bus in self.buses:
+            lanes = sum([ bus.wstrb[i] for i in range(0, len(bus.wstrb)) ])
+            beat_bytes.append(Mux(bus.wvalid & bus.wready, lanes, 0))
+
+        # Outstanding write bursts
+        n_aw = sum([ bus.awvalid & bus.awready for bus in self.buses ])
+        n_b = sum([ bus.bvalid & bus.bready for bus in self.buses ])
+        outstanding_next = Signal(16)
+        m.d.comb += outstanding_next.eq(outstanding + n_aw - n_b)
+        m.d.sync += outstanding.eq(outstanding_next)
+
+        with m.If(clear):
+            m.d.sync += busy_cycles.eq(0)
+            m.d.sync += aw_stall_cycles.eq(0)
+            m.d.sync += w_stall_cycles.eq(0)
+            m.d.sync += data_stall_cycles.eq(0)
+            m.d.sync += n_bytes.eq(0)
+            m.d.sync += max_outstanding.eq(outstanding_next)
+        with m.Else():
+            with m.If(self.busy_in):
+                m.d.sync += busy_cycles.eq(busy_cycles + 1)
+            with m.If(aw_stall):
+                m.d.sync += aw_stall_cycles.eq(aw_stall_cycles + 1)
+            with m.If(w_stall):
+                m.d.sync += w_stall_cycles.eq(w_stall_cycles + 1)
+            with m.If(self.data_stall_in):
+                m.d.sync += data_stall_cycles.eq(data_stall_cycles + 1)
+            m.d.sync += n_bytes.eq(n_bytes + sum(beat_bytes))
+            with m.If(outstanding_next > max_outstanding):
+                m.d.sync += max_outstanding.eq(outstanding_next)
+
+        return m
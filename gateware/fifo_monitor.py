@@ -0,0 +1,138 @@
+from nmigen import *
+from nmigen.lib.cdc import FFSynchronizer
+from nmigen.lib.coding import GrayEncoder, GrayDecoder
+
+class FIFOMonitor_LevelReg:
+    """FIFO monitor: fill level register (read-only)
+
+    Current number of words in the FIFO, as seen from the read side.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class FIFOMonitor_HighWaterReg:
+    """FIFO monitor: high-water mark register (write to clear)
+
+    Highest fill level since the register was last cleared. Write any value
+    to clear (the register then restarts from the current fill level).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class FIFOMonitor_OverflowCountReg:
+    """FIFO monitor: overflow count register (write to clear)
+
+    Number of write clock cycles in which a word was offered to the FIFO
+    (w_en) while the FIFO was full. A source that cannot wait (e.g. a
+    sensor) would have lost these words. Write any value to clear.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class FIFOMonitor_UnderflowCountReg:
+    """FIFO monitor: underflow count register (write to clear)
+
+    Number of read clock cycles in which the consumer was waiting for data
+    (r_req_in) while the FIFO was empty. Write any value to clear.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class FIFOMonitor(Elaboratable):
+    """FIFO monitor
+
+    Fill level telemetry for a FIFO (SyncFIFO or AsyncFIFO). The registers
+    are in the `sync' domain, which must be the read domain of the FIFO. If
+    the FIFO is written from another clock domain (w_domain), the overflow
+    counter runs in that domain and is passed to the `sync' domain as a Gray
+    code, so it can be sampled at any time.
+
+    For an AsyncFIFO, the fill level on the read side lags behind the write
+    side by a few cycles, so the high-water mark may be slightly lower than
+    the actual maximum fill level.
+
+    The overflow counter is cleared by remembering its value at the time of
+    the clear and subtracting it, so no reset needs to cross clock domains.
+
+    fifo -- the FIFO to monitor.
+    w_domain -- write clock domain of the FIFO.
+    """
+    def __init__(self, fifo, w_domain="sync"):
+        self.fifo = fifo
+        self.w_domain = w_domain
+
+        # Registers
+        self.level_reg = FIFOMonitor_LevelReg()
+        self.high_water_reg = FIFOMonitor_HighWaterReg()
+        self.overflow_count_reg = FIFOMonitor_OverflowCountReg()
+        self.underflow_count_reg = FIFOMonitor_UnderflowCountReg()
+
+        # Consumer is waiting for data (read domain)
+        self.r_req_in = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        level = self.fifo.r_level
+
+        # Fill level and high-water mark
+        high_water = Signal(len(level))
+
+        with m.If(self.high_water_reg.wstrb_in.any()):
+            m.d.sync += high_water.eq(level)
+        with m.Elif(level > high_water):
+            m.d.sync += high_water.eq(level)
+
+        m.d.comb += self.level_reg.data_out.eq(level)
+        m.d.comb += self.high_water_reg.data_out.eq(high_water)
+
+        # Overflow counter (write domain)
+        n_overflow_w = Signal(32)
+        n_overflow = Signal(32)
+
+        with m.If(self.fifo.w_en & ~self.fifo.w_rdy):
+            m.d[self.w_domain] += n_overflow_w.eq(n_overflow_w + 1)
+
+        if self.w_domain == "sync":
+            m.d.comb += n_overflow.eq(n_overflow_w)
+        else:
+            overflow_enc = GrayEncoder(32)
+            overflow_dec = GrayDecoder(32)
+            m.submodules.overflow_enc = overflow_enc
+            m.submodules.overflow_dec = overflow_dec
+
+            overflow_gray_w = Signal(32)
+            overflow_gray = Signal(32)
+
+            m.d.comb += overflow_enc.i.eq(n_overflow_w)
+            m.d[self.w_domain] += overflow_gray_w.eq(overflow_enc.o)
+            m.submodules.overflow_cdc = FFSynchronizer(overflow_gray_w, overflow_gray, o_domain="sync")
+            m.d.comb += overflow_dec.i.eq(overflow_gray)
+            m.d.comb += n_overflow.eq(overflow_dec.o)
+
+        overflow_base = Signal(32)
+
+        with m.If(self.overflow_count_reg.wstrb_in.any()):
+            m.d.sync += overflow_base.eq(n_overflow)
+
+        m.d.comb += self.overflow_count_reg.data_out.eq(n_overflow - overflow_base)
+
+        # Underflow counter (read domain)
+        n_underflow = Signal(32)
+
+        with m.If(self.underflow_count_reg.wstrb_in.any()):
+            m.d.sync += n_underflow.eq(0)
+        with m.Elif(self.r_req_in & ~self.fifo.r_rdy):
+            m.d.sync += n_underflow.eq(n_underflow + 1)
+
+        m.d.comb += self.underflow_count_reg.data_out.eq(n_underflow)
+
+        return m
@@ -1,4 +1,6 @@
 from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from axi_reg_bank import MemoryWindow
 
 class IntEnableRegister:
     """Interrupt controller: interrupt enable register (read/write)
@@ -31,14 +33,281 @@ class IntCountRegister:
         self.wstrb_in = Signal(4)
         self.data_out = Signal(32)
 
-class IntCtrl(Elaboratable):
+class IntCoalesceCountRegister:
+    """Interrupt coalescing: event threshold register (read/write)
+
+    Bit 15-0: Number of events after which the interrupt is raised. 0 and 1:
+              raise the interrupt on every event (default: 1).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(16, reset=1)
+
+class IntCoalesceTimeRegister:
+    """Interrupt coalescing: timeout register (read/write)
+
+    Number of clock cycles after the first unserviced event after which the
+    interrupt is raised, even if the event threshold has not been reached.
+    0: no timeout (default).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class IntCoalesceMergedRegister:
+    """Interrupt coalescing: merged events register (read-only)
+
+    Bit 31-16: Number of events merged into the most recently acknowledged interrupt.
+    Bit 15-0: Number of events since the interrupt was last acknowledged.
+
+    Both counts saturate at 0xFFFF.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class IntCoalescer(Elaboratable):
+    """Interrupt coalescing
+
+    Counts events (event_in) and raises pending_out once the number of events
+    reaches the event threshold, or once the timeout has expired since the
+    first event that has not been acknowledged yet, whichever comes first.
+    pending_out stays set until acknowledged (clear_in). An event in the same
+    cycle as the acknowledge counts towards the next interrupt.
+    """
+    def __init__(self):
+        self.count_reg = IntCoalesceCountRegister()
+        self.time_reg = IntCoalesceTimeRegister()
+        self.merged_reg = IntCoalesceMergedRegister()
+
+        self.event_in = Signal(1)
+        self.clear_in = Signal(1)
+        self.pending_out = Signal(1)
+
+        self._pending = Signal(1)
+        self._n_events = Signal(16)
+        self._n_merged = Signal(16)
+        self._timer = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # register read
+        m.d.comb += self.count_reg.data_out.eq(Cat(self.count_reg._data, Const(0, 16)))
+        m.d.comb += self.time_reg.data_out.eq(self.time_reg._data)
+        m.d.comb += self.merged_reg.data_out.eq(Cat(self._n_events, self._n_merged))
+
+        # register write
+        for i in range(0, 2):
+            with m.If(self.count_reg.wstrb_in[i] == 1):
+                m.d.sync += self.count_reg._data[8*i:8*(i+1)].eq(self.count_reg.data_in[8*i:8*(i+1)])
+
+        for i in range(0, 4):
+            with m.If(self.time_reg.wstrb_in[i] == 1):
+                m.d.sync += self.time_reg._data[8*i:8*(i+1)].eq(self.time_reg.data_in[8*i:8*(i+1)])
+
+        # logic
+        n_base = Signal(16)
+        n_next = Signal(16)
+
+        with m.If(self.clear_in):
+            m.d.comb += n_base.eq(0)
+            m.d.sync += self._n_merged.eq(self._n_events)
+        with m.Else():
+            m.d.comb += n_base.eq(self._n_events)
+
+        with m.If(self.event_in & (n_base != 0xFFFF)):
+            m.d.comb += n_next.eq(n_base + 1)
+        with m.Else():
+            m.d.comb += n_next.eq(n_base)
+
+        m.d.sync += self._n_events.eq(n_next)
+
+        fire = Signal()
+        with m.If((self._pending == 0) | (self.clear_in == 1)):
+            with m.If(n_next == 0):
+                m.d.sync += self._timer.eq(0)
+            with m.Else():
+                m.d.sync += self._timer.eq(self._timer + 1)
+
+            with m.If((n_next != 0) & (n_next >= self.count_reg._data)):
+                m.d.comb += fire.eq(1)
+            with m.If((n_next != 0) & (self.time_reg._data != 0) & (self._timer >= self.time_reg._data)):
+                m.d.comb += fire.eq(1)
+        with m.Else():
+            m.d.sync += self._timer.eq(0)
+
+        with m.If(fire):
+            m.d.sync += self._pending.eq(1)
+        with m.Elif(self.clear_in):
+            m.d.sync += self._pending.eq(0)
+
+        m.d.comb += self.pending_out.eq(self._pending)
+
+        return m
+
+class IntEventWriteCountRegister:
+    """Interrupt event log: write count register (read-only)
+
+    Number of records written to the event window since reset (wraps
+    around). Record i is at offset 16*(i mod depth) in the window.
+    """
     def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class IntEventReadCountRegister:
+    """Interrupt event log: read count register (read/write)
+
+    Number of records read by software. Write the new value after reading
+    records from the window to free their space.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class IntEventLostRegister:
+    """Interrupt event log: lost events register (read-only)
+
+    Number of events that were lost because the event window and the event
+    FIFO were full.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class IntEventLog(Elaboratable):
+    """Interrupt event log
+
+    Records each cycle with events in the cycle it happens, so software gets
+    the exact time of each event instead of the time at which the interrupt
+    handler runs, and does not miss events that arrive while an interrupt is
+    still pending. A record consists of 4 words:
+
+    Word 0: Bit i: 1 if source i had an event.
+    Word 1: Bits 31-0 of the timestamp.
+    Word 2: Bits 63-32 of the timestamp.
+    Word 3: Payload.
+
+    The records go to a FIFO, from which they are copied to a ring buffer in
+    the event window. Both take one record per cycle (the window memory is
+    128 bits wide), so the FIFO only fills up while the window is full. The
+    interrupt
+    handler reads the write count register, reads all new records with a
+    burst read (e.g. memcpy_fromio) and writes the read count register.
+
+    n_sources -- number of interrupt sources (at most 32).
+    timestamp -- 64 bit timestamp (see Timestamp).
+    depth -- number of records in the event window (power of 2).
+    fifo_depth -- number of records in the FIFO (for bursts of events).
+
+    Inputs:
+    event_in -- bit i: 1 for an event from source i.
+    payload_in -- payload of the record (32 bit).
+    """
+    def __init__(self, n_sources, timestamp, depth=256, fifo_depth=16):
+        if not 1 <= n_sources <= 32:
+            raise ValueError("1 to 32 interrupt sources are supported")
+        if depth < 1 or depth & (depth-1) != 0:
+            raise ValueError("depth must be a power of 2")
+
+        self.n_sources = n_sources
+        self.timestamp = timestamp
+        self.depth = depth
+        self.fifo_depth = fifo_depth
+
+        # Registers
+        self.write_count_reg = IntEventWriteCountRegister()
+        self.read_count_reg = IntEventReadCountRegister()
+        self.lost_reg = IntEventLostRegister()
+
+        # Event window (read-only, written by the gateware)
+        self.window = MemoryWindow(4*depth, writable=False, width=128)
+
+        self.event_in = Signal(n_sources)
+        self.payload_in = Signal(32)
+
+        self._write_count = Signal(32)
+        self._lost = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        fifo = SyncFIFO(width=128, depth=self.fifo_depth)
+        m.submodules.fifo = fifo
+
+        # register read
+        m.d.comb += self.write_count_reg.data_out.eq(self._write_count)
+        m.d.comb += self.read_count_reg.data_out.eq(self.read_count_reg._data)
+        m.d.comb += self.lost_reg.data_out.eq(self._lost)
+
+        # register write
+        for i in range(0, 4):
+            with m.If(self.read_count_reg.wstrb_in[i] == 1):
+                m.d.sync += self.read_count_reg._data[8*i:8*(i+1)].eq(self.read_count_reg.data_in[8*i:8*(i+1)])
+
+        # capture the record in the cycle of the event
+        m.d.comb += fifo.w_data.eq(Cat(self.event_in, Const(0, 32-self.n_sources), self.timestamp[0:64], self.payload_in))
+
+        with m.If(self.event_in.any()):
+            with m.If(fifo.w_rdy):
+                m.d.comb += fifo.w_en.eq(1)
+            with m.Else():
+                m.d.sync += self._lost.eq(self._lost + 1)
+
+        # copy records to the event window, one record per cycle
+        space = Signal()
+        m.d.comb += space.eq((self._write_count - self.read_count_reg._data)[0:32] < self.depth)
+
+        # (the register bank owns the write port of the window memory)
+        m.d.comb += self.window.w_addr_in.eq(self._write_count[0:(self.depth-1).bit_length()])
+        m.d.comb += self.window.w_data_in.eq(fifo.r_data)
+
+        with m.If(fifo.r_rdy & space):
+            m.d.comb += self.window.w_en_in.eq(1)
+            m.d.comb += fifo.r_en.eq(1)
+            m.d.sync += self._write_count.eq(self._write_count + 1)
+
+        return m
+
+class IntCtrl(Elaboratable):
+    """Interrupt controller
+
+    timestamp -- 64 bit timestamp (see Timestamp). If given, the requests are
+        recorded in an event log (see IntEventLog, with event_payload_in as
+        payload).
+    event_depth -- number of records in the event log.
+    """
+    def __init__(self, timestamp=None, event_depth=256):
+        self._coalescer = IntCoalescer()
+
+        if timestamp is not None:
+            self.event_log = IntEventLog(1, timestamp, depth=event_depth)
+        else:
+            self.event_log = None
+
         self.enable_reg = IntEnableRegister()
         self.status_reg = IntStatusRegister()
         self.count_reg = IntCountRegister()
+        self.coalesce_count_reg = self._coalescer.count_reg
+        self.coalesce_time_reg = self._coalescer.time_reg
+        self.coalesce_merged_reg = self._coalescer.merged_reg
 
         self.int_req_in = Signal(1)
         self.int_pending_out = Signal(1)
+        self.event_payload_in = Signal(32)
 
         self._int_enable = Signal(1)
         self._int_pending = Signal(1)
@@ -48,6 +317,8 @@ class IntCtrl(Elaboratable):
     def elaborate(self, platform):
         m = Module()
 
+        m.submodules.coalescer = self._coalescer
+
         # register read
         m.d.comb += self.enable_reg.data_out.eq(Cat(self._int_enable, Const(0, 31)))
         m.d.comb += self.status_reg.data_out.eq(Cat(self._int_pending, Const(0, 15), self._int_overflow, Const(0, 15)))
@@ -58,7 +329,7 @@ class IntCtrl(Elaboratable):
             m.d.sync += self._int_enable.eq(self.enable_reg.data_in[0])
 
         with m.If((self.status_reg.wstrb_in[0] == 1) & (self.status_reg.data_in[0] == 1)):
-            m.d.sync += self._int_pending.eq(0)
+            m.d.comb += self._coalescer.clear_in.eq(1)
 
         with m.If((self.status_reg.wstrb_in[2] == 1) & (self.status_reg.data_in[16] == 1)):
             m.d.sync += self._int_overflow.eq(0)
@@ -69,8 +340,161 @@ class IntCtrl(Elaboratable):
             with m.If(self._int_enable):
                 with m.If(self._int_pending):
                     m.d.sync += self._int_overflow.eq(1)
-                m.d.sync += self._int_pending.eq(1)
+                m.d.comb += self._coalescer.event_in.eq(1)
 
+        m.d.comb += self._int_pending.eq(self._coalescer.pending_out)
         m.d.comb += self.int_pending_out.eq(self._int_pending)
 
+        if self.event_log is not None:
+            m.submodules.event_log = self.event_log
+
+            m.d.comb += self.event_log.event_in.eq(self.int_req_in & self._int_enable)
+            m.d.comb += self.event_log.payload_in.eq(self.event_payload_in)
+
+        return m
+
+class VecIntEnableRegister:
+    """Vectored interrupt controller: enable register (read/write)
+
+    Bit i: Set to 1 to enable interrupt requests from source i.
+    """
+    def __init__(self, n_sources):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(n_sources)
+
+class VecIntPendingRegister:
+    """Vectored interrupt controller: pending register (write to clear)
+
+    Bit i: Reads as 1 if an interrupt from source i is pending. Write 1 to clear.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class VecIntOverflowRegister:
+    """Vectored interrupt controller: overflow register (write to clear)
+
+    Bit i: Reads as 1 if an interrupt from source i arrived while the last one
+           was still pending. Write 1 to clear.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class VecIntRouteRegister:
+    """Vectored interrupt controller: routing register for one interrupt line (read/write)
+
+    Bit i: Set to 1 to signal pending interrupts from source i on this line.
+    (default: all sources on line 0, none on the other lines)
+    """
+    def __init__(self, n_sources, reset=0):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(n_sources, reset=reset)
+
+class VecIntCtrl(Elaboratable):
+    """Vectored interrupt controller
+
+    Handles interrupt requests from several sources. The enable, pending and
+    overflow bits of all sources are packed into one register each, so the
+    interrupt handler learns all sources to service from a single read of the
+    pending register, and acknowledges them with a single write.
+
+    Each interrupt line signals the pending interrupts of the sources that are
+    routed to it. Sources can be routed to different lines (e.g. to handle
+    them on different cores) or to several lines.
+
+    n_sources -- number of interrupt sources (at most 32).
+    n_lines -- number of interrupt lines (at most 16, the number of IRQF2P
+        lines of the PS).
+    timestamp -- 64 bit timestamp (see Timestamp). If given, the requests are
+        recorded in an event log (see IntEventLog, with event_payload_in as
+        payload).
+    event_depth -- number of records in the event log.
+
+    Inputs:
+    int_req_in -- bit i: 1 for an interrupt request from source i (one per
+        cycle).
+    event_payload_in -- payload of the event log records.
+
+    Outputs:
+    int_out -- bit j: 1 if an interrupt routed to line j is pending.
+    """
+    def __init__(self, n_sources, n_lines=1, timestamp=None, event_depth=256):
+        if not 1 <= n_sources <= 32:
+            raise ValueError("1 to 32 interrupt sources are supported")
+        if not 1 <= n_lines <= 16:
+            raise ValueError("1 to 16 interrupt lines are supported")
+
+        self.n_sources = n_sources
+        self.n_lines = n_lines
+
+        # Registers
+        self.enable_reg = VecIntEnableRegister(n_sources)
+        self.pending_reg = VecIntPendingRegister()
+        self.overflow_reg = VecIntOverflowRegister()
+        self.route_regs = [ VecIntRouteRegister(n_sources, reset=(2**n_sources-1 if i == 0 else 0))
+                            for i in range(0, n_lines) ]
+
+        if timestamp is not None:
+            self.event_log = IntEventLog(n_sources, timestamp, depth=event_depth)
+        else:
+            self.event_log = None
+
+        self.int_req_in = Signal(n_sources)
+        self.int_out = Signal(n_lines)
+        self.event_payload_in = Signal(32)
+
+        self._pending = Signal(n_sources)
+        self._overflow = Signal(n_sources)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        n = self.n_sources
+
+        # register read
+        m.d.comb += self.enable_reg.data_out.eq(self.enable_reg._data)
+        m.d.comb += self.pending_reg.data_out.eq(self._pending)
+        m.d.comb += self.overflow_reg.data_out.eq(self._overflow)
+        for reg in self.route_regs:
+            m.d.comb += reg.data_out.eq(reg._data)
+
+        # register write
+        for reg in [ self.enable_reg ] + self.route_regs:
+            for i in range(0, (n+7)//8):
+                with m.If(reg.wstrb_in[i] == 1):
+                    m.d.sync += reg._data[8*i:min(8*(i+1), n)].eq(reg.data_in[8*i:min(8*(i+1), n)])
+
+        # bits cleared by the write to the pending/overflow register (a
+        # request in the same cycle sets the bit again)
+        pending_clear = Signal(n)
+        overflow_clear = Signal(n)
+        for i in range(0, n):
+            m.d.comb += pending_clear[i].eq(self.pending_reg.wstrb_in[i//8] & self.pending_reg.data_in[i])
+            m.d.comb += overflow_clear[i].eq(self.overflow_reg.wstrb_in[i//8] & self.overflow_reg.data_in[i])
+
+        # logic
+        req = Signal(n)
+        m.d.comb += req.eq(self.int_req_in & self.enable_reg._data)
+
+        m.d.sync += self._pending.eq((self._pending & ~pending_clear) | req)
+        m.d.sync += self._overflow.eq((self._overflow & ~overflow_clear) | (req & self._pending & ~pending_clear))
+
+        for (i, reg) in enumerate(self.route_regs):
+            m.d.comb += self.int_out[i].eq((self._pending & reg._data).any())
+
+        if self.event_log is not None:
+            m.submodules.event_log = self.event_log
+
+            m.d.comb += self.event_log.event_in.eq(req)
+            m.d.comb += self.event_log.payload_in.eq(self.event_payload_in)
+
         return m
@@ -0,0 +1,64 @@
+"""Reference model of the packed pixel format
+
+Pixels of 8, 10, 12 or 16 bits are packed densely into 64 bit words, starting
+at bit 0 of the first word. A pixel that does not fit into the remaining bits
+of a word continues at bit 0 of the next word. The last word of a frame is
+padded with zeros. Since the words are written to memory in little endian
+byte order, this is the same as a little endian bit stream of the pixels.
+
+This module does not depend on nMigen, so it can also be used by host
+software to check or convert captured frames.
+"""
+
+# Pixel size in bits for each value of the MODE field of the pixel packer
+MODE_BITS = [ 8, 10, 12, 16 ]
+
+def packed_words(n_pixels, bits):
+    """Number of 64 bit words needed for n_pixels pixels of the given size"""
+    return (n_pixels*bits + 63) // 64
+
+def pack_pixels(pixels, bits):
+    """Packs pixels into a list of 64 bit words
+
+    Bits of a pixel above the pixel size are ignored.
+    """
+    mask = (1 << bits) - 1
+    words = []
+    acc = 0
+    fill = 0
+    for p in pixels:
+        acc |= (p & mask) << fill
+        fill += bits
+        if fill >= 64:
+            words.append(acc & 0xFFFFFFFFFFFFFFFF)
+            acc >>= 64
+            fill -= 64
+    if fill > 0:
+        words.append(acc)
+    return words
+
+def unpack_pixels(words, bits, n_pixels):
+    """Unpacks n_pixels pixels from a list of 64 bit words"""
+    mask = (1 << bits) - 1
+    pixels = []
+    acc = 0
+    fill = 0
+    i = 0
+    while len(pixels) < n_pixels:
+        if fill < bits:
+            acc |= words[i] << fill
+            fill += 64
+            i += 1
+        pixels.append(acc & mask)
+        acc >>= bits
+        fill -= bits
+    return pixels
+
+def pack_bytes(pixels, bits):
+    """Packs pixels into a bytes object, as the frame appears in memory"""
+    return b"".join([ w.to_bytes(8, "little") for w in pack_pixels(pixels, bits) ])
+
+def unpack_bytes(data, bits, n_pixels):
+    """Unpacks n_pixels pixels from a frame in memory (bytes object)"""
+    words = [ int.from_bytes(data[i:i+8], "little") for i in range(0, len(data) - len(data) % 8, 8) ]
+    return unpack_pixels(words, bits, n_pixels)
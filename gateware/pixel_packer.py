@@ -0,0 +1,125 @@
+from nmigen import *
+
+from pixel_format import MODE_BITS
+
+class PixelPacker_ModeReg:
+    """Pixel packer: mode register
+
+    Bits 1-0: MODE. Pixel size: 0 = 8 bit, 1 = 10 bit, 2 = 12 bit,
+              3 = 16 bit. Must not be changed while a frame is being
+              packed.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(2)
+
+class PixelPacker(Elaboratable):
+    """Pixel packer
+
+    Gearbox that packs a stream of pixels of 8, 10, 12 or 16 bits densely
+    into 64 bit words and feeds them into the fifo (see pixel_format.py for
+    the layout and a reference model). Compared to padding each pixel to 16
+    bits, this saves 37.5% of the memory bandwidth for 10 bit pixels and 25%
+    for 12 bit pixels.
+
+    A pixel is taken from pixel_in when valid_in and ready_out are both 1.
+    Bits of pixel_in above the pixel size are ignored. The pixels are
+    collected in an 80 bit accumulator, and a word is written to the fifo as
+    soon as 64 bits are available. With 16 bit pixels, one pixel is accepted
+    per cycle as long as the fifo is not full, so the packer does not limit
+    the throughput.
+
+    Set last_in together with the last pixel of a frame to flush the
+    accumulator: the remaining bits are written as a last word padded with
+    zeros, so the next frame starts on a word boundary. No pixels are
+    accepted until the flush is complete.
+
+    The mode register is always in the `sync' domain. The packer itself runs
+    in the clock domain given by `domain' (e.g. the pixel clock domain of a
+    camera, feeding an asynchronous FIFO). The mode is not synchronized, so
+    it must only be changed between frames.
+    """
+    def __init__(self, fifo, domain="sync"):
+        # Registers
+        self.mode_reg = PixelPacker_ModeReg()
+
+        # Data FIFO
+        self.fifo = fifo
+
+        # Clock domain of the packer
+        self.domain = domain
+
+        # Pixel input
+        self.pixel_in = Signal(16)
+        self.valid_in = Signal()
+        self.last_in = Signal()
+        self.ready_out = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # Mode register logic
+        with m.If(self.mode_reg.wstrb_in[0] == 1):
+            m.d.sync += self.mode_reg._data.eq(self.mode_reg.data_in[0:2])
+
+        m.d.comb += self.mode_reg.data_out.eq(self.mode_reg._data)
+
+        # Pixel size and masked pixel
+        bits = Signal(5)
+        pixel = Signal(16)
+        with m.Switch(self.mode_reg._data):
+            for (mode, n) in enumerate(MODE_BITS):
+                with m.Case(mode):
+                    m.d.comb += bits.eq(n)
+                    m.d.comb += pixel.eq(self.pixel_in[0:n])
+
+        # Gearbox
+        gen = m.d[self.domain]
+        acc = Signal(80)
+        fill = Signal(range(81))
+        flush = Signal()
+
+        # A full word is written whenever 64 bits are available; a partial
+        # word only when flushing
+        full = Signal()
+        out = Signal()
+        m.d.comb += full.eq(fill >= 64)
+        m.d.comb += out.eq(self.fifo.w_rdy & (full | (flush & (fill != 0))))
+
+        m.d.comb += self.fifo.w_data.eq(acc[0:64])
+        m.d.comb += self.fifo.w_en.eq(out)
+
+        # Accumulator after writing a word
+        rest = Signal(80)
+        rest_fill = Signal(range(81))
+        with m.If(out & full):
+            m.d.comb += rest.eq(acc[64:80])
+            m.d.comb += rest_fill.eq(fill - 64)
+        with m.Elif(out):
+            m.d.comb += rest.eq(0)
+            m.d.comb += rest_fill.eq(0)
+        with m.Else():
+            m.d.comb += rest.eq(acc)
+            m.d.comb += rest_fill.eq(fill)
+
+        # At most 63 bits remain after writing a word, so a pixel always fits
+        # into the accumulator then
+        m.d.comb += self.ready_out.eq(~flush & (~full | out))
+
+        take = Signal()
+        m.d.comb += take.eq(self.valid_in & self.ready_out)
+
+        with m.If(take == 1):
+            gen += acc.eq(rest | (pixel << rest_fill))
+            gen += fill.eq(rest_fill + bits)
+            gen += flush.eq(self.last_in)
+        with m.Else():
+            gen += acc.eq(rest)
+            gen += fill.eq(rest_fill)
+            with m.If(flush & (rest_fill == 0)):
+                gen += flush.eq(0)
+
+        return m
@@ -6,11 +6,72 @@ class PS7(Elaboratable):
         self.fclk = Signal(4)
         self.m_axi_gp0 = axi.AXI3Bus()
         self.s_axi_hp0 = axi.AXI3Bus(id_bits=6, data_bits=64)
+        self.s_axi_hp1 = axi.AXI3Bus(id_bits=6, data_bits=64)
+        self.s_axi_hp2 = axi.AXI3Bus(id_bits=6, data_bits=64)
+        self.s_axi_hp3 = axi.AXI3Bus(id_bits=6, data_bits=64)
+        self.s_axi_hp = [ self.s_axi_hp0, self.s_axi_hp1, self.s_axi_hp2, self.s_axi_hp3 ]
+        self.s_axi_acp = axi.AXI3Bus(id_bits=3, data_bits=64, user_bits=5)
         self.irqf2p = Signal(16)
         self.emiogpio_i = Signal(64)
         self.emiogpio_o = Signal(64)
         self.emiogpio_tn = Signal(64)
 
+    def _s_axi_ports(self, p, bus):
+        """Ports of the PS7 cell for slave AXI port p (PL is master)"""
+        ports = {
+            "i_%sACLK"    % p: bus.aclk,
+            "o_%sARESETN" % p: bus.areset_n,
+
+            "i_%sAWID"    % p: bus.awid,
+            "i_%sAWADDR"  % p: bus.awaddr,
+            "i_%sAWLEN"   % p: bus.awlen,
+            "i_%sAWSIZE"  % p: bus.awsize,
+            "i_%sAWBURST" % p: bus.awburst,
+            "i_%sAWLOCK"  % p: bus.awlock,
+            "i_%sAWCACHE" % p: bus.awcache,
+            "i_%sAWPROT"  % p: bus.awprot,
+            "i_%sAWQOS"   % p: bus.awqos,
+            "i_%sAWVALID" % p: bus.awvalid,
+            "o_%sAWREADY" % p: bus.awready,
+
+            "i_%sARID"    % p: bus.arid,
+            "i_%sARADDR"  % p: bus.araddr,
+            "i_%sARLEN"   % p: bus.arlen,
+            "i_%sARSIZE"  % p: bus.arsize,
+            "i_%sARBURST" % p: bus.arburst,
+            "i_%sARLOCK"  % p: bus.arlock,
+            "i_%sARCACHE" % p: bus.arcache,
+            "i_%sARPROT"  % p: bus.arprot,
+            "i_%sARQOS"   % p: bus.arqos,
+            "i_%sARVALID" % p: bus.arvalid,
+            "o_%sARREADY" % p: bus.arready,
+
+            "i_%sWID"     % p: bus.wid,
+            "i_%sWDATA"   % p: bus.wdata,
+            "i_%sWSTRB"   % p: bus.wstrb,
+            "i_%sWLAST"   % p: bus.wlast,
+            "i_%sWVALID"  % p: bus.wvalid,
+            "o_%sWREADY"  % p: bus.wready,
+
+            "o_%sRID"     % p: bus.rid,
+            "o_%sRDATA"   % p: bus.rdata,
+            "o_%sRRESP"   % p: bus.rresp,
+            "o_%sRLAST"   % p: bus.rlast,
+            "o_%sRVALID"  % p: bus.rvalid,
+            "i_%sRREADY"  % p: bus.rready,
+
+            "o_%sBID"     % p: bus.bid,
+            "o_%sBRESP"   % p: bus.bresp,
+            "o_%sBVALID"  % p: bus.bvalid,
+            "i_%sBREADY"  % p: bus.bready
+        }
+
+        if hasattr(bus, "awuser"):
+            ports["i_%sAWUSER" % p] = bus.awuser
+            ports["i_%sARUSER" % p] = bus.aruser
+
+        return ports
+
     def elaborate(self, platform):
         m = Module()
 
@@ -75,51 +136,19 @@ class PS7(Elaboratable):
             o_MAXIGP0BREADY  = self.m_axi_gp0.bready,
 
             # S_AXI_HP0
-            i_SAXIHP0ACLK    = self.s_axi_hp0.aclk,
-            o_SAXIHP0ARESETN = self.s_axi_hp0.areset_n,
-
-            i_SAXIHP0AWID    = self.s_axi_hp0.awid,
-            i_SAXIHP0AWADDR  = self.s_axi_hp0.awaddr,
-            i_SAXIHP0AWLEN   = self.s_axi_hp0.awlen,
-            i_SAXIHP0AWSIZE  = self.s_axi_hp0.awsize,
-            i_SAXIHP0AWBURST = self.s_axi_hp0.awburst,
-            i_SAXIHP0AWLOCK  = self.s_axi_hp0.awlock,
-            i_SAXIHP0AWCACHE = self.s_axi_hp0.awcache,
-            i_SAXIHP0AWPROT  = self.s_axi_hp0.awprot,
-            i_SAXIHP0AWQOS   = self.s_axi_hp0.awqos,
-            i_SAXIHP0AWVALID = self.s_axi_hp0.awvalid,
-            o_SAXIHP0AWREADY = self.s_axi_hp0.awready,
-
-            i_SAXIHP0ARID    = self.s_axi_hp0.arid,
-            i_SAXIHP0ARADDR  = self.s_axi_hp0.araddr,
-            i_SAXIHP0ARLEN   = self.s_axi_hp0.arlen,
-            i_SAXIHP0ARSIZE  = self.s_axi_hp0.arsize,
-            i_SAXIHP0ARBURST = self.s_axi_hp0.arburst,
-            i_SAXIHP0ARLOCK  = self.s_axi_hp0.arlock,
-            i_SAXIHP0ARCACHE = self.s_axi_hp0.arcache,
-            i_SAXIHP0ARPROT  = self.s_axi_hp0.arprot,
-            i_SAXIHP0ARQOS   = self.s_axi_hp0.arqos,
-            i_SAXIHP0ARVALID = self.s_axi_hp0.arvalid,
-            o_SAXIHP0ARREADY = self.s_axi_hp0.arready,
-
-            i_SAXIHP0WID     = self.s_axi_hp0.wid,
-            i_SAXIHP0WDATA   = self.s_axi_hp0.wdata,
-            i_SAXIHP0WSTRB   = self.s_axi_hp0.wstrb,
-            i_SAXIHP0WLAST   = self.s_axi_hp0.wlast,
-            i_SAXIHP0WVALID  = self.s_axi_hp0.wvalid,
-            o_SAXIHP0WREADY  = self.s_axi_hp0.wready,
-
-            o_SAXIHP0RID     = self.s_axi_hp0.rid,
-            o_SAXIHP0RDATA   = self.s_axi_hp0.rdata,
-            o_SAXIHP0RRESP   = self.s_axi_hp0.rresp,
-            o_SAXIHP0RLAST   = self.s_axi_hp0.rlast,
-            o_SAXIHP0RVALID  = self.s_axi_hp0.rvalid,
-            i_SAXIHP0RREADY  = self.s_axi_hp0.rready,
-
-            o_SAXIHP0BID     = self.s_axi_hp0.bid,
-            o_SAXIHP0BRESP   = self.s_axi_hp0.bresp,
-            o_SAXIHP0BVALID  = self.s_axi_hp0.bvalid,
-            i_SAXIHP0BREADY  = self.s_axi_hp0.bready
+            **self._s_axi_ports("SAXIHP0", self.s_axi_hp0),
+
+            # S_AXI_HP1
+            **self._s_axi_ports("SAXIHP1", self.s_axi_hp1),
+
+            # S_AXI_HP2
+            **self._s_axi_ports("SAXIHP2", self.s_axi_hp2),
+
+            # S_AXI_HP3
+            **self._s_axi_ports("SAXIHP3", self.s_axi_hp3),
+
+            # S_AXI_ACP
+            **self._s_axi_ports("SAXIACP", self.s_axi_acp)
         )
 
         return m
@@ -0,0 +1,108 @@
+from nmigen import *
+
+class Snapshot_ControlReg:
+    """Snapshot: control register (write-only)
+
+    Bit 0: SNAPSHOT. Write 1 to latch all enabled values into the value
+           registers in the same cycle.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class Snapshot_MaskReg:
+    """Snapshot: mask register (read/write)
+
+    Bit i: 1 if value i is latched by SNAPSHOT (default: all values). The
+    value registers of disabled values keep their content.
+    """
+    def __init__(self, n_values):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(n_values, reset=2**n_values-1)
+
+class Snapshot_SeqReg:
+    """Snapshot: sequence register (read-only)
+
+    Number of snapshots taken since reset (wraps around). It is updated
+    together with the value registers, so reading it in the same burst as
+    the values tells which snapshot they belong to.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class Snapshot_ValueReg:
+    """Snapshot: value register (read-only)
+
+    Value at the time of the last snapshot that included it.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class Snapshot(Elaboratable):
+    """Snapshot of counters and status values
+
+    Counters that are read one register at a time keep running between the
+    reads, so the values are not consistent with each other. SNAPSHOT (or
+    trigger_in) latches all enabled values into the value registers in a
+    single cycle. When the sequence register and the value registers are
+    mapped at consecutive addresses, software can read a consistent set of
+    values with a single burst (e.g. memcpy_fromio).
+
+    values -- list of values to latch (up to 32 bits each, at most 32
+        values). Wider values must be split, e.g. into low and high words.
+
+    Inputs:
+    trigger_in -- 1 to take a snapshot (in addition to SNAPSHOT).
+    """
+    def __init__(self, values):
+        if len(values) > 32:
+            raise ValueError("at most 32 values are supported")
+
+        self.values = values
+
+        # Registers
+        self.control_reg = Snapshot_ControlReg()
+        self.mask_reg = Snapshot_MaskReg(len(values))
+        self.seq_reg = Snapshot_SeqReg()
+        self.value_regs = [ Snapshot_ValueReg() for _ in values ]
+
+        self.trigger_in = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        snapshot = Signal()
+        m.d.comb += snapshot.eq((self.control_reg.data_in[0] & self.control_reg.wstrb_in[0]) | self.trigger_in)
+        m.d.comb += self.control_reg.data_out.eq(0)
+
+        # Mask register logic
+        n = len(self.values)
+        for i in range(0, (n+7)//8):
+            with m.If(self.mask_reg.wstrb_in[i] == 1):
+                m.d.sync += self.mask_reg._data[8*i:min(8*(i+1), n)].eq(self.mask_reg.data_in[8*i:min(8*(i+1), n)])
+
+        m.d.comb += self.mask_reg.data_out.eq(self.mask_reg._data)
+
+        # Sequence and value registers
+        seq = Signal(32)
+        m.d.comb += self.seq_reg.data_out.eq(seq)
+
+        with m.If(snapshot):
+            m.d.sync += seq.eq(seq + 1)
+
+        for (i, (value, reg)) in enumerate(zip(self.values, self.value_regs)):
+            data = Signal(32)
+            m.d.comb += reg.data_out.eq(data)
+
+            with m.If(snapshot & self.mask_reg._data[i]):
+                m.d.sync += data.eq(value)
+
+        return m
@@ -0,0 +1,128 @@
+import zlib
+
+from nmigen import *
+
+class StreamCRC_ControlReg:
+    """Stream CRC: control register (write-only)
+
+    Bit 0: CLEAR. Write 1 to restart the CRC and clear the byte count.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class StreamCRC_CRCReg:
+    """Stream CRC: CRC register (read-only)
+
+    CRC-32 (as used by Ethernet and zlib) of all words since the last CLEAR.
+    Each word is taken as a sequence of bytes in little endian order, i.e.
+    in the order in which the bytes are written to memory, so the value is
+    the same as the CRC-32 of the memory region written by the DMA.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class StreamCRC_BytesReg:
+    """Stream CRC: bytes register (read-only)
+
+    Number of bytes included in the CRC since the last CLEAR.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+CRC32_POLY = 0xEDB88320
+
+def crc32_matrix(width):
+    """Returns the CRC-32 update for one word of the given width (in bits)
+
+    The CRC is linear, so each bit of the new CRC is the XOR of some bits of
+    the old CRC and of the data word. The result is a list of 32 pairs
+    (crc_mask, data_mask) of the bits that make up each bit of the new CRC.
+    The data bits are processed starting with bit 0, which is the order of
+    the reflected CRC-32 for little endian bytes.
+    """
+    # Each bit is represented by the set of old CRC bits (bits 0-31) and data
+    # bits (bits 32 and up) it depends on, as an integer bit mask
+    crc = [ 1 << i for i in range(0, 32) ]
+    for i in range(0, width):
+        lsb = crc[0] ^ (1 << (32+i))
+        crc = crc[1:] + [ 0 ]
+        for j in range(0, 32):
+            if (CRC32_POLY >> j) & 1:
+                crc[j] ^= lsb
+    return [ (c & 0xFFFFFFFF, c >> 32) for c in crc ]
+
+def crc32_words(words, width=64, crc=0):
+    """CRC-32 of a list of words, as computed by StreamCRC
+
+    Uses zlib on the little endian byte representation of the words, so it
+    is fast enough for large simulated transfers. Pass the result as crc to
+    continue the CRC over more words.
+    """
+    data = b"".join([ w.to_bytes(width//8, "little") for w in words ])
+    return zlib.crc32(data, crc)
+
+class StreamCRC(Elaboratable):
+    """Stream CRC
+
+    Computes a CRC-32 over a stream of words, e.g. the words that the AXI
+    writer takes from its FIFO. Comparing the CRC register with the CRC of
+    the expected data verifies a DMA transfer with a single register read,
+    instead of reading back the whole buffer. See crc32_words for a
+    reference implementation.
+
+    One word is processed per clock cycle, so the CRC never holds up the
+    stream. The update is a single level of XOR trees (see crc32_matrix).
+
+    width -- width of the words in bits (multiple of 8).
+
+    Inputs:
+    data_in -- data word.
+    valid_in -- 1 if data_in is to be included in the CRC (e.g. r_en and
+        r_rdy of the FIFO).
+    """
+    def __init__(self, width=64):
+        assert width % 8 == 0
+        self.width = width
+
+        # Registers
+        self.control_reg = StreamCRC_ControlReg()
+        self.crc_reg = StreamCRC_CRCReg()
+        self.bytes_reg = StreamCRC_BytesReg()
+
+        self.data_in = Signal(width)
+        self.valid_in = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        clear = Signal()
+        m.d.comb += clear.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0])
+        m.d.comb += self.control_reg.data_out.eq(0)
+
+        # CRC state (initial value and final XOR are 0xFFFFFFFF)
+        state = Signal(32, reset=0xFFFFFFFF)
+        n_bytes = Signal(32)
+
+        m.d.comb += self.crc_reg.data_out.eq(~state)
+        m.d.comb += self.bytes_reg.data_out.eq(n_bytes)
+
+        state_next = Signal(32)
+        for (i, (crc_mask, data_mask)) in enumerate(crc32_matrix(self.width)):
+            bits = [ state[j] for j in range(0, 32) if (crc_mask >> j) & 1 ]
+            bits += [ self.data_in[j] for j in range(0, self.width) if (data_mask >> j) & 1 ]
+            m.d.comb += state_next[i].eq(Cat(*bits).xor())
+
+        with m.If(clear):
+            m.d.sync += state.eq(0xFFFFFFFF)
+            m.d.sync += n_bytes.eq(0)
+        with m.Elif(self.valid_in):
+            m.d.sync += state.eq(state_next)
+            m.d.sync += n_bytes.eq(n_bytes + self.width//8)
+
+        return m
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+"""Synthesizes an AXI register bank on its own
+
+Usage: ./synth_reg_bank.py n_regs [region_size [clock frequency in MHz]]
+
+The bank with n_regs read/write registers is connected to M_AXI_GP0 of the
+PS, like the register bank of Top. The timing summary of Vivado (in
+build_reg_bank/) shows the slack at the given clock frequency (default
+200 MHz), and the achievable clock follows from it. No such figure has
+been recorded for the per-region decoder yet.
+"""
+import sys
+from nmigen import *
+from zedboard import ZedBoardPlatform
+from axi_reg_bank import AXIRegBank, Register_RW
+from ps7 import PS7
+
+class RegBankTop(Elaboratable):
+    def __init__(self, n_regs, region_size=32, clk_freq=200000000):
+        self.n_regs = n_regs
+        self.region_size = region_size
+        self.clk_freq = clk_freq
+
+    def elaborate(self, platform):
+        m = Module()
+
+        ps7 = PS7()
+        m.submodules += ps7
+
+        m.domains.sync = ClockDomain("sync")
+        clk = ClockSignal("sync")
+        m.d.comb += clk.eq(ps7.fclk[0])
+
+        clk_ = Signal()
+        m.d.comb += clk_.eq(clk)
+
+        platform.add_clock_constraint(clk_, self.clk_freq)
+
+        led = [ platform.request("led", i) for i in range(0, 8) ]
+
+        axi_reg_bus = ps7.m_axi_gp0
+        m.d.comb += axi_reg_bus.aclk.eq(clk)
+
+        regs = []
+        for i in range(0, self.n_regs):
+            reg = Register_RW()
+            regs.append(reg)
+            m.submodules += reg
+
+        axi_slave = AXIRegBank(axi_reg_bus, regs, 0x40000000, region_size=self.region_size)
+        m.submodules += axi_slave
+
+        for i in range(0, 8):
+            m.d.comb += led[i].o.eq(regs[0].data_out[i])
+
+        return m
+
+if len(sys.argv) < 2:
+    print(__doc__)
+    sys.exit(1)
+
+n_regs = int(sys.argv[1])
+region_size = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+clk_freq = int(sys.argv[3]) * 1000000 if len(sys.argv) > 3 else 200000000
+
+platform = ZedBoardPlatform()
+platform.build(RegBankTop(n_regs, region_size, clk_freq), name="reg_bank", build_dir="build_reg_bank")
@@ -0,0 +1,102 @@
+from nmigen import *
+
+class TestDataSink_DataReg:
+    """Test data sink: data register
+
+    Expected start value of the test data (see description of the
+    TestDataSink class for details).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class TestDataSink_CountReg:
+    """Test data sink: count register (read-only)
+
+    Number of 64 bit words received since the last START.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class TestDataSink_ErrorCountReg:
+    """Test data sink: error count register (read-only)
+
+    Number of 64 bit words received since the last START that did not match
+    the expected value.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class TestDataSink_ControlReg:
+    """Test data sink: control register (write-only)
+
+    Bit 0: START. Clears the count registers and loads the expected start
+           value from the data register.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class TestDataSink(Elaboratable):
+    """TestDataSink
+
+    Takes 64 bit words from the fifo (one word per cycle) and checks them
+    against the stream generated by the TestDataSource, i.e. words of the
+    form Cat(i, i+1), where i is a 32 bit value that increments by 2 between
+    words. The initial value of i is configurable. Words received and words
+    that did not match are counted.
+    """
+    def __init__(self, fifo):
+        # Registers
+        self.data_reg = TestDataSink_DataReg()
+        self.count_reg = TestDataSink_CountReg()
+        self.error_count_reg = TestDataSink_ErrorCountReg()
+        self.control_reg = TestDataSink_ControlReg()
+
+        # Data FIFO
+        self.fifo = fifo
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # Data register logic
+        for i in range(0, 4):
+            with m.If(self.data_reg.wstrb_in[i] == 1):
+                m.d.sync += self.data_reg._data[8*i:8*(i+1)].eq(self.data_reg.data_in[8*i:8*(i+1)])
+
+        m.d.comb += self.data_reg.data_out.eq(self.data_reg._data)
+
+        # Count register logic
+        n_data = Signal(32)
+        n_error = Signal(32)
+        m.d.comb += self.count_reg.data_out.eq(n_data)
+        m.d.comb += self.error_count_reg.data_out.eq(n_error)
+
+        # Control register logic
+        start = Signal()
+        m.d.comb += start.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0])
+        m.d.comb += self.control_reg.data_out.eq(0)
+
+        # Engine
+        data = Signal(32)
+        m.d.comb += self.fifo.r_en.eq(~start)
+
+        with m.If(start == 1):
+            m.d.sync += data.eq(self.data_reg._data)
+            m.d.sync += n_data.eq(0)
+            m.d.sync += n_error.eq(0)
+        with m.Elif(self.fifo.r_rdy == 1):
+            m.d.sync += data.eq(data+2)
+            m.d.sync += n_data.eq(n_data+1)
+            with m.If(self.fifo.r_data != Cat(data, (data+1)[0:32])):
+                m.d.sync += n_error.eq(n_error+1)
+
+        return m
@@ -1,5 +1,6 @@
 from nmigen import *
 from nmigen.lib.fifo import SyncFIFO
+from nmigen.lib.cdc import PulseSynchronizer
 
 class TestDataSource_DataReg:
     """Test data source: data register
@@ -39,30 +40,175 @@ class TestDataSource_StatusReg:
 class TestDataSource_ControlReg:
     """Test data source: control register (write-only)
 
-    Bit 0: START.
+    Bit 0: START. The data and count registers must not be changed while
+           the test data source is busy.
     """
     def __init__(self):
         self.data_in = Signal(32)
         self.wstrb_in = Signal(4)
         self.data_out = Signal(32)
 
+class TestDataSource_PatternReg:
+    """Test data source: pattern register
+
+    Bits 1-0: PATTERN. 0: ramp, 1: LFSR, 2: frame (see description of the
+              TestDataSource class for details).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class TestDataSource_ThrottleReg:
+    """Test data source: throttle register
+
+    Bits 15-0:  PERIOD. Length of the throttle period in cycles of the
+                generator clock. 0 disables the throttle.
+    Bits 31-16: WORDS. Maximum number of words per throttle period.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class TestDataSource_LineReg:
+    """Test data source: line register (frame pattern only)
+
+    Bits 15-0:  Number of words per line MINUS 1.
+    Bits 31-16: H_BLANK. Number of idle cycles after each line.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+class TestDataSource_FrameReg:
+    """Test data source: frame register (frame pattern only)
+
+    Bits 15-0:  Number of lines per frame MINUS 1.
+    Bits 31-16: V_BLANK. Number of idle cycles after the last line of a frame
+                (instead of H_BLANK).
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+        self._data = Signal(32)
+
+PATTERN_RAMP = 0
+PATTERN_LFSR = 1
+PATTERN_FRAME = 2
+
+# Galois LFSR, x^32 + x^22 + x^2 + x + 1 (maximum length), shifting right
+LFSR32_POLY = 0x80200003
+
+def lfsr32_next(value):
+    """Next state of the 32 bit LFSR of the test data source"""
+    if value & 1:
+        return (value >> 1) ^ LFSR32_POLY
+    else:
+        return value >> 1
+
+def pattern_words(pattern, data, count, line_words=1, n_lines=1):
+    """Words generated by the test data source
+
+    Reference implementation for the simulation tests.
+
+    pattern -- PATTERN_RAMP, PATTERN_LFSR or PATTERN_FRAME.
+    data -- value of the data register.
+    count -- number of words (count register PLUS 1).
+    line_words, n_lines -- words per line and lines per frame (line and
+        frame registers PLUS 1).
+    """
+    words = []
+    (x, y) = (0, 0)
+    for i in range(0, count):
+        if pattern == PATTERN_LFSR:
+            data_1 = lfsr32_next(data)
+            words.append(data_1 << 32 | data)
+            data = lfsr32_next(data_1)
+        elif pattern == PATTERN_FRAME:
+            words.append(data << 32 | y << 16 | x)
+            x += 1
+            if x == line_words:
+                x = 0
+                y += 1
+                if y == n_lines:
+                    y = 0
+                    data = (data + 1) & 0xFFFFFFFF
+        else:
+            words.append(((data+1) & 0xFFFFFFFF) << 32 | data)
+            data = (data + 2) & 0xFFFFFFFF
+    return words
+
 class TestDataSource(Elaboratable):
     """TestDataSource
 
     Creates a stream of a configurable number of 64 bit words and feeds them
-    into the fifo. The words are of the form Cat(i, i+1), where i is a 32 bit
-    value that increments by 2 between words and the addition is truncated to
-    32 bits. The initial value of i is configurable.
+    into the fifo. The pattern register selects the content of the words:
+
+    ramp -- Cat(i, i+1), where i is a 32 bit value that increments by 2
+        between words and the addition is truncated to 32 bits. The initial
+        value of i is the data register.
+    LFSR -- Cat(s, next(s)), where s is the state of a 32 bit LFSR (see
+        lfsr32_next), which advances by two steps between words. The
+        initial state is the data register and must not be 0.
+    frame -- Cat(x, y, f), where x (16 bits) is the word within the line, y
+        (16 bits) is the line within the frame and f (32 bits) is the frame
+        number, starting at the data register. The line and frame registers
+        set the size of a frame and the blanking: H_BLANK idle cycles
+        follow each line, V_BLANK idle cycles follow the last line of a
+        frame. The count register still sets the total number of words.
+
+    See pattern_words for a reference implementation.
+
+    The throttle register limits the rate to WORDS words per PERIOD cycles,
+    e.g. to emulate the pixel rate of a particular sensor. Otherwise, the
+    source writes one word per cycle as long as the FIFO accepts it.
+
+    A FIFO wider than 64 bits (64 bits times a power of 2) takes several
+    consecutive words per entry, the first word in the lowest bits, e.g. for
+    the AXI stripe writer. The source then writes one entry per cycle, and
+    the throttle register counts entries instead of words. If the count is
+    not a multiple of the words per entry, the last entry is filled up with
+    further words of the pattern. With the frame pattern, the number of
+    words per line must be a multiple of the words per entry.
+
+    The registers are always in the `sync' domain. The generator itself runs
+    in the clock domain given by `domain', e.g. the pixel clock domain of a
+    camera, and feeds the write side of an asynchronous FIFO in that case.
+    START and the end of the transfer are passed between the clock domains
+    by pulse synchronizers. The data and count registers are sampled by the
+    generator only after START has been synchronized (as are all other
+    registers), so they do not need synchronizers as long as they are stable
+    while the source is busy.
     """
-    def __init__(self, fifo):
+    def __init__(self, fifo, domain="sync"):
         # Registers
         self.data_reg = TestDataSource_DataReg()
         self.count_reg = TestDataSource_CountReg()
         self.status_reg = TestDataSource_StatusReg()
         self.control_reg = TestDataSource_ControlReg()
+        self.pattern_reg = TestDataSource_PatternReg()
+        self.throttle_reg = TestDataSource_ThrottleReg()
+        self.line_reg = TestDataSource_LineReg()
+        self.frame_reg = TestDataSource_FrameReg()
 
         # Data FIFO
         self.fifo = fifo
+        self.words = fifo.width // 64
+        if fifo.width % 64 != 0 or self.words & (self.words-1) != 0:
+            raise ValueError("FIFO width must be 64 bits times a power of 2")
+
+        # Clock domain of the generator
+        self.domain = domain
 
     def elaborate(self, platform):
         m = Module()
@@ -81,36 +227,150 @@ class TestDataSource(Elaboratable):
 
         m.d.comb += self.count_reg.data_out.eq(self.count_reg._data)
 
+        # Pattern, throttle, line and frame register logic
+        for reg in (self.pattern_reg, self.throttle_reg, self.line_reg, self.frame_reg):
+            for i in range(0, 4):
+                with m.If(reg.wstrb_in[i] == 1):
+                    m.d.sync += reg._data[8*i:8*(i+1)].eq(reg.data_in[8*i:8*(i+1)])
+
+            m.d.comb += reg.data_out.eq(reg._data)
+
         # Status register logic
         busy = Signal()
         m.d.comb += self.status_reg.data_out.eq(Cat(busy, Const(0, 31)))
 
         # Control register logic
         start = Signal()
-        m.d.comb += start.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0])
+        m.d.comb += start.eq(self.control_reg.data_in[0] & self.control_reg.wstrb_in[0] & ~busy)
         m.d.comb += self.control_reg.data_out.eq(0)
 
+        # Clock domain crossing
+        gen_start = Signal()
+        gen_done = Signal()
+
+        if self.domain == "sync":
+            m.d.comb += gen_start.eq(start)
+        else:
+            start_cdc = PulseSynchronizer(i_domain="sync", o_domain=self.domain)
+            done_cdc = PulseSynchronizer(i_domain=self.domain, o_domain="sync")
+            m.submodules.start_cdc = start_cdc
+            m.submodules.done_cdc = done_cdc
+
+            m.d.comb += start_cdc.i.eq(start)
+            m.d.comb += gen_start.eq(start_cdc.o)
+            m.d.comb += done_cdc.i.eq(gen_done)
+
+            # busy is set right away on START and cleared once the generator
+            # has finished, so software never sees a stale BUSY bit
+            with m.If(start == 1):
+                m.d.sync += busy.eq(1)
+            with m.Elif(done_cdc.o == 1):
+                m.d.sync += busy.eq(0)
+
         # Engine
+        gen = m.d[self.domain]
+        gen_busy = Signal()
         data = Signal(32)
         n_data = Signal(32)
-        m.d.comb += self.fifo.w_data.eq(Cat(data, (data+1)[0:32]))
 
-        with m.FSM(reset="WAIT_START"):
+        # Configuration, sampled on START
+        pattern = Signal(2)
+        period = Signal(16)
+        period_words = Signal(16)
+        line_words = Signal(16)
+        h_blank = Signal(16)
+        n_lines = Signal(16)
+        v_blank = Signal(16)
+
+        # Word and line within the frame, remaining blanking cycles
+        x = Signal(16)
+        y = Signal(16)
+        blank = Signal(16)
+
+        # Cycle within the throttle period, words written in the period
+        t_cycle = Signal(16)
+        t_words = Signal(16)
+
+        # Word is written to the FIFO
+        xfer = Signal()
+        m.d.comb += xfer.eq(self.fifo.w_en & self.fifo.w_rdy)
+
+        m.d.comb += self.fifo.w_en.eq(gen_busy & (blank == 0) & ((period == 0) | (t_words < period_words)))
+
+        # LFSR states of the words of the entry (two per word), and the
+        # state for the next entry
+        lfsr = [ data ]
+        for i in range(0, 2*self.words):
+            lfsr_i = Signal(32, name="lfsr_%d" % (i+1))
+            m.d.comb += lfsr_i.eq(Mux(lfsr[-1][0], (lfsr[-1] >> 1) ^ LFSR32_POLY, lfsr[-1] >> 1))
+            lfsr.append(lfsr_i)
+
+        with m.Switch(pattern):
+            with m.Case(PATTERN_LFSR):
+                m.d.comb += self.fifo.w_data.eq(Cat(*[ Cat(lfsr[2*j], lfsr[2*j+1]) for j in range(0, self.words) ]))
+            with m.Case(PATTERN_FRAME):
+                m.d.comb += self.fifo.w_data.eq(Cat(*[ Cat((x+j)[0:16], y, data) for j in range(0, self.words) ]))
+            with m.Default():
+                m.d.comb += self.fifo.w_data.eq(Cat(*[ Cat((data+2*j)[0:32], (data+2*j+1)[0:32]) for j in range(0, self.words) ]))
+
+        # Throttle
+        with m.If((t_cycle + 1)[0:16] == period):
+            gen += t_cycle.eq(0)
+            gen += t_words.eq(0)
+        with m.Else():
+            gen += t_cycle.eq(t_cycle + 1)
+            gen += t_words.eq(t_words + xfer)
+
+        with m.If(blank != 0):
+            gen += blank.eq(blank - 1)
+
+        with m.FSM(reset="WAIT_START", domain=self.domain):
             with m.State("WAIT_START"):
-                with m.If(start == 1):
-                    m.d.sync += data.eq(self.data_reg._data)
-                    m.d.sync += n_data.eq(self.count_reg._data)
-                    m.d.sync += self.fifo.w_en.eq(1)
-                    m.d.sync += busy.eq(1)
+                with m.If(gen_start == 1):
+                    gen += data.eq(self.data_reg._data)
+                    gen += n_data.eq(self.count_reg._data)
+                    gen += pattern.eq(self.pattern_reg._data[0:2])
+                    gen += period.eq(self.throttle_reg._data[0:16])
+                    gen += period_words.eq(self.throttle_reg._data[16:32])
+                    gen += line_words.eq(self.line_reg._data[0:16])
+                    gen += h_blank.eq(self.line_reg._data[16:32])
+                    gen += n_lines.eq(self.frame_reg._data[0:16])
+                    gen += v_blank.eq(self.frame_reg._data[16:32])
+                    gen += x.eq(0)
+                    gen += y.eq(0)
+                    gen += blank.eq(0)
+                    gen += t_cycle.eq(0)
+                    gen += t_words.eq(0)
+                    gen += gen_busy.eq(1)
                     m.next = "RUN"
             with m.State("RUN"):
-                with m.If(self.fifo.w_rdy == 1):
-                    with m.If(n_data > 0):
-                        m.d.sync += n_data.eq(n_data-1)
-                        m.d.sync += data.eq(data+2)
+                with m.If(xfer == 1):
+                    with m.Switch(pattern):
+                        with m.Case(PATTERN_LFSR):
+                            gen += data.eq(lfsr[-1])
+                        with m.Case(PATTERN_FRAME):
+                            with m.If(x == (line_words - (self.words-1))[0:16]):
+                                gen += x.eq(0)
+                                with m.If(y == n_lines):
+                                    gen += y.eq(0)
+                                    gen += data.eq(data+1)
+                                    gen += blank.eq(v_blank)
+                                with m.Else():
+                                    gen += y.eq(y+1)
+                                    gen += blank.eq(h_blank)
+                            with m.Else():
+                                gen += x.eq(x+self.words)
+                        with m.Default():
+                            gen += data.eq(data+2*self.words)
+
+                    with m.If(n_data >= self.words):
+                        gen += n_data.eq(n_data-self.words)
                     with m.Else():
-                        m.d.sync += self.fifo.w_en.eq(0)
-                        m.d.sync += busy.eq(0)
+                        gen += gen_busy.eq(0)
+                        m.d.comb += gen_done.eq(1)
                         m.next = "WAIT_START"
 
+        if self.domain == "sync":
+            m.d.comb += busy.eq(gen_busy)
+
         return m
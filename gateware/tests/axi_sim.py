@@ -393,3 +393,135 @@ def axi_read(axi_bus, transact, delay=0, assert_on_error=False, timeout=None):
                 assert(not assert_on_error)
 
             r_done += 1
+
+def axi_mem_sim(axi_bus, memory, beat_log=None, read_latency=0, write_latency=0, error_addr=0xF0000000, stall=None):
+    """Simulated AXI slave (memory) for a 64 bit AXI master.
+
+    axi_bus -- AXI bus (nMigen Record)
+    memory -- Python dictionary backing the simulated memory. Maps 64 bit
+        aligned addresses to 64 bit words. Reads from addresses not in the
+        dictionary return 0.
+    beat_log -- if not None, a list to which a tuple (cycle, address, data) is
+        appended for every write data beat.
+    read_latency -- number of cycles between acceptance of a read address and
+        the first read data beat.
+    write_latency -- number of cycles between the last write data beat and
+        the write response, or a function returning that number (called for
+        every burst).
+    error_addr -- accesses at or above this address return a SLVERR response.
+    stall -- if not None, probability (0..1) of deasserting AWREADY/WREADY in
+        any given cycle, or a function returning that probability (called
+        every cycle).
+
+    This is a passive simulation process. Bursts that cross a 128 byte
+    boundary and wrong values of WLAST are reported as errors.
+    """
+    yield Passive()
+
+    yield axi_bus.areset_n.eq(1)
+
+    yield axi_bus.awready.eq(1)
+    yield axi_bus.wready.eq(1)
+    yield axi_bus.arready.eq(1)
+
+    addr_fifo = []
+    resp_fifo = []
+    read_fifo = []
+    w_pending = []
+
+    cur_len = 0
+    cur_addr = 0
+    cur_id = 0
+    cycle = 0
+
+    awready = 1
+    wready = 1
+
+    while True:
+        # write address channel
+        if awready and (yield axi_bus.awvalid) == 1:
+            addr = (yield axi_bus.awaddr)
+            awlen = (yield axi_bus.awlen)
+            if (addr & ~0x7F) != ((addr+8*awlen) & ~0x7F):
+                print("Error: transaction crosses 128 byte boundary")
+            addr_fifo.insert(0, (addr, awlen, (yield axi_bus.awid)))
+
+        # write data channel
+        # Note: write data may arrive before the write address (AXI3 allows
+        # this). Such data beats are held until the address is known.
+        if wready and (yield axi_bus.wvalid) == 1:
+            w_pending.insert(0, (cycle, (yield axi_bus.wdata), (yield axi_bus.wstrb), (yield axi_bus.wlast)))
+
+        while len(w_pending) > 0 and (cur_len > 0 or len(addr_fifo) > 0):
+            (w_cycle, wdata, wstrb, wlast) = w_pending.pop()
+            wlast_exp = 0
+            if cur_len == 0:
+                (addr, awlen, cur_id) = addr_fifo.pop()
+                cur_len = awlen+1
+                cur_addr = addr
+            if cur_len == 1:
+                wlast_exp = 1
+                b_cycle = w_cycle + (write_latency() if callable(write_latency) else write_latency)
+                if cur_addr >= error_addr:
+                    resp_fifo.insert(0, (0x2, cur_id, b_cycle))
+                else:
+                    resp_fifo.insert(0, (0x0, cur_id, b_cycle))
+            if wlast != wlast_exp:
+                print("Error: wrong value for wlast (%d, exp=%d)" % (wlast, wlast_exp))
+            if wstrb == 0xFF:
+                memory[cur_addr] = wdata
+            elif wstrb == 0:
+                pass
+            else:
+                print("Error: WSTRB value 0x%02x unhandled by memory simulator" % wstrb)
+            if beat_log is not None:
+                beat_log.append((w_cycle, cur_addr, wdata))
+            cur_addr += 8
+            cur_len -= 1
+
+        # read address channel
+        if (yield axi_bus.arvalid) == 1:
+            addr = (yield axi_bus.araddr)
+            arlen = (yield axi_bus.arlen)
+            if (addr & ~0x7F) != ((addr+8*arlen) & ~0x7F):
+                print("Error: read transaction crosses 128 byte boundary")
+            read_fifo.insert(0, [addr, arlen, cycle+read_latency, (yield axi_bus.arid)])
+
+        # write response channel
+        if len(resp_fifo) > 0 and resp_fifo[-1][2] <= cycle:
+            yield axi_bus.bresp.eq(resp_fifo[-1][0])
+            yield axi_bus.bid.eq(resp_fifo[-1][1])
+            yield axi_bus.bvalid.eq(1)
+        else:
+            yield axi_bus.bvalid.eq(0)
+
+        # read data channel
+        if len(read_fifo) > 0 and read_fifo[-1][2] <= cycle:
+            (addr, arlen, _, arid) = read_fifo[-1]
+            yield axi_bus.rdata.eq(memory.get(addr & ~0x7, 0))
+            yield axi_bus.rresp.eq(0x2 if addr >= error_addr else 0x0)
+            yield axi_bus.rlast.eq(1 if arlen == 0 else 0)
+            yield axi_bus.rid.eq(arid)
+            yield axi_bus.rvalid.eq(1)
+        else:
+            yield axi_bus.rvalid.eq(0)
+
+        if stall is not None:
+            p_stall = stall() if callable(stall) else stall
+            awready = 0 if random.random() < p_stall else 1
+            wready = 0 if random.random() < p_stall else 1
+            yield axi_bus.awready.eq(awready)
+            yield axi_bus.wready.eq(wready)
+
+        yield Tick()
+        cycle += 1
+
+        if ((yield axi_bus.bvalid) == 1) and ((yield axi_bus.bready) == 1):
+            resp_fifo.pop()
+
+        if ((yield axi_bus.rvalid) == 1) and ((yield axi_bus.rready) == 1):
+            if read_fifo[-1][1] == 0:
+                read_fifo.pop()
+            else:
+                read_fifo[-1][0] += 8
+                read_fifo[-1][1] -= 1
@@ -9,10 +9,29 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
 from axi import *
 from axi_sim import *
-from axi_reg_bank import AXIRegBank, Register_RW
+from axi_reg_bank import AXIRegBank, MemoryWindow, Register_RW
+
+# Cycle counter
+cycle = 0
 
 def test_process():
-    yield axi_bus.areset_n.eq(1)
+    print("registers:")
+    yield from bank_test(axi_bus, [ reg._data for reg in regs ])
+
+    print("memory window:")
+    yield from bank_test(mem_bus, [ window.mem[j] for j in range(0, 4) ])
+
+    print("memory window (128 bit):")
+    yield from bank_test(wide_mem_bus, [ wide_window.mem[0][32*j:32*(j+1)] for j in range(0, 4) ])
+
+    yield from map_test()
+
+def bank_test(bus, data):
+    """Register bank with 4 words at 0x40000000
+
+    data -- signals holding the content of the 4 words.
+    """
+    yield bus.areset_n.eq(1)
 
     # test reset during write transaction
     for i in range(0, 10):
@@ -20,21 +39,21 @@ def test_process():
             TWrite(0x40000000, [0x11, 0x22, 0x33, 0x44], exp_resp=AXI3Response.OKAY)
         ]
 
-        yield from axi_write(axi_bus, axi_write_transact, delay='rand', timeout=random.randrange(40))
+        yield from axi_write(bus, axi_write_transact, delay='rand', timeout=random.randrange(40))
 
-        yield axi_bus.areset_n.eq(0)
-        yield axi_bus.awvalid.eq(0)
-        yield axi_bus.wvalid.eq(0)
-        yield axi_bus.bready.eq(0)
+        yield bus.areset_n.eq(0)
+        yield bus.awvalid.eq(0)
+        yield bus.wvalid.eq(0)
+        yield bus.bready.eq(0)
 
         yield Tick()
         yield Settle()
 
-        assert((yield axi_bus.awready) == 0)
-        assert((yield axi_bus.wready) == 0)
-        assert((yield axi_bus.bvalid) == 0)
+        assert((yield bus.awready) == 0)
+        assert((yield bus.wready) == 0)
+        assert((yield bus.bvalid) == 0)
 
-        yield axi_bus.areset_n.eq(1)
+        yield bus.areset_n.eq(1)
 
     # test reset during read transaction
     for i in range(0, 10):
@@ -42,19 +61,19 @@ def test_process():
             TRead(0x40000000, burst_len=4, exp_resp=AXI3Response.OKAY)
         ]
 
-        yield from axi_read(axi_bus, axi_read_transact, delay='rand', timeout=random.randrange(40))
+        yield from axi_read(bus, axi_read_transact, delay='rand', timeout=random.randrange(40))
 
-        yield axi_bus.areset_n.eq(0)
-        yield axi_bus.arvalid.eq(0)
-        yield axi_bus.rready.eq(0)
+        yield bus.areset_n.eq(0)
+        yield bus.arvalid.eq(0)
+        yield bus.rready.eq(0)
 
         yield Tick()
         yield Settle()
 
-        assert((yield axi_bus.arready) == 0)
-        assert((yield axi_bus.rvalid) == 0)
+        assert((yield bus.arready) == 0)
+        assert((yield bus.rvalid) == 0)
 
-        yield axi_bus.areset_n.eq(1)
+        yield bus.areset_n.eq(1)
 
     # test write and read transactions
     for i in range(0, 10):
@@ -69,14 +88,14 @@ def test_process():
         ]
 
         if i % 3 == 0:
-            yield from axi_write(axi_bus, axi_write_transact, delay=0)
+            yield from axi_write(bus, axi_write_transact, delay=0)
         else:
-            yield from axi_write(axi_bus, axi_write_transact, delay='rand')
+            yield from axi_write(bus, axi_write_transact, delay='rand')
 
-        assert((yield regs[0]._data) == 0x33221100)
-        assert((yield regs[1]._data) == 0x90094455)
-        assert((yield regs[2]._data) == 0xb00ba00a)
-        assert((yield regs[3]._data) == 0xeeddc00c)
+        assert((yield data[0]) == 0x33221100)
+        assert((yield data[1]) == 0x90094455)
+        assert((yield data[2]) == 0xb00ba00a)
+        assert((yield data[3]) == 0xeeddc00c)
 
         v = [ random.randrange(2**32) for _ in range(0, 4) ]
         axi_write_transact = [
@@ -90,12 +109,12 @@ def test_process():
                 TWrite(0x40000000, [ random.randrange(2**32), random.randrange(2**32), random.randrange(2**32), v[0] ], awburst=AXI3Burst.FIXED, exp_resp=AXI3Response.OKAY)
             ]
         if i % 3 == 1:
-            yield from axi_write(axi_bus, axi_write_transact, delay=0)
+            yield from axi_write(bus, axi_write_transact, delay=0)
         else:
-            yield from axi_write(axi_bus, axi_write_transact, delay='rand')
+            yield from axi_write(bus, axi_write_transact, delay='rand')
 
         for j in range(0, 4):
-            assert((yield regs[j]._data) == v[j])
+            assert((yield data[j]) == v[j])
 
         axi_read_transact = [
             TRead(0x40000000, exp_resp=AXI3Response.OKAY, exp_data=v[0]),
@@ -107,10 +126,74 @@ def test_process():
             TRead(0x40000006, exp_resp=AXI3Response.OKAY, bytes_per_beat=2, exp_data=[v[1], v[2], v[2], v[3], v[3]]),
             TRead(0x4000000c, exp_resp=AXI3Response.OKAY, arburst=AXI3Burst.WRAP, exp_data=[v[3], v[0], v[1], v[2]])
         ]
-        yield from axi_read(axi_bus, axi_read_transact, delay='rand')
+        yield from axi_read(bus, axi_read_transact, delay='rand')
+
+        for j in range(0, 4):
+            assert((yield data[j]) == v[j])
+
+    yield from timing_test(bus, data)
+
+def timing_test(bus, data):
+    """Reports the number of cycles per transaction for back-to-back transactions"""
+    n = 64
+    v = [ random.randrange(2**32) for _ in range(0, 4) ]
+
+    tests = [
+        ("single writes", [ TWrite(0x40000000 + 4*(i%4), v[i%4], exp_resp=AXI3Response.OKAY) for i in range(0, n) ]),
+        ("4 beat write bursts", [ TWrite(0x40000000, v, exp_resp=AXI3Response.OKAY) for i in range(0, n) ]),
+        ("single reads", [ TRead(0x40000000 + 4*(i%4), exp_data=v[i%4], exp_resp=AXI3Response.OKAY) for i in range(0, n) ]),
+        ("4 beat read bursts", [ TRead(0x40000000, exp_data=v, exp_resp=AXI3Response.OKAY) for i in range(0, n) ])
+    ]
+
+    for (name, axi_transact) in tests:
+        start = cycle
+        if isinstance(axi_transact[0], TWrite):
+            yield from axi_write(bus, axi_transact, delay=0)
+        else:
+            yield from axi_read(bus, axi_transact, delay=0)
+        print("%s: %.2f cycles per transaction" % (name, (cycle - start) / n))
 
         for j in range(0, 4):
-            assert((yield regs[j]._data) == v[j])
+            assert((yield data[j]) == v[j])
+
+def map_test():
+    """Register map with several regions and gaps (second register bank)"""
+    yield map_bus.areset_n.eq(1)
+
+    v = [ random.randrange(2**32) for _ in range(0, len(map_regs)) ]
+    addrs = [ 0x40000000, 0x40000004, 0x40000008, 0x40000100, 0x40000104 ]
+
+    axi_write_transact = [
+        TWrite(0x40000000, v[0:3], exp_resp=AXI3Response.OKAY),
+        TWrite(0x4000000c, random.randrange(2**32), exp_resp=AXI3Response.DECERR),
+        TWrite(0x400000fc, random.randrange(2**32), exp_resp=AXI3Response.DECERR),
+        TWrite(0x40000100, v[3:5], exp_resp=AXI3Response.OKAY),
+        TWrite(0x40000108, random.randrange(2**32), exp_resp=AXI3Response.DECERR),
+        TWrite(0x50000100, random.randrange(2**32), exp_resp=AXI3Response.DECERR)
+    ]
+    yield from axi_write(map_bus, axi_write_transact, delay='rand')
+
+    for j in range(0, len(map_regs)):
+        assert((yield map_regs[j]._data) == v[j])
+
+    axi_read_transact = [ TRead(a, exp_resp=AXI3Response.OKAY, exp_data=d) for (a, d) in zip(addrs, v) ]
+    axi_read_transact += [
+        TRead(0x40000000, exp_resp=AXI3Response.OKAY, exp_data=v[0:3]),
+        TRead(0x4000000c, exp_resp=AXI3Response.DECERR),
+        TRead(0x40000100, exp_resp=[ AXI3Response.OKAY, AXI3Response.OKAY, AXI3Response.DECERR ], exp_data=[ v[3], v[4], None ]),
+        TRead(0x40000104, exp_resp=AXI3Response.OKAY, arburst=AXI3Burst.WRAP, exp_data=[ v[4], v[3] ])
+    ]
+    random.shuffle(axi_read_transact)
+    yield from axi_read(map_bus, axi_read_transact, delay='rand')
+    yield from axi_read(map_bus, axi_read_transact, delay=0)
+
+def cycle_process():
+    global cycle
+    yield Passive()
+
+    while True:
+        yield Tick()
+        cycle += 1
 
 if len(sys.argv) > 1:
     seed = int(sys.argv[1])
@@ -134,8 +217,55 @@ for i in range(0, 4):
 axi_slave = AXIRegBank(axi_bus, regs, 0x40000000)
 m.submodules += axi_slave
 
+# Memory window instead of registers
+mem_bus = AXI3Bus()
+
+window = MemoryWindow(4)
+
+mem_slave = AXIRegBank(mem_bus, [ (0x000, window) ], 0x40000000)
+m.submodules += mem_slave
+
+# Memory window with 4 words in a single memory row
+wide_mem_bus = AXI3Bus()
+
+wide_window = MemoryWindow(4, width=128)
+
+wide_mem_slave = AXIRegBank(wide_mem_bus, [ (0x000, wide_window) ], 0x40000000)
+m.submodules += wide_mem_slave
+
+# Third register bank: register map with two regions (the first one split
+# in two)
+map_bus = AXI3Bus()
+
+map_regs = []
+for i in range(0, 5):
+    reg = Register_RW()
+    map_regs.append(reg)
+    m.submodules += reg
+
+map_slave = AXIRegBank(map_bus, [ (0x000, map_regs[0:3]), (0x100, map_regs[3:5]) ], 0x40000000, region_size=2)
+m.submodules += map_slave
+
+assert(len(map_slave.regions) == 3)
+
+# Misaligned and overlapping regions
+for reg_map in ([ (0x004, map_regs[0:2]) ], [ (0x000, map_regs[0:3]), (0x008, map_regs[3:4]) ]):
+    try:
+        AXIRegBank(map_bus, reg_map, 0x40000000)
+        assert(False)
+    except ValueError:
+        pass
+
+for (depth, width) in ((3, 32), (4, 96), (4, 256)):
+    try:
+        MemoryWindow(depth, width=width)
+        assert(False)
+    except ValueError:
+        pass
+
 sim = Simulator(m)
 sim.add_clock(1e-6)
+sim.add_sync_process(cycle_process)
 sim.add_sync_process(test_process)
 
 with sim.write_vcd("sim.vcd"):
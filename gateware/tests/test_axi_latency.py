@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+from axi_latency import AXIWriteLatency
+
+DMA_ADDR_REG =        0x40000000
+DMA_COUNT_REG =       0x40000004
+DMA_STATUS_REG =      0x40000008
+DMA_CONTROL_REG =     0x4000000C
+DMA_CONFIG_REG =      0x40000010
+DMA_INT_STATUS_REG =  0x40000014
+
+DS_DATA_REG =         0x40000018
+DS_COUNT_REG =        0x4000001C
+DS_STATUS_REG =       0x40000020
+DS_CONTROL_REG =      0x40000024
+
+LAT_CONTROL_REG =     0x40000028
+LAT_COUNT_REG =       0x4000002C
+LAT_SUM_REG =         0x40000030
+LAT_MIN_REG =         0x40000034
+LAT_MAX_REG =         0x40000038
+LAT_BIN_REG =         0x4000003C
+
+N_BINS = 8
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Write response latency of the simulated memory: (min, max) in cycles
+write_latency = (0, 0)
+
+# Probability of a stall on the write channels of the memory bus
+stall = None
+
+# Latencies of all bursts, measured by the monitor process below
+latencies = []
+
+# Measure from last write data beat (1) or from write address (0)
+measure_from_wlast = 0
+
+def test_process():
+    global write_latency, stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    for from_wlast in (0, 1):
+        for (wl, s, bin_shift) in (((0, 0), None, 0), ((5, 5), None, 3), ((0, 40), None, 3), ((10, 100), 0.3, 5)):
+            write_latency = wl
+            stall = s
+            yield from latency_test(0x50000000, 1000, bin_shift, from_wlast, report=True)
+
+    # short transfer, statistics accumulate without CLEAR
+    yield from latency_test(0x50000FF8, 3, 5, 1, clear=False)
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def latency_test(addr, num_words, bin_shift, from_wlast, clear=True, report=False):
+    global measure_from_wlast
+
+    memory.clear()
+
+    if clear:
+        # clear while idle, so no burst is in flight
+        axi_transact = [
+            TWrite(LAT_CONTROL_REG, (bin_shift << 8) | (from_wlast << 1) | 0x1, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+        latencies.clear()
+        measure_from_wlast = from_wlast
+
+        axi_transact = [
+            TRead(LAT_CONTROL_REG, exp_data=(bin_shift << 8) | (from_wlast << 1), exp_resp=AXI3Response.OKAY),
+            TRead(LAT_COUNT_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+            TRead(LAT_SUM_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+            TRead(LAT_MIN_REG, exp_data=0xFFFFFFFF, exp_resp=AXI3Response.OKAY),
+            TRead(LAT_MAX_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+            TRead(LAT_BIN_REG, exp_data=[ 0 ]*N_BINS, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    start = random.randrange(2**32)
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    # the statistics are updated with one cycle delay
+    for _ in range(0, 2):
+        yield Tick()
+
+    exp_bins = [ 0 ]*N_BINS
+    for lat in latencies:
+        exp_bins[min(lat >> bin_shift, N_BINS-1)] += 1
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(LAT_COUNT_REG, exp_data=len(latencies), exp_resp=AXI3Response.OKAY),
+        TRead(LAT_SUM_REG, exp_data=sum(latencies), exp_resp=AXI3Response.OKAY),
+        TRead(LAT_MIN_REG, exp_data=min(latencies), exp_resp=AXI3Response.OKAY),
+        TRead(LAT_MAX_REG, exp_data=max(latencies), exp_resp=AXI3Response.OKAY),
+        TRead(LAT_BIN_REG, exp_data=exp_bins, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:6], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[6:], delay=0)
+
+    for i in range(0, num_words):
+        exp_data = ((start+2*i+1) & 0xFFFFFFFF) << 32 | ((start+2*i) & 0xFFFFFFFF)
+        if memory.get(addr+8*i) != exp_data:
+            print("Error: memory content mismatch @0x%x" % (addr+8*i))
+            break
+
+    if report:
+        print("from %s, write latency %d-%d, stall=%s: %d bursts, latency min %d, max %d, mean %.1f, bins of %d cycles: %s" %
+            ("WLAST" if from_wlast else "AW", write_latency[0], write_latency[1], str(stall), len(latencies), min(latencies), max(latencies),
+             sum(latencies)/len(latencies), 2**bin_shift, " ".join([ str(b) for b in exp_bins ])))
+
+def monitor_process():
+    """Measures the latency of each burst (write address or last write data
+    beat to write response)"""
+    yield Passive()
+
+    start_cycles = []
+    cycle = 0
+
+    while True:
+        if measure_from_wlast:
+            if (yield axi_mem_bus.wvalid) == 1 and (yield axi_mem_bus.wready) == 1 and (yield axi_mem_bus.wlast) == 1:
+                start_cycles.insert(0, cycle)
+        elif (yield axi_mem_bus.awvalid) == 1 and (yield axi_mem_bus.awready) == 1:
+            start_cycles.insert(0, cycle)
+        if (yield axi_mem_bus.bvalid) == 1 and (yield axi_mem_bus.bready) == 1:
+            latencies.append(cycle - start_cycles.pop())
+        yield Tick()
+        cycle += 1
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, write_latency=lambda: random.randint(*write_latency),
+                           stall=lambda: stall or 0.0)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# AXI bus for AXI writer to access memory
+axi_mem_bus = AXI3Bus(data_bits=64)
+
+# AXI bus to control AXI writer, data source and latency measurement
+axi_reg_bus = AXI3Bus()
+
+# FIFO used to feed data into AXI writer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+m = Module()
+m.submodules += data_fifo
+
+data_source = TestDataSource(data_fifo)
+m.submodules += data_source
+
+axi_writer = AXIWriter(axi_mem_bus, data_fifo)
+m.submodules += axi_writer
+
+axi_latency = AXIWriteLatency(axi_mem_bus, n_bins=N_BINS)
+m.submodules += axi_latency
+
+regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+         axi_writer.config_reg, axi_writer.int_status_reg ]
+
+regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+regs += [ axi_latency.control_reg, axi_latency.count_reg, axi_latency.sum_reg, axi_latency.min_reg,
+          axi_latency.max_reg ] + axi_latency.bin_regs
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(monitor_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
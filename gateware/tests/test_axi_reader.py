@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from axi_reader import AXIReader
+
+DMA_ADDR_REG =       0x40000000
+DMA_COUNT_REG =      0x40000004
+DMA_STATUS_REG =     0x40000008
+DMA_CONTROL_REG =    0x4000000C
+DMA_CONFIG_REG =     0x40000010
+DMA_INT_STATUS_REG = 0x40000014
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Log of words taken from the FIFO (cycle, data)
+word_log = []
+
+# Probability that the consumer does not take a word from the FIFO in a cycle
+consumer_stall = 0.0
+
+# AXI bus for AXI reader to access memory
+axi_mem_bus = AXI3Bus(data_bits=64)
+
+# AXI bus to control AXI reader
+axi_reg_bus = AXI3Bus()
+
+# FIFO filled by AXI reader
+data_fifo = SyncFIFO(width=64, depth=4)
+
+def test_process():
+    global consumer_stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    yield from dma_test(0x50000FF0, 100)
+    yield from dma_test(0x50000FF8, 100)
+    yield from dma_test(0x50000000, 100)
+    yield from dma_test(0x50000FF0, 10)
+    yield from dma_test(0x50000FF8, 10)
+    yield from dma_test(0x50000000, 10)
+    yield from dma_test(0x50000FF0, 1)
+    yield from dma_test(0x50000FF8, 1)
+    yield from dma_test(0x50000000, 1)
+
+    yield from dma_test(0xEFFFFFF0, 40, exp_error=0x2)
+
+    for i in range(0, 10):
+        addr = random.randrange(0, 2**29) * 8
+        num_words = random.randrange(1, 100)
+        if (addr + 8*num_words) > 0xF0000000:
+            exp_error = 0x2
+        else:
+            exp_error = 0
+        yield from dma_test(addr, num_words, exp_error)
+
+    # throughput
+    yield from dma_test(0x50000000, 4096, report=True)
+    yield from dma_test(0x50000FF8, 4096, report=True)
+
+    # slow consumer
+    consumer_stall = 0.3
+    yield from dma_test(0x50000FF0, 1000)
+    consumer_stall = 0.0
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def dma_test(addr, num_words, exp_error=0, report=False):
+    if (addr & 0x7) != 0:
+        raise RuntimeError("DMA start address must be 64-bit aligned")
+
+    if num_words == 0:
+        raise RuntimeError("Cannot do DMA transfer with 0 words")
+
+    # fill source memory
+    memory.clear()
+    word_log.clear()
+
+    for i in range(0, num_words):
+        memory[addr+8*i] = random.randrange(2**64)
+
+    # configure AXI reader: start address, count; enable completion interrupt
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    # check that registers reflect the value written
+    axi_transact = [
+        TRead(DMA_ADDR_REG, exp_data=addr, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_COUNT_REG, exp_data=num_words-1, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_CONFIG_REG, exp_data=0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    # start DMA
+    axi_transact = [
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    # verify that BUSY bit is set
+    # Note: This test may fail for very short DMA transfers.
+    if num_words >= 10:
+        axi_transact = [
+            TRead(DMA_STATUS_REG, exp_data=1, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_reader.int_out) == 0):
+        yield Tick()
+
+    # verify that BUSY bit is clear and potential errors are correctly reported
+    if exp_error != 0:
+        axi_transact = [
+            TRead(DMA_STATUS_REG, exp_data=(0x0100 | (exp_error << 9)), exp_resp=AXI3Response.OKAY)
+        ]
+    else:
+        axi_transact = [
+            TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY)
+        ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    # wait for the consumer to empty the FIFO
+    while len(word_log) < num_words and (yield data_fifo.r_rdy) == 1:
+        yield Tick()
+
+    # check that the expected words arrived in the FIFO, in order
+    exp_words = [ memory[addr+8*i] for i in range(0, num_words) ]
+
+    data = [ d for (_, d) in word_log ]
+    if len(data) != num_words:
+        print("Error: wrong number of words in FIFO (%d, exp=%d)" % (len(data), num_words))
+    else:
+        for i in range(0, num_words):
+            if data[i] != exp_words[i]:
+                print("Error: FIFO content mismatch @0x%x, found=0x%x, exp=0x%x" % (addr+8*i, data[i], exp_words[i]))
+                break
+
+    if report:
+        cycles = word_log[-1][0] - word_log[0][0] + 1
+        print("read: 0x%x, %d words in %d cycles (%.3f beats/cycle)" %
+            (addr, len(word_log), cycles, len(word_log)/cycles))
+
+    # acknowledge completion interrupt
+    axi_transact = [
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    assert((yield axi_reader.int_out) == 0)
+
+def consumer_process():
+    yield Passive()
+
+    cycle = 0
+    while True:
+        yield Settle()
+        r_en = 0 if random.random() < consumer_stall else 1
+        if r_en and (yield data_fifo.r_rdy) == 1:
+            word_log.append((cycle, (yield data_fifo.r_data)))
+        yield data_fifo.r_en.eq(r_en)
+        yield Tick()
+        cycle += 1
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, read_latency=20)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+m = Module()
+m.submodules += data_fifo
+
+axi_reader = AXIReader(axi_mem_bus, data_fifo)
+m.submodules += axi_reader
+
+regs = [ axi_reader.addr_reg, axi_reader.count_reg, axi_reader.status_reg, axi_reader.control_reg,
+         axi_reader.config_reg, axi_reader.int_status_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(consumer_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
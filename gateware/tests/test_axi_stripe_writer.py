@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_stripe_writer import AXIStripeWriter
+
+DMA_ADDR_REG =       0x40000000
+DMA_COUNT_REG =      0x40000004
+DMA_STATUS_REG =     0x40000008
+DMA_CONTROL_REG =    0x4000000C
+DMA_CONFIG_REG =     0x40000010
+DMA_INT_STATUS_REG = 0x40000014
+
+DS_DATA_REG =        0x40000018
+DS_COUNT_REG =       0x4000001C
+DS_STATUS_REG =      0x40000020
+DS_CONTROL_REG =     0x40000024
+
+# Python dictionary backing the simulated memory (shared by all ports)
+memory = dict()
+
+# Probability of a stall on the write channels of each port
+stall = None
+
+def test_process():
+    global stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    for addr in (0x50000000, 0x50000FF8, 0x50000048):
+        for num_words in (1, 17, 16*n_ports, 16*n_ports+1, 300):
+            yield from dma_test(addr, num_words)
+
+    for i in range(0, 5):
+        addr = random.randrange(0x40000000, 0x60000000) & ~0x7
+        yield from dma_test(addr, random.randrange(1, 1000))
+
+    yield from dma_test(0xEFFFFF00, 256, exp_error=0x2)
+
+    # throughput
+    yield from dma_test(0x50000000, 4096, report=True)
+
+    # throughput if each port stalls 50% of the time
+    stall = 0.5
+    yield from dma_test(0x50000000, 4096, report=True)
+    stall = None
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def dma_test(addr, num_words, exp_error=0, report=False):
+    memory.clear()
+    for beat_log in beat_logs:
+        beat_log.clear()
+
+    start = random.randrange(2**32)
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    axi_transact = [
+        TRead(DMA_ADDR_REG, exp_data=addr, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_COUNT_REG, exp_data=num_words-1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    if exp_error != 0:
+        exp_status = 0x0100 | (exp_error << 9)
+    else:
+        exp_status = 0
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=exp_status, exp_resp=AXI3Response.OKAY),
+        TRead(DS_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:2], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[2:], delay=0)
+
+    # check memory content
+    exp_memory = dict()
+    for i in range(0, num_words):
+        exp_memory[addr+8*i] = ((start+2*i+1) & 0xFFFFFFFF) << 32 | ((start+2*i) & 0xFFFFFFFF)
+
+    if memory != exp_memory:
+        print("Error: memory check failed (%d ports, addr=0x%x, %d words)" % (n_ports, addr, num_words))
+
+    # check that each stripe was written through the right port
+    for p in range(0, n_ports):
+        for (_, beat_addr, _) in beat_logs[p]:
+            if ((beat_addr - addr) // (8*16)) % n_ports != p:
+                print("Error: 0x%x written through port %d" % (beat_addr, p))
+                break
+
+    if report:
+        beats = [ b for beat_log in beat_logs for b in beat_log ]
+        cycles = max([ c for (c, _, _) in beats ]) - min([ c for (c, _, _) in beats ]) + 1
+        per_port = [ len(beat_log)/cycles for beat_log in beat_logs ]
+        print("%d ports, %d words per entry, stall=%s: %d words in %d cycles (%.3f words/cycle; per port: %s)" %
+            (n_ports, words, str(stall), len(beats), cycles, len(beats)/cycles, ", ".join([ "%.3f" % x for x in per_port ])))
+
+        # with one word per port in each entry, all ports write (almost)
+        # every cycle
+        if words == n_ports and stall is None and len(beats)/cycles < 0.9*n_ports:
+            print("Error: aggregate throughput below %.1f words/cycle" % (0.9*n_ports))
+
+def mem_sim_process(p):
+    def process():
+        yield from axi_mem_sim(axi_mem_buses[p], memory, beat_log=beat_logs[p], stall=lambda: stall or 0.0)
+    return process
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# 64 bit data, or one word per port in each FIFO entry
+for (n_ports, words) in ((2, 1), (4, 1), (2, 2), (4, 4)):
+    # AXI buses for AXI stripe writer to access memory
+    axi_mem_buses = [ AXI3Bus(id_bits=6, data_bits=64) for _ in range(0, n_ports) ]
+
+    # Logs of write data beats (cycle, address, data), one per port
+    beat_logs = [ [] for _ in range(0, n_ports) ]
+
+    # AXI bus to control AXI stripe writer and data source
+    axi_reg_bus = AXI3Bus()
+
+    # FIFO used to feed data into AXI stripe writer
+    data_fifo = SyncFIFO(width=64*words, depth=4)
+
+    m = Module()
+    m.submodules += data_fifo
+
+    data_source = TestDataSource(data_fifo)
+    m.submodules += data_source
+
+    axi_writer = AXIStripeWriter(axi_mem_buses, data_fifo)
+    m.submodules += axi_writer
+
+    regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+             axi_writer.config_reg, axi_writer.int_status_reg ]
+
+    regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+    axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+    m.submodules += axi_reg_bank
+
+    sim = Simulator(m)
+    sim.add_clock(1e-6)
+    for p in range(0, n_ports):
+        sim.add_sync_process(mem_sim_process(p))
+    sim.add_sync_process(test_process)
+    with sim.write_vcd("sim.vcd"):
+        sim.run()
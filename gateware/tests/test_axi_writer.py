@@ -156,6 +156,10 @@ def dma_test(addr, num_words, fifo=None, exp_error=0):
     # if FIFO is controlled directly: keep filling the FIFO
     if fifo is not None:
         for _ in range(0, num_words-prefill):
+            yield Settle()
+            while (yield fifo.w_rdy) == 0:
+                yield Tick()
+                yield Settle()
             yield fifo.w_data.eq((data+1)<<32 | data)
             yield fifo.w_en.eq(1)
             yield Tick()
@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+
+DMA_ADDR_REG =        0x40000000
+DMA_COUNT_REG =       0x40000004
+DMA_STATUS_REG =      0x40000008
+DMA_CONTROL_REG =     0x4000000C
+DMA_CONFIG_REG =      0x40000010
+DMA_INT_STATUS_REG =  0x40000014
+DMA_LINE_LEN_REG =    0x40000018
+DMA_LINE_COUNT_REG =  0x4000001C
+DMA_LINE_STRIDE_REG = 0x40000020
+
+DS_DATA_REG =         0x40000024
+DS_COUNT_REG =        0x40000028
+DS_STATUS_REG =       0x4000002C
+DS_CONTROL_REG =      0x40000030
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Log of write data beats (cycle, address, data)
+beat_log = []
+
+# AXI bus for AXI writer to access memory
+axi_mem_bus = AXI3Bus(data_bits=64)
+
+# AXI bus to control AXI writer and data source
+axi_reg_bus = AXI3Bus()
+
+# FIFO used to feed data into AXI writer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+def test_process():
+    yield axi_reg_bus.areset_n.eq(1)
+
+    # contiguous lines (stride = line length)
+    yield from dma_2d_test(0x50000000, 16, 8, 128)
+    yield from dma_2d_test(0x50000FF8, 10, 5, 80)
+
+    # padded lines
+    yield from dma_2d_test(0x50000000, 100, 10, 1024)
+    yield from dma_2d_test(0x50000FF0, 1, 20, 4096)
+    yield from dma_2d_test(0x50000F80, 17, 9, 200)
+
+    # region of interest in a larger image
+    yield from dma_2d_test(0x50000000 + 8*(37 + 640*11), 120, 16, 8*640)
+
+    # single line
+    yield from dma_2d_test(0x50000048, 300, 1, 0)
+
+    # bottom-up (negative stride)
+    yield from dma_2d_test(0x50010000, 24, 6, -8*32)
+
+    for _ in range(0, 10):
+        addr = 8*random.randrange(0x0A000000, 0x0B000000)
+        line_len = random.randrange(1, 100)
+        line_count = random.randrange(1, 10)
+        stride = 8*(line_len + random.randrange(0, 50))
+        yield from dma_2d_test(addr, line_len, line_count, stride)
+
+    # throughput (lines of 640 pixels at 8 bytes per pixel, with padding)
+    yield from dma_2d_test(0x50000000, 640, 16, 8*768, report=True)
+
+    # plain register mode still works after 2D transfers
+    yield from dma_2d_test(0x50000FF8, 100, None, None)
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def dma_2d_test(addr, line_len, line_count, stride, report=False):
+    memory.clear()
+    beat_log.clear()
+
+    start = random.randrange(2**32)
+
+    if line_count is None:
+        # linear transfer (LINES not set)
+        num_words = line_len
+        lines = [ addr ]
+        config = 0x01
+    else:
+        num_words = line_len*line_count
+        lines = [ (addr + i*stride) & 0xFFFFFFFF for i in range(0, line_count) ]
+        config = 0x11
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, line_len-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, config, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    if line_count is not None:
+        axi_transact += [
+            TWrite(DMA_LINE_LEN_REG, line_len-1, exp_resp=AXI3Response.OKAY),
+            TWrite(DMA_LINE_COUNT_REG, line_count-1, exp_resp=AXI3Response.OKAY),
+            TWrite(DMA_LINE_STRIDE_REG, stride & 0xFFFFFFFF, exp_resp=AXI3Response.OKAY)
+        ]
+    axi_transact += [
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    if line_count is not None:
+        axi_transact = [
+            TRead(DMA_LINE_LEN_REG, exp_data=line_len-1, exp_resp=AXI3Response.OKAY),
+            TRead(DMA_LINE_COUNT_REG, exp_data=line_count-1, exp_resp=AXI3Response.OKAY),
+            TRead(DMA_LINE_STRIDE_REG, exp_data=stride & 0xFFFFFFFF, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(DS_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:2], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[2:], delay=0)
+
+    # check memory content (only the lines must have been written)
+    exp_memory = dict()
+    i = start
+    for line_addr in lines:
+        for k in range(0, line_len):
+            exp_memory[line_addr+8*k] = ((i+1) & 0xFFFFFFFF) << 32 | i
+            i = (i+2) & 0xFFFFFFFF
+
+    if memory != exp_memory:
+        print("Error: memory check failed (addr=0x%x, line length=%d, line count=%s, stride=%s)" %
+            (addr, line_len, str(line_count), str(stride)))
+
+    if report:
+        cycles = beat_log[-1][0] - beat_log[0][0] + 1
+        print("2d: %d lines x %d words, stride %d bytes: %d words in %d cycles (%.3f words/cycle)" %
+            (line_count, line_len, stride, len(beat_log), cycles, len(beat_log)/cycles))
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, beat_log=beat_log)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+m = Module()
+m.submodules += data_fifo
+
+data_source = TestDataSource(data_fifo)
+m.submodules += data_source
+
+axi_writer = AXIWriter(axi_mem_bus, data_fifo)
+m.submodules += axi_writer
+
+regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+         axi_writer.config_reg, axi_writer.int_status_reg, axi_writer.line_len_reg, axi_writer.line_count_reg,
+         axi_writer.line_stride_reg ]
+
+regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
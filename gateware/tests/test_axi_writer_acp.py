@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+
+DMA_ADDR_REG =       0x40000000
+DMA_COUNT_REG =      0x40000004
+DMA_STATUS_REG =     0x40000008
+DMA_CONTROL_REG =    0x4000000C
+DMA_CONFIG_REG =     0x40000010
+DMA_INT_STATUS_REG = 0x40000014
+
+DS_DATA_REG =        0x40000018
+DS_COUNT_REG =       0x4000001C
+DS_STATUS_REG =      0x40000020
+DS_CONTROL_REG =     0x40000024
+
+DESC_LAST = 0x2
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Number of write/read addresses seen by the monitor
+n_aw = 0
+n_ar = 0
+
+# AXI bus for AXI writer to access memory (like the ACP port: with AxUSER)
+axi_mem_bus = AXI3Bus(id_bits=3, data_bits=64, user_bits=5)
+
+# AXI bus to control AXI writer and data source
+axi_reg_bus = AXI3Bus()
+
+# FIFO used to feed data into AXI writer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+def test_process():
+    yield axi_reg_bus.areset_n.eq(1)
+
+    # small transfers (register mode)
+    for (addr, num_words) in [ (0x50000000, 1), (0x50000FF8, 4), (0x50000040, 32) ]:
+        yield from dma_test(addr, num_words)
+
+    # descriptor mode (descriptor fetch must be coherent as well)
+    yield from dma_test(0x50001000, 20, desc_addr=0x10000000)
+
+    if n_aw == 0 or n_ar == 0:
+        print("Error: no transactions seen by monitor")
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def dma_test(addr, num_words, desc_addr=None):
+    memory.clear()
+
+    start = random.randrange(2**32)
+
+    if desc_addr is not None:
+        memory[desc_addr] = (num_words-1) << 32 | addr
+        memory[desc_addr+8] = DESC_LAST << 32
+        config = 0x3
+        dma_addr = desc_addr
+    else:
+        config = 0x1
+        dma_addr = addr
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, dma_addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, config, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:1], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[1:], delay=0)
+
+    for i in range(0, num_words):
+        exp_data = ((start+2*i+1) & 0xFFFFFFFF) << 32 | ((start+2*i) & 0xFFFFFFFF)
+        if memory.get(addr+8*i) != exp_data:
+            print("Error: memory content mismatch @0x%x" % (addr+8*i))
+            break
+
+def monitor_process():
+    """Checks the cache and user attributes of all transactions"""
+    global n_aw, n_ar
+
+    yield Passive()
+
+    while True:
+        if (yield axi_mem_bus.awvalid) == 1 and (yield axi_mem_bus.awready) == 1:
+            n_aw += 1
+            if (yield axi_mem_bus.awcache) != 0b1111 or (yield axi_mem_bus.awuser) != 0b00001:
+                print("Error: wrong AWCACHE/AWUSER (0x%x/0x%x)" % ((yield axi_mem_bus.awcache), (yield axi_mem_bus.awuser)))
+        if (yield axi_mem_bus.arvalid) == 1 and (yield axi_mem_bus.arready) == 1:
+            n_ar += 1
+            if (yield axi_mem_bus.arcache) != 0b1111 or (yield axi_mem_bus.aruser) != 0b00001:
+                print("Error: wrong ARCACHE/ARUSER (0x%x/0x%x)" % ((yield axi_mem_bus.arcache), (yield axi_mem_bus.aruser)))
+        yield Tick()
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, read_latency=10)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+m = Module()
+m.submodules += data_fifo
+
+data_source = TestDataSource(data_fifo)
+m.submodules += data_source
+
+axi_writer = AXIWriter(axi_mem_bus, data_fifo, coherent=True)
+m.submodules += axi_writer
+
+regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+         axi_writer.config_reg, axi_writer.int_status_reg ]
+
+regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(monitor_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
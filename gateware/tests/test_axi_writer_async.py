@@ -0,0 +1,180 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import AsyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+
+DMA_ADDR_REG =       0x40000000
+DMA_COUNT_REG =      0x40000004
+DMA_STATUS_REG =     0x40000008
+DMA_CONTROL_REG =    0x4000000C
+DMA_CONFIG_REG =     0x40000010
+DMA_INT_STATUS_REG = 0x40000014
+
+DS_DATA_REG =        0x40000018
+DS_COUNT_REG =       0x4000001C
+DS_STATUS_REG =      0x40000020
+DS_CONTROL_REG =     0x40000024
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Log of write data beats (cycle, address, data)
+beat_log = []
+
+# Probability of a stall on the write channels of the memory bus
+stall = None
+
+# Number of `pix' cycles in which the data source had to wait for the FIFO
+n_backpressure = 0
+
+def test_process():
+    global stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    for addr in (0x50000000, 0x50000FF8, 0x50000048):
+        for num_words in (1, 2, 17, 300):
+            yield from dma_test(addr, num_words)
+
+    for i in range(0, 5):
+        addr = random.randrange(0x40000000, 0x60000000) & ~0x7
+        yield from dma_test(addr, random.randrange(1, 1000))
+
+    # throughput
+    yield from dma_test(0x50000000, 4096, report=True)
+
+    # throughput if the memory bus stalls 50% of the time
+    stall = 0.5
+    yield from dma_test(0x50000000, 4096, report=True)
+    stall = None
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def dma_test(addr, num_words, report=False):
+    global n_backpressure
+
+    memory.clear()
+    beat_log.clear()
+    n_backpressure = 0
+
+    start = random.randrange(2**32)
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    # the data source must report BUSY right after START, even though its
+    # generator runs in another clock domain
+    if num_words >= 16:
+        axi_transact = [
+            TRead(DS_STATUS_REG, exp_data=1, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(DS_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:2], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[2:], delay=0)
+
+    # check memory content
+    exp_memory = dict()
+    for i in range(0, num_words):
+        exp_memory[addr+8*i] = ((start+2*i+1) & 0xFFFFFFFF) << 32 | ((start+2*i) & 0xFFFFFFFF)
+
+    if memory != exp_memory:
+        print("Error: memory check failed (pix period=%d ns, FIFO depth=%d, addr=0x%x, %d words)" %
+            (pix_period, fifo_depth, addr, num_words))
+
+    if report:
+        cycles = beat_log[-1][0] - beat_log[0][0] + 1
+        print("sync %d ns, pix %d ns, FIFO depth %d, stall=%s: %d words in %d cycles (%.3f words/cycle), %d pix cycles of backpressure" %
+            (sync_period, pix_period, fifo_depth, str(stall), len(beat_log), cycles, len(beat_log)/cycles, n_backpressure))
+
+def backpressure_process():
+    """Counts the `pix' cycles in which the data source waits for the FIFO"""
+    global n_backpressure
+
+    yield Passive()
+
+    while True:
+        if (yield data_fifo.w_en) == 1 and (yield data_fifo.w_rdy) == 0:
+            n_backpressure += 1
+        yield Tick("pix")
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, beat_log=beat_log, stall=lambda: stall or 0.0)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+sync_period = 10
+
+# (pixel clock period in ns, FIFO depth): pixel clock slower than, faster
+# than, and almost equal to the AXI clock
+for (pix_period, fifo_depth) in ((25, 512), (7, 16), (11, 4)):
+    # AXI bus for AXI writer to access memory
+    axi_mem_bus = AXI3Bus(data_bits=64)
+
+    # AXI bus to control AXI writer and data source
+    axi_reg_bus = AXI3Bus()
+
+    # FIFO used to feed data from the `pix' domain into AXI writer
+    data_fifo = AsyncFIFO(width=64, depth=fifo_depth, r_domain="sync", w_domain="pix")
+
+    m = Module()
+    m.domains.pix = ClockDomain("pix")
+    m.submodules += data_fifo
+
+    data_source = TestDataSource(data_fifo, domain="pix")
+    m.submodules += data_source
+
+    axi_writer = AXIWriter(axi_mem_bus, data_fifo)
+    m.submodules += axi_writer
+
+    regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+             axi_writer.config_reg, axi_writer.int_status_reg ]
+
+    regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+    axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+    m.submodules += axi_reg_bank
+
+    sim = Simulator(m)
+    sim.add_clock(sync_period*1e-9)
+    sim.add_clock(pix_period*1e-9, domain="pix")
+    sim.add_sync_process(mem_sim_process)
+    sim.add_sync_process(backpressure_process, domain="pix")
+    sim.add_sync_process(test_process)
+    with sim.write_vcd("sim.vcd"):
+        sim.run()
@@ -0,0 +1,249 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+
+DMA_ADDR_REG =        0x40000000
+DMA_COUNT_REG =       0x40000004
+DMA_STATUS_REG =      0x40000008
+DMA_CONTROL_REG =     0x4000000C
+DMA_CONFIG_REG =      0x40000010
+DMA_INT_STATUS_REG =  0x40000014
+DMA_DONE_COUNT_REG =  0x40000018
+DMA_CMD_STATUS_REG =  0x4000001C
+DMA_CMD_WINDOW =      0x40000020
+
+DS_DATA_REG =         0x40000060
+DS_COUNT_REG =        0x40000064
+DS_STATUS_REG =       0x40000068
+DS_CONTROL_REG =      0x4000006C
+
+CMD_DEPTH = 16
+CMD_WINDOW = 8
+
+CMD_IRQ = 0x1
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Log of write data beats (cycle, address, data)
+beat_log = []
+
+# Probability of a stall on the write channels of the memory bus
+stall = None
+
+def test_process():
+    global stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    # a frame's worth of transfers, pushed with one burst write each
+    for (n_cmds, s) in ((8, None), (20, None), (20, 0.2)):
+        stall = s
+        cmds = [ (0x50000000 + 0x1000*j + 8*random.randrange(0, 64), random.randrange(1, 300))
+                 for j in range(0, n_cmds) ]
+        yield from cmd_test(cmds)
+
+    # interrupt after a flagged command
+    stall = None
+    yield from cmd_test([ (0x50000000 + 0x1000*j, 200) for j in range(0, 6) ], irq_cmd=2)
+
+    # commands pushed into a full FIFO are discarded
+    yield from overflow_test()
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def start_data(start, num_words):
+    axi_transact = [
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+def push_cmds(cmds, irq_cmd=None, check_free=True):
+    """Pushes commands with one burst write per CMD_WINDOW commands, waiting
+    for enough free entries in the command FIFO unless check_free is False"""
+    for i in range(0, len(cmds), CMD_WINDOW):
+        n = min(CMD_WINDOW, len(cmds)-i)
+        while check_free and ((yield axi_writer.cmd_status_reg.data_out) & 0xFFFF) < n:
+            yield Tick()
+        data = []
+        for j in range(i, min(i+CMD_WINDOW, len(cmds))):
+            (addr, num_words) = cmds[j]
+            data += [ addr | (CMD_IRQ if j == irq_cmd else 0), num_words-1 ]
+        axi_transact = [
+            TWrite(DMA_CMD_WINDOW, data, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+def wait_idle():
+    while ((yield axi_writer.status_reg.data_out) & 0x1) == 1:
+        yield Tick()
+
+def check_data(cmds, start):
+    i = start
+    for (addr, num_words) in cmds:
+        for k in range(0, num_words):
+            exp_data = ((i+1) & 0xFFFFFFFF) << 32 | i
+            if memory.get(addr+8*k) != exp_data:
+                print("Error: memory content mismatch @0x%x" % (addr+8*k))
+                return
+            i = (i+2) & 0xFFFFFFFF
+
+def cmd_test(cmds, irq_cmd=None):
+    memory.clear()
+    beat_log.clear()
+
+    start = random.randrange(2**32)
+    yield from start_data(start, sum([ n for (_, n) in cmds ]))
+
+    # command mode with interrupt, START clears completion count
+    axi_transact = [
+        TWrite(DMA_CONFIG_REG, 0x7, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    axi_transact = [
+        TRead(DMA_CMD_STATUS_REG, exp_data=CMD_DEPTH, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    yield from push_cmds(cmds, irq_cmd)
+
+    if irq_cmd is not None:
+        while ((yield axi_writer.int_out) == 0):
+            yield Tick()
+        done = (yield axi_writer.done_count_reg.data_out)
+        if done != irq_cmd+1 or (yield axi_writer.status_reg.data_out) & 0x1 == 0:
+            print("Error: interrupt after %d commands, expected %d" % (done, irq_cmd+1))
+        axi_transact = [
+            TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_DONE_COUNT_REG, exp_data=len(cmds), exp_resp=AXI3Response.OKAY),
+        TRead(DMA_CMD_STATUS_REG, exp_data=CMD_DEPTH, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:3], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[3:], delay=0)
+
+    check_data(cmds, start)
+
+    # idle cycles on the write data channel between consecutive commands
+    gaps = []
+    k = 0
+    for (_, num_words) in cmds[:-1]:
+        k += num_words
+        gaps.append(beat_log[k][0] - beat_log[k-1][0] - 1)
+
+    cycles = beat_log[-1][0] - beat_log[0][0] + 1
+    print("%d commands, stall=%s: %d words in %d cycles (%.3f words/cycle), max. idle cycles between commands: %d" %
+        (len(cmds), str(stall), len(beat_log), cycles, len(beat_log)/cycles, max(gaps)))
+
+def overflow_test():
+    memory.clear()
+    beat_log.clear()
+
+    cmds = [ (0x50000000 + 0x1000*j, 10) for j in range(0, CMD_DEPTH+1) ]
+
+    start = random.randrange(2**32)
+    yield from start_data(start, 10*CMD_DEPTH)
+
+    # commands are held in register mode
+    axi_transact = [
+        TWrite(DMA_CONFIG_REG, 0x0, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    yield from push_cmds(cmds, check_free=False)
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_CMD_STATUS_REG, exp_data=0x80000000, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, 0x6, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:2], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[2:], delay=0)
+
+    yield from wait_idle()
+
+    axi_transact = [
+        TRead(DMA_CMD_STATUS_REG, exp_data=0x80000000 | CMD_DEPTH, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_CMD_STATUS_REG, exp_data=CMD_DEPTH, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:1], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[1:2], delay=0)
+    yield from axi_read(axi_reg_bus, axi_transact[2:], delay=0)
+
+    check_data(cmds[:CMD_DEPTH], start)
+
+    if len(beat_log) != 10*CMD_DEPTH or memory.get(cmds[CMD_DEPTH][0]) is not None:
+        print("Error: command pushed into full FIFO was not discarded")
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, beat_log=beat_log, stall=lambda: stall or 0.0)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# AXI bus for AXI writer to access memory
+axi_mem_bus = AXI3Bus(data_bits=64)
+
+# AXI bus to control AXI writer and data source
+axi_reg_bus = AXI3Bus()
+
+# FIFO used to feed data into AXI writer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+m = Module()
+m.submodules += data_fifo
+
+data_source = TestDataSource(data_fifo)
+m.submodules += data_source
+
+axi_writer = AXIWriter(axi_mem_bus, data_fifo, cmd_depth=CMD_DEPTH, cmd_window=CMD_WINDOW)
+m.submodules += axi_writer
+
+regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+         axi_writer.config_reg, axi_writer.int_status_reg, axi_writer.done_count_reg, axi_writer.cmd_status_reg ]
+
+regs += axi_writer.cmd_regs
+
+regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+
+DMA_ADDR_REG =       0x40000000
+DMA_COUNT_REG =      0x40000004
+DMA_STATUS_REG =     0x40000008
+DMA_CONTROL_REG =    0x4000000C
+DMA_CONFIG_REG =     0x40000010
+DMA_INT_STATUS_REG = 0x40000014
+DMA_DESC_ADDR_REG =  0x40000018
+DMA_DONE_COUNT_REG = 0x4000001C
+
+DS_DATA_REG =        0x40000020
+DS_COUNT_REG =       0x40000024
+DS_STATUS_REG =      0x40000028
+DS_CONTROL_REG =     0x4000002C
+
+DESC_IRQ =  0x1
+DESC_LAST = 0x2
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Log of write data beats (cycle, address, data)
+beat_log = []
+
+# AXI bus for AXI writer to access memory
+axi_mem_bus = AXI3Bus(data_bits=64)
+
+# AXI bus to control AXI writer and data source
+axi_reg_bus = AXI3Bus()
+
+# FIFO used to feed data into AXI writer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+def write_desc(desc_addr, buf_addr, count, next_addr, flags):
+    memory[desc_addr] = (count-1) << 32 | buf_addr
+    memory[desc_addr+8] = flags << 32 | next_addr
+
+def test_process():
+    yield axi_reg_bus.areset_n.eq(1)
+
+    # chains of page-granular buffers (with random offsets and lengths)
+    for i in range(0, 5):
+        n_desc = random.randrange(2, 10)
+        pages = random.sample(range(0x50000, 0x60000), n_desc)
+        bufs = []
+        for page in pages:
+            offset = 8*random.randrange(0, 64) if i % 2 == 1 else 0
+            bufs.append((page*0x1000 + offset, random.randrange(64, 512-offset//8+1)))
+        yield from desc_test(bufs)
+
+    # single-word transfers
+    yield from desc_test([ (0x50000000 + 0x1000*j, 1) for j in range(0, 4) ], check_idle=False)
+
+    # interrupt after a flagged descriptor
+    yield from desc_test([ (0x50000000 + 0x1000*j, 512) for j in range(0, 4) ], irq_desc=1)
+
+    # descriptor fetch error aborts the chain
+    yield from desc_error_test()
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def start_chain(desc_addr, start, num_words):
+    axi_transact = [
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_ADDR_REG, desc_addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, 0x3, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+def wait_int():
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    axi_transact = [
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+def desc_test(bufs, irq_desc=None, check_idle=True):
+    memory.clear()
+    beat_log.clear()
+
+    # descriptor chain (descriptors scattered in memory)
+    desc_addrs = [ 0x10000000 + 16*d for d in random.sample(range(0, 4096), len(bufs)) ]
+    for j in range(0, len(bufs)):
+        (buf_addr, count) = bufs[j]
+        if j == len(bufs)-1:
+            flags = DESC_LAST
+            next_addr = 0
+        else:
+            flags = 0
+            next_addr = desc_addrs[j+1]
+        if j == irq_desc:
+            flags |= DESC_IRQ
+        write_desc(desc_addrs[j], buf_addr, count, next_addr, flags)
+
+    num_words = sum([ count for (_, count) in bufs ])
+    start = random.randrange(2**32)
+
+    yield from start_chain(desc_addrs[0], start, num_words)
+
+    if irq_desc is not None:
+        # interrupt for flagged descriptor, while chain is still running
+        yield from wait_int()
+        axi_transact = [
+            TRead(DMA_DONE_COUNT_REG, exp_data=irq_desc+1, exp_resp=AXI3Response.OKAY),
+            TRead(DMA_STATUS_REG, exp_data=0x1, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    # interrupt for completion of chain
+    yield from wait_int()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_DONE_COUNT_REG, exp_data=len(bufs), exp_resp=AXI3Response.OKAY),
+        TRead(DMA_DESC_ADDR_REG, exp_data=desc_addrs[-1], exp_resp=AXI3Response.OKAY),
+        TRead(DS_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    # check memory content
+    exp_memory = dict()
+    for d in desc_addrs:
+        exp_memory[d] = memory[d]
+        exp_memory[d+8] = memory[d+8]
+    i = start
+    for (buf_addr, count) in bufs:
+        for k in range(0, count):
+            exp_memory[buf_addr+8*k] = ((i+1) & 0xFFFFFFFF) << 32 | i
+            i = (i+2) & 0xFFFFFFFF
+
+    if memory != exp_memory:
+        print("Error: memory check failed")
+
+    # idle cycles on the write data channel between consecutive descriptors
+    if len(beat_log) != num_words:
+        print("Error: wrong number of write data beats (%d, exp=%d)" % (len(beat_log), num_words))
+        return
+
+    idle = []
+    k = 0
+    for (_, count) in bufs[:-1]:
+        k += count
+        idle.append(beat_log[k][0] - beat_log[k-1][0] - 1)
+
+    print("%d descriptors, %d words: idle cycles between descriptors: total=%d, max=%d" %
+        (len(bufs), num_words, sum(idle), max(idle)))
+
+    if check_idle and max(idle) > 0:
+        print("Error: idle cycles between descriptors")
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, beat_log=beat_log, read_latency=20)
+
+def desc_error_test():
+    memory.clear()
+    beat_log.clear()
+
+    write_desc(0x10000000, 0x50000000, 100, 0xF0000000, 0)
+
+    yield from start_chain(0x10000000, 0, 100)
+
+    yield from wait_int()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0x0D00, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_DONE_COUNT_REG, exp_data=1, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_DESC_ADDR_REG, exp_data=0xF0000000, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    if len(beat_log) != 100:
+        print("Error: wrong number of write data beats (%d, exp=%d)" % (len(beat_log), 100))
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+m = Module()
+m.submodules += data_fifo
+
+data_source = TestDataSource(data_fifo)
+m.submodules += data_source
+
+axi_writer = AXIWriter(axi_mem_bus, data_fifo)
+m.submodules += axi_writer
+
+regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+         axi_writer.config_reg, axi_writer.int_status_reg, axi_writer.desc_addr_reg, axi_writer.done_count_reg ]
+
+regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
@@ -0,0 +1,244 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+
+DMA_ADDR_REG =        0x40000000
+DMA_COUNT_REG =       0x40000004
+DMA_STATUS_REG =      0x40000008
+DMA_CONTROL_REG =     0x4000000C
+DMA_CONFIG_REG =      0x40000010
+DMA_INT_STATUS_REG =  0x40000014
+DMA_DONE_COUNT_REG =  0x40000018
+DMA_RING_SLOTS_REG =  0x4000001C
+DMA_RING_WR_PTR_REG = 0x40000020
+DMA_INT_COALESCE_COUNT_REG =  0x40000024
+DMA_INT_COALESCE_TIME_REG =   0x40000028
+DMA_INT_COALESCE_MERGED_REG = 0x4000002C
+
+DS_DATA_REG =         0x40000030
+DS_COUNT_REG =        0x40000034
+DS_STATUS_REG =       0x40000038
+DS_CONTROL_REG =      0x4000003C
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Log of write data beats (cycle, address, data)
+beat_log = []
+
+# First data word expected in the next ring test
+data_next = 0
+
+# AXI bus for AXI writer to access memory
+axi_mem_bus = AXI3Bus(data_bits=64)
+
+# AXI bus to control AXI writer and data source
+axi_reg_bus = AXI3Bus()
+
+# FIFO used to feed data into AXI writer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+def test_process():
+    global data_next
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    data_next = random.randrange(2**32)
+
+    # data source runs (practically) forever, across all ring tests
+    axi_transact = [
+        TWrite(DS_DATA_REG, data_next, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, 0xFFFFFFFF, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    yield from ring_test(0x50000FF0, 3, 20, 100)
+    yield from ring_test(0x50000000, 5, 2, 1000)
+    yield from ring_test(0x50000FF8, 4, 7, 200)
+    yield from ring_test(8*random.randrange(0x0A000000, 0x0B000000), 1, 1, 2000)
+
+    # interrupt after every slot, coalesced
+    yield from ring_test(0x50000000, 3, 8, 100, coalesce=8)
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def ring_test(addr, n_slots, slot_words, n_wraps, coalesce=None):
+    global data_next
+
+    memory.clear()
+    beat_log.clear()
+
+    # configure ring: enable interrupt, MODE = 2 (ring), optionally SLOT_INT
+    if coalesce is not None:
+        config = 0xD
+        axi_transact = [
+            TWrite(DMA_INT_COALESCE_COUNT_REG, coalesce, exp_resp=AXI3Response.OKAY),
+            TWrite(DMA_INT_COALESCE_TIME_REG, 20*slot_words*coalesce, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+    else:
+        config = 0x5
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, slot_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_RING_SLOTS_REG, n_slots-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, config, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    # consumer: follow hardware write pointer and completion count
+    n_target = n_slots * n_wraps
+    done_last = 0
+    n_int = 0
+    n_merged = 0
+    while True:
+        if (yield axi_writer.int_out) == 1:
+            # acknowledge interrupt, then check number of merged events
+            axi_transact = [
+                TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+            ]
+            yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+            merged = (yield axi_writer.int_coalesce_merged_reg.data_out) >> 16
+            if coalesce is None or merged < coalesce:
+                print("Error: %d events merged into interrupt" % merged)
+            n_int += 1
+            n_merged += merged
+
+        done = (yield axi_writer.done_count_reg.data_out)
+        wr_ptr = (yield axi_writer.ring_wr_ptr_reg.data_out)
+        if wr_ptr != done % n_slots:
+            print("Error: write pointer %d does not match completion count %d" % (wr_ptr, done))
+        if done < done_last:
+            print("Error: completion count decreased")
+        done_last = done
+        if done >= n_target:
+            break
+        yield Tick()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x2, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:1], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[1:], delay=0)
+
+    if coalesce is None:
+        # wait for completion interrupt after STOP
+        while ((yield axi_writer.int_out) == 0):
+            yield Tick()
+
+        done = (yield axi_writer.done_count_reg.data_out)
+    else:
+        # acknowledge interrupts until all events (one per slot, plus one for
+        # completion) have been merged into an interrupt
+        while True:
+            busy = (yield axi_writer.status_reg.data_out) & 0x1
+            done = (yield axi_writer.done_count_reg.data_out)
+            if busy == 0 and n_merged == done+1:
+                break
+            if (yield axi_writer.int_out) == 1:
+                axi_transact = [
+                    TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+                ]
+                yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+                n_int += 1
+                n_merged += (yield axi_writer.int_coalesce_merged_reg.data_out) >> 16
+            else:
+                yield Tick()
+
+        print("ring: %d slot interrupts coalesced into %d interrupts" % (done, n_int))
+
+        axi_transact = [
+            TWrite(DMA_INT_COALESCE_COUNT_REG, 1, exp_resp=AXI3Response.OKAY),
+            TWrite(DMA_INT_COALESCE_TIME_REG, 0, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_DONE_COUNT_REG, exp_data=done, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_RING_WR_PTR_REG, exp_data=done % n_slots, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    if coalesce is None:
+        axi_transact = [
+            TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    # check that every beat went to the right slot with the right data
+    if len(beat_log) != done * slot_words:
+        print("Error: wrong number of write data beats (%d, exp=%d)" % (len(beat_log), done * slot_words))
+
+    i = data_next
+    for k in range(0, len(beat_log)):
+        (_, beat_addr, beat_data) = beat_log[k]
+        exp_addr = addr + 8*(k % (n_slots*slot_words))
+        exp_data = ((i+1) & 0xFFFFFFFF) << 32 | i
+        if beat_addr != exp_addr or beat_data != exp_data:
+            print("Error: beat %d: addr=0x%x, data=0x%x, exp addr=0x%x, exp data=0x%x" %
+                (k, beat_addr, beat_data, exp_addr, exp_data))
+            break
+        i = (i+2) & 0xFFFFFFFF
+
+    # data not written remains in the FIFO for the next test
+    data_next = i
+
+    cycles = beat_log[-1][0] - beat_log[0][0] + 1
+    print("ring: %d slots x %d words, %d wraps, %d words in %d cycles (%.3f words/cycle)" %
+        (n_slots, slot_words, done // n_slots, len(beat_log), cycles, len(beat_log)/cycles))
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, beat_log=beat_log)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+m = Module()
+m.submodules += data_fifo
+
+data_source = TestDataSource(data_fifo)
+m.submodules += data_source
+
+axi_writer = AXIWriter(axi_mem_bus, data_fifo)
+m.submodules += axi_writer
+
+regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+         axi_writer.config_reg, axi_writer.int_status_reg, axi_writer.done_count_reg, axi_writer.ring_slots_reg,
+         axi_writer.ring_wr_ptr_reg, axi_writer.int_coalesce_count_reg, axi_writer.int_coalesce_time_reg,
+         axi_writer.int_coalesce_merged_reg ]
+
+regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+
+DMA_ADDR_REG =        0x40000000
+DMA_COUNT_REG =       0x40000004
+DMA_STATUS_REG =      0x40000008
+DMA_CONTROL_REG =     0x4000000C
+DMA_CONFIG_REG =      0x40000010
+DMA_INT_STATUS_REG =  0x40000014
+DMA_DONE_COUNT_REG =  0x40000018
+
+DS_DATA_REG =         0x4000001C
+DS_COUNT_REG =        0x40000020
+DS_STATUS_REG =       0x40000024
+DS_CONTROL_REG =      0x40000028
+
+STATUS_BUSY =        0x1
+STATUS_SHADOW_FULL = 0x2
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Log of write data beats (cycle, address, data)
+beat_log = []
+
+# Probability of a stall on the write channels of the memory bus
+stall = None
+
+def test_process():
+    global stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    # back-to-back transfers with random alignment and length
+    for s in (None, 0.2):
+        stall = s
+        transfers = [ (0x50000000 + 0x1000*j + 8*random.randrange(0, 64), random.randrange(100, 400))
+                      for j in range(0, 8) ]
+        yield from shadow_test(transfers)
+
+    # for comparison: restart after each transfer has completed
+    stall = None
+    yield from shadow_test(transfers, arm=False)
+
+    # START while the shadow slot is full is ignored
+    yield from shadow_full_test()
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def start_data(start, num_words):
+    axi_transact = [
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+def start_transfer(addr, num_words):
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+def wait_idle():
+    while ((yield axi_writer.status_reg.data_out) & STATUS_BUSY) == 1:
+        yield Tick()
+
+def check_data(transfers, start):
+    i = start
+    for (addr, num_words) in transfers:
+        for k in range(0, num_words):
+            exp_data = ((i+1) & 0xFFFFFFFF) << 32 | i
+            if memory.get(addr+8*k) != exp_data:
+                print("Error: memory content mismatch @0x%x" % (addr+8*k))
+                return
+            i = (i+2) & 0xFFFFFFFF
+
+def shadow_test(transfers, arm=True):
+    memory.clear()
+    beat_log.clear()
+
+    start = random.randrange(2**32)
+    yield from start_data(start, sum([ n for (_, n) in transfers ]))
+
+    axi_transact = [
+        TWrite(DMA_CONFIG_REG, 0x0, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    for (addr, num_words) in transfers:
+        if arm:
+            # arm next transfer as soon as the shadow slot is free
+            while ((yield axi_writer.status_reg.data_out) & STATUS_SHADOW_FULL) != 0:
+                yield Tick()
+        else:
+            yield from wait_idle()
+        yield from start_transfer(addr, num_words)
+
+    yield from wait_idle()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_DONE_COUNT_REG, exp_data=len(transfers) if arm else 1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    check_data(transfers, start)
+
+    # idle cycles on the write data channel between consecutive transfers
+    gaps = []
+    k = 0
+    for (_, num_words) in transfers[:-1]:
+        k += num_words
+        gaps.append(beat_log[k][0] - beat_log[k-1][0] - 1)
+
+    if arm and stall is None and max(gaps) != 0:
+        print("Error: idle cycles between transfers: %s" % str(gaps))
+
+    cycles = beat_log[-1][0] - beat_log[0][0] + 1
+    print("%s, stall=%s: %d transfers, %d words in %d cycles (%.3f words/cycle), idle cycles between transfers: %s" %
+        ("armed" if arm else "restarted", str(stall), len(transfers), len(beat_log), cycles, len(beat_log)/cycles,
+         " ".join([ str(g) for g in gaps ])))
+
+def shadow_full_test():
+    memory.clear()
+    beat_log.clear()
+
+    transfers = [ (0x50000000, 500), (0x50001000, 100) ]
+
+    start = random.randrange(2**32)
+    yield from start_data(start, 600)
+
+    for (addr, num_words) in transfers:
+        yield from start_transfer(addr, num_words)
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=STATUS_BUSY | STATUS_SHADOW_FULL, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    # ignored
+    yield from start_transfer(0x50002000, 10)
+
+    yield from wait_idle()
+
+    axi_transact = [
+        TRead(DMA_DONE_COUNT_REG, exp_data=2, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    check_data(transfers, start)
+
+    if len(beat_log) != 600 or memory.get(0x50002000) is not None:
+        print("Error: START accepted while shadow slot full")
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, beat_log=beat_log, stall=lambda: stall or 0.0)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# AXI bus for AXI writer to access memory
+axi_mem_bus = AXI3Bus(data_bits=64)
+
+# AXI bus to control AXI writer and data source
+axi_reg_bus = AXI3Bus()
+
+# FIFO used to feed data into AXI writer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+m = Module()
+m.submodules += data_fifo
+
+data_source = TestDataSource(data_fifo)
+m.submodules += data_source
+
+axi_writer = AXIWriter(axi_mem_bus, data_fifo)
+m.submodules += axi_writer
+
+regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+         axi_writer.config_reg, axi_writer.int_status_reg, axi_writer.done_count_reg ]
+
+regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+from timestamp import Timestamp
+
+DMA_ADDR_REG =            0x40000000
+DMA_COUNT_REG =           0x40000004
+DMA_STATUS_REG =          0x40000008
+DMA_CONTROL_REG =         0x4000000C
+DMA_CONFIG_REG =          0x40000010
+DMA_INT_STATUS_REG =      0x40000014
+DMA_START_TIME_LO_REG =   0x40000018
+DMA_START_TIME_HI_REG =   0x4000001C
+DMA_FIRST_TIME_LO_REG =   0x40000020
+DMA_FIRST_TIME_HI_REG =   0x40000024
+DMA_RESP_TIME_LO_REG =    0x40000028
+DMA_RESP_TIME_HI_REG =    0x4000002C
+
+DS_DATA_REG =             0x40000030
+DS_COUNT_REG =            0x40000034
+DS_STATUS_REG =           0x40000038
+DS_CONTROL_REG =          0x4000003C
+
+TS_LO_REG =               0x40000040
+TS_HI_REG =               0x40000044
+
+DESC_LAST = 0x2
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Timestamps of the events of the current transfer, recorded by the monitor
+# process below
+events = dict()
+
+def test_process():
+    yield axi_reg_bus.areset_n.eq(1)
+
+    # small and large transfers in register and descriptor mode
+    for (addr, num_words) in ((0x50000000, 1), (0x50000FF8, 40), (0x50000040, 1000)):
+        yield from timestamp_test(addr, num_words)
+        yield from timestamp_test(addr, num_words, desc_addr=0x10000000)
+
+    # timestamp counter crossing into the high word during a transfer
+    yield timestamp.value.eq(0x1FFFFFFFF - 500)
+    yield Tick()
+    yield from timestamp_test(0x50000000, 1000)
+
+    # high word of the timestamp counter read through the registers
+    ts = (yield timestamp.value)
+    axi_transact = [
+        TRead(TS_HI_REG, exp_data=ts >> 32, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def timestamp_test(addr, num_words, desc_addr=None):
+    memory.clear()
+    events.clear()
+
+    start = random.randrange(2**32)
+
+    if desc_addr is not None:
+        memory[desc_addr] = (num_words-1) << 32 | addr
+        memory[desc_addr+8] = DESC_LAST << 32
+        config = 0x3
+        dma_addr = desc_addr
+    else:
+        config = 0x1
+        dma_addr = addr
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, dma_addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, config, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    start_time = events["start"]
+    first_time = events["first"]
+    resp_time = events["resp"]
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(DMA_START_TIME_LO_REG, exp_data=[ start_time & 0xFFFFFFFF, start_time >> 32 ], exp_resp=AXI3Response.OKAY),
+        TRead(DMA_FIRST_TIME_LO_REG, exp_data=[ first_time & 0xFFFFFFFF, first_time >> 32 ], exp_resp=AXI3Response.OKAY),
+        TRead(DMA_RESP_TIME_LO_REG, exp_data=[ resp_time & 0xFFFFFFFF, resp_time >> 32 ], exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:4], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[4:], delay=0)
+
+    if not start_time < first_time < resp_time:
+        print("Error: timestamps out of order")
+
+    for i in range(0, num_words):
+        exp_data = ((start+2*i+1) & 0xFFFFFFFF) << 32 | ((start+2*i) & 0xFFFFFFFF)
+        if memory.get(addr+8*i) != exp_data:
+            print("Error: memory content mismatch @0x%x" % (addr+8*i))
+            break
+
+    print("%s, %d words: start latency %d cycles, %d words in %d cycles (%.3f words/cycle)" %
+        ("descriptor" if desc_addr is not None else "register", num_words, first_time - start_time,
+         num_words, resp_time - first_time, num_words/(resp_time - first_time)))
+
+def monitor_process():
+    """Records the timestamps of START, the first write data beat and the last
+    write response"""
+    yield Passive()
+
+    while True:
+        ts = (yield timestamp.value)
+        if (yield axi_writer.control_reg.wstrb_in[0]) == 1 and (yield axi_writer.control_reg.data_in[0]) == 1:
+            events["start"] = ts
+        if (yield axi_mem_bus.wvalid) == 1 and (yield axi_mem_bus.wready) == 1 and not "first" in events:
+            events["first"] = ts
+        if (yield axi_mem_bus.bvalid) == 1 and (yield axi_mem_bus.bready) == 1:
+            events["resp"] = ts
+        yield Tick()
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, read_latency=10, write_latency=20)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# AXI bus for AXI writer to access memory
+axi_mem_bus = AXI3Bus(data_bits=64)
+
+# AXI bus to control AXI writer and data source
+axi_reg_bus = AXI3Bus()
+
+# FIFO used to feed data into AXI writer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+m = Module()
+m.submodules += data_fifo
+
+timestamp = Timestamp()
+m.submodules += timestamp
+
+data_source = TestDataSource(data_fifo)
+m.submodules += data_source
+
+axi_writer = AXIWriter(axi_mem_bus, data_fifo, timestamp=timestamp.value)
+m.submodules += axi_writer
+
+regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+         axi_writer.config_reg, axi_writer.int_status_reg, axi_writer.start_time_lo_reg, axi_writer.start_time_hi_reg,
+         axi_writer.first_data_time_lo_reg, axi_writer.first_data_time_hi_reg, axi_writer.last_resp_time_lo_reg,
+         axi_writer.last_resp_time_hi_reg ]
+
+regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+regs += [ timestamp.low_reg, timestamp.high_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(monitor_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
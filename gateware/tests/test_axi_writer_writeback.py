@@ -0,0 +1,397 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+from timestamp import Timestamp
+
+DMA_ADDR_REG =        0x40000000
+DMA_COUNT_REG =       0x40000004
+DMA_STATUS_REG =      0x40000008
+DMA_CONTROL_REG =     0x4000000C
+DMA_CONFIG_REG =      0x40000010
+DMA_INT_STATUS_REG =  0x40000014
+DMA_DONE_COUNT_REG =  0x40000018
+DMA_RING_SLOTS_REG =  0x4000001C
+DMA_COMP_ADDR_REG =   0x40000020
+DMA_COMP_SLOTS_REG =  0x40000024
+
+DS_DATA_REG =         0x40000028
+DS_COUNT_REG =        0x4000002C
+DS_STATUS_REG =       0x40000030
+DS_CONTROL_REG =      0x40000034
+
+CONFIG_INT_ENABLE = 0x01
+CONFIG_DESC_MODE =  0x02
+CONFIG_RING_MODE =  0x04
+CONFIG_WRITEBACK =  0x20
+
+DESC_IRQ =  0x1
+DESC_LAST = 0x2
+
+COMP_ADDR = 0x20000000
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Write response latency of the simulated memory: (min, max) in cycles
+write_latency = (0, 0)
+
+# Probability of a stall on the write channels of the memory bus
+stall = None
+
+# Completion records seen by the monitor process below: (timestamp, slot,
+# record, data of the transfer complete)
+records = []
+
+# Last status word seen in each record slot by the monitor process
+last_status = dict()
+
+# Number of completion record slots watched by the monitor process
+n_comp_slots = 0
+
+def test_process():
+    global write_latency, stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    # register mode, with and without WRITEBACK
+    yield from reg_test(0x50000FF8, 1000, writeback=False)
+    for (wl, s) in (((0, 0), None), ((10, 50), 0.3)):
+        write_latency = wl
+        stall = s
+        yield from reg_test(0x50000FF8, 1000)
+        yield from reg_test(0x50000000, 1)
+
+    # descriptor chains, records wrap around, flagged descriptors interrupt
+    # only once their record has been written
+    for (wl, s) in (((0, 0), None), ((0, 40), None), ((10, 100), 0.3)):
+        write_latency = wl
+        stall = s
+        yield from desc_test([ (0x50000000 + 0x1000*j + 8*random.randrange(0, 64), random.randrange(1, 300))
+                               for j in range(0, 7) ], 3, irq_desc=2)
+
+    # many single-word transfers (more records than outstanding bursts)
+    write_latency = (20, 60)
+    stall = 0.1
+    yield from desc_test([ (0x50000000 + 0x1000*j, 1) for j in range(0, 24) ], 8)
+
+    # error response recorded in the record of the transfer and all later ones
+    write_latency = (0, 0)
+    stall = None
+    yield from desc_test([ (0x50000000, 40), (0xF0000000, 20), (0x50001000, 10) ], 4)
+
+    # ring mode
+    yield from ring_test(0x50000000, 3, 50, 4)
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def config_writeback(comp_slots):
+    global n_comp_slots
+
+    # mark all record slots as not done
+    for k in range(0, comp_slots):
+        memory[COMP_ADDR + 32*k + 24] = 0
+    records.clear()
+    last_status.clear()
+    n_comp_slots = comp_slots
+
+    axi_transact = [
+        TWrite(DMA_COMP_ADDR_REG, COMP_ADDR, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COMP_SLOTS_REG, comp_slots-1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+def start_data(start, num_words):
+    axi_transact = [
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+def check_data(addr, start, num_words):
+    for i in range(0, num_words):
+        exp_data = ((start+2*i+1) & 0xFFFFFFFF) << 32 | ((start+2*i) & 0xFFFFFFFF)
+        if memory.get(addr+8*i) != exp_data:
+            print("Error: memory content mismatch @0x%x" % (addr+8*i))
+            return False
+    return True
+
+def check_records(bufs, comp_slots, data_start, error_from=None):
+    """Checks the completion records seen by the monitor process (one per
+    transfer, in order, each written only after all data of the transfer)"""
+    if len(records) != len(bufs):
+        print("Error: %d completion records, expected %d" % (len(records), len(bufs)))
+        return
+
+    start_time = (yield axi_writer.start_time_hi_reg.data_out) << 32 | (yield axi_writer.start_time_lo_reg.data_out)
+    n_bytes = 0
+    last_time = start_time
+    for j in range(0, len(bufs)):
+        (cycle, slot, rec, data_ok) = records[j]
+        n_bytes += 8*bufs[j][1]
+        if error_from is not None and j >= error_from:
+            exp_status = 0x1 | 0x100 | (int(AXI3Response.SLVERR) << 9)
+        else:
+            exp_status = 0x1
+        if slot != j % comp_slots:
+            print("Error: record %d written to slot %d" % (j, slot))
+        if rec[3] != (j+1) << 32 | exp_status:
+            print("Error: record %d: status/sequence 0x%x" % (j, rec[3]))
+        if rec[0] != n_bytes:
+            print("Error: record %d: %d bytes, expected %d" % (j, rec[0], n_bytes))
+        if not last_time <= rec[1] <= cycle or rec[2] != start_time:
+            print("Error: record %d: bad timestamps (0x%x, 0x%x)" % (j, rec[1], rec[2]))
+        if not data_ok and (error_from is None or j < error_from):
+            print("Error: record %d written before data" % j)
+        last_time = rec[1]
+
+def reg_test(addr, num_words, writeback=True):
+    memory.clear()
+
+    yield from config_writeback(1)
+
+    start = random.randrange(2**32)
+    yield from start_data(start, num_words)
+
+    config = CONFIG_INT_ENABLE | (CONFIG_WRITEBACK if writeback else 0)
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, config, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+    jobs[:] = [ (addr, start, num_words) ]
+
+    yield from wait_int()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    check_data(addr, start, num_words)
+
+    if writeback:
+        yield from check_records([ (addr, num_words) ], 1, start)
+        (cycle, _, _, _) = records[0]
+        print("register mode, %d words, write latency %d-%d, stall=%s: record visible %d cycles before interrupt" %
+            (num_words, write_latency[0], write_latency[1], str(stall), int_cycle[0] - cycle))
+    elif memory.get(COMP_ADDR + 24) != 0 or len(records) != 0:
+        print("Error: completion record written without WRITEBACK")
+
+def desc_test(bufs, comp_slots, irq_desc=None):
+    memory.clear()
+
+    yield from config_writeback(comp_slots)
+
+    # descriptor chain (descriptors scattered in memory)
+    desc_addrs = [ 0x10000000 + 16*d for d in random.sample(range(0, 4096), len(bufs)) ]
+    for j in range(0, len(bufs)):
+        (buf_addr, count) = bufs[j]
+        if j == len(bufs)-1:
+            flags = DESC_LAST
+            next_addr = 0
+        else:
+            flags = 0
+            next_addr = desc_addrs[j+1]
+        if j == irq_desc:
+            flags |= DESC_IRQ
+        memory[desc_addrs[j]] = (count-1) << 32 | buf_addr
+        memory[desc_addrs[j]+8] = flags << 32 | next_addr
+
+    num_words = sum([ count for (_, count) in bufs ])
+    start = random.randrange(2**32)
+    yield from start_data(start, num_words)
+
+    jobs.clear()
+    s = start
+    for (buf_addr, count) in bufs:
+        jobs.append((buf_addr, s, count))
+        s = (s + 2*count) & 0xFFFFFFFF
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, desc_addrs[0], exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, CONFIG_INT_ENABLE | CONFIG_DESC_MODE | CONFIG_WRITEBACK, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    if irq_desc is not None:
+        yield from wait_int()
+        # record of the flagged descriptor must be there already
+        if len(records) < irq_desc+1:
+            print("Error: interrupt for descriptor %d before its completion record" % irq_desc)
+
+    while True:
+        yield from wait_int()
+        if (yield axi_writer.status_reg.data_out) & 0x1 == 0:
+            break
+
+    error_from = None
+    for j in range(0, len(bufs)):
+        if bufs[j][0] >= 0xF0000000:
+            error_from = j
+            break
+
+    axi_transact = [
+        TRead(DMA_DONE_COUNT_REG, exp_data=len(bufs), exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    yield from check_records(bufs, comp_slots, start, error_from)
+
+    for (buf_addr, s, count) in jobs:
+        if buf_addr < 0xF0000000:
+            check_data(buf_addr, s, count)
+
+    # final contents of the record slots
+    for j in range(max(0, len(bufs)-comp_slots), len(bufs)):
+        if memory.get(COMP_ADDR + 32*(j % comp_slots) + 24) >> 32 != j+1:
+            print("Error: slot %d does not contain record %d" % (j % comp_slots, j))
+
+    print("descriptor mode, %d transfers, %d record slots, write latency %d-%d, stall=%s: ok" %
+        (len(bufs), comp_slots, write_latency[0], write_latency[1], str(stall)))
+
+def ring_test(addr, n_slots, slot_words, n_wraps):
+    memory.clear()
+
+    yield from config_writeback(n_slots)
+
+    start = random.randrange(2**32)
+    yield from start_data(start, 0xFFFFFFFF)
+
+    jobs.clear()
+    s = start
+    for k in range(0, n_slots*(n_wraps+2)):
+        jobs.append((addr + 8*slot_words*(k % n_slots), s, slot_words))
+        s = (s + 2*slot_words) & 0xFFFFFFFF
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, slot_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_RING_SLOTS_REG, n_slots-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, CONFIG_INT_ENABLE | CONFIG_RING_MODE | CONFIG_WRITEBACK, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    # consumer polls the completion records only
+    while len(records) < n_slots*n_wraps:
+        yield Tick()
+
+    axi_transact = [
+        TWrite(DMA_CONTROL_REG, 0x2, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    yield from wait_int()
+
+    done = (yield axi_writer.done_count_reg.data_out)
+    yield from check_records([ (a, n) for (a, _, n) in jobs[:done] ], n_slots, start)
+
+    print("ring mode, %d slots, %d transfers: ok" % (n_slots, done))
+
+def wait_int():
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    int_cycle[0] = (yield timestamp.value)
+
+    axi_transact = [
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+# Transfers of the current test: (buffer address, first data word, number of
+# words)
+jobs = []
+
+# Timestamp of the last interrupt
+int_cycle = [ 0 ]
+
+def monitor_process():
+    """Watches the completion record slots in memory and logs each new record,
+    together with whether all data of its transfer was in memory at that
+    time"""
+    yield Passive()
+
+    while True:
+        for k in range(0, n_comp_slots):
+            rec_addr = COMP_ADDR + 32*k
+            # a record is complete once its status word (written last) has
+            # changed
+            status = memory.get(rec_addr + 24, 0)
+            if status & 0x1 and last_status.get(k) != status:
+                last_status[k] = status
+                rec = [ memory.get(rec_addr + 8*i) for i in range(0, 4) ]
+                j = (status >> 32) - 1
+                data_ok = j < len(jobs) and all([ memory.get(jobs[j][0] + 8*i) ==
+                    (((jobs[j][1]+2*i+1) & 0xFFFFFFFF) << 32 | ((jobs[j][1]+2*i) & 0xFFFFFFFF))
+                    for i in range(0, jobs[j][2]) ])
+                records.append(((yield timestamp.value), k, rec, data_ok))
+        yield Tick()
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, write_latency=lambda: random.randint(*write_latency),
+                           stall=lambda: stall or 0.0)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# AXI bus for AXI writer to access memory
+axi_mem_bus = AXI3Bus(data_bits=64)
+
+# AXI bus to control AXI writer and data source
+axi_reg_bus = AXI3Bus()
+
+# FIFO used to feed data into AXI writer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+m = Module()
+m.submodules += data_fifo
+
+timestamp = Timestamp()
+m.submodules += timestamp
+
+data_source = TestDataSource(data_fifo)
+m.submodules += data_source
+
+axi_writer = AXIWriter(axi_mem_bus, data_fifo, timestamp=timestamp.value)
+m.submodules += axi_writer
+
+regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+         axi_writer.config_reg, axi_writer.int_status_reg, axi_writer.done_count_reg, axi_writer.ring_slots_reg,
+         axi_writer.comp_addr_reg, axi_writer.comp_slots_reg ]
+
+regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(monitor_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO, AsyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+from dma_perf import DMAPerf
+
+DMA_ADDR_REG =          0x40000000
+DMA_COUNT_REG =         0x40000004
+DMA_STATUS_REG =        0x40000008
+DMA_CONTROL_REG =       0x4000000C
+DMA_CONFIG_REG =        0x40000010
+DMA_INT_STATUS_REG =    0x40000014
+
+DS_DATA_REG =           0x40000018
+DS_COUNT_REG =          0x4000001C
+DS_STATUS_REG =         0x40000020
+DS_CONTROL_REG =        0x40000024
+
+PERF_CONTROL_REG =      0x40000028
+PERF_BUSY_REG =         0x4000002C
+PERF_AW_STALL_REG =     0x40000030
+PERF_W_STALL_REG =      0x40000034
+PERF_DATA_STALL_REG =   0x40000038
+PERF_BYTES_REG =        0x4000003C
+PERF_OUTSTANDING_REG =  0x40000040
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Probability of a stall on the write channels of the memory bus
+stall = None
+
+# Reference values, computed by the monitor process below
+ref = dict()
+
+def clear_ref():
+    for k in ("busy", "aw_stall", "w_stall", "data_stall", "bytes", "max_outstanding"):
+        ref[k] = 0
+
+def test_process():
+    global stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    for s in (None, 0.5):
+        stall = s
+        for (addr, num_words) in ((0x50000000, 1), (0x50000FF8, 40), (0x50000040, 2000)):
+            yield from dma_test(addr, num_words, report=(num_words == 2000))
+
+    # counters accumulate over several transfers if not cleared
+    yield from dma_test(0x50000000, 100, clear=False)
+    yield from dma_test(0x50001000, 100, clear=False)
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def dma_test(addr, num_words, clear=True, report=False):
+    memory.clear()
+
+    if clear:
+        # clear while idle, so the reference values do not change around the
+        # clear
+        axi_transact = [
+            TWrite(PERF_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+        clear_ref()
+
+        axi_transact = [
+            TRead(PERF_BUSY_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+            TRead(PERF_AW_STALL_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+            TRead(PERF_W_STALL_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+            TRead(PERF_DATA_STALL_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+            TRead(PERF_BYTES_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+            TRead(PERF_OUTSTANDING_REG, exp_data=0, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    start = random.randrange(2**32)
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(PERF_BUSY_REG, exp_data=ref["busy"], exp_resp=AXI3Response.OKAY),
+        TRead(PERF_AW_STALL_REG, exp_data=ref["aw_stall"], exp_resp=AXI3Response.OKAY),
+        TRead(PERF_W_STALL_REG, exp_data=ref["w_stall"], exp_resp=AXI3Response.OKAY),
+        TRead(PERF_DATA_STALL_REG, exp_data=ref["data_stall"], exp_resp=AXI3Response.OKAY),
+        TRead(PERF_BYTES_REG, exp_data=ref["bytes"], exp_resp=AXI3Response.OKAY),
+        TRead(PERF_OUTSTANDING_REG, exp_data=ref["max_outstanding"] << 16, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:7], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[7:], delay=0)
+
+    for i in range(0, num_words):
+        exp_data = ((start+2*i+1) & 0xFFFFFFFF) << 32 | ((start+2*i) & 0xFFFFFFFF)
+        if memory.get(addr+8*i) != exp_data:
+            print("Error: memory content mismatch @0x%x" % (addr+8*i))
+            break
+
+    if clear and ref["bytes"] != 8*num_words:
+        print("Error: %d bytes counted, expected %d" % (ref["bytes"], 8*num_words))
+
+    if report:
+        print("%s, stall=%s: %d bytes in %d busy cycles (%.1f MB/s at 100 MHz), stall cycles: AW %d, W %d, data %d, max. %d outstanding" %
+            (name, str(stall), ref["bytes"], ref["busy"], 100*ref["bytes"]/ref["busy"], ref["aw_stall"], ref["w_stall"],
+             ref["data_stall"], ref["max_outstanding"]))
+
+def monitor_process():
+    """Computes the reference values of the performance counters"""
+    yield Passive()
+
+    outstanding = 0
+
+    while True:
+        bus = axi_mem_bus
+        if (yield axi_writer.status_reg.data_out) & 0x1:
+            ref["busy"] += 1
+        if (yield bus.awvalid) == 1 and (yield bus.awready) == 0:
+            ref["aw_stall"] += 1
+        if (yield bus.wvalid) == 1 and (yield bus.wready) == 0:
+            ref["w_stall"] += 1
+        if (yield axi_writer.data_req_out) == 1 and (yield data_fifo.r_rdy) == 0:
+            ref["data_stall"] += 1
+        if (yield bus.wvalid) == 1 and (yield bus.wready) == 1:
+            ref["bytes"] += bin((yield bus.wstrb)).count("1")
+        if (yield bus.awvalid) == 1 and (yield bus.awready) == 1:
+            outstanding += 1
+        if (yield bus.bvalid) == 1 and (yield bus.bready) == 1:
+            outstanding -= 1
+        ref["max_outstanding"] = max(ref["max_outstanding"], outstanding)
+        yield Tick()
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, stall=lambda: stall or 0.0)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+clear_ref()
+
+# (name, domain of the data source, period of its clock in ns): fast data
+# source (memory bus is the bottleneck), slow data source (data source is the
+# bottleneck)
+for (name, ds_domain, pix_period) in (("sync", "sync", None), ("pix 25 ns", "pix", 25)):
+    # AXI bus for AXI writer to access memory
+    axi_mem_bus = AXI3Bus(data_bits=64)
+
+    # AXI bus to control AXI writer, data source and performance counters
+    axi_reg_bus = AXI3Bus()
+
+    # FIFO used to feed data into AXI writer
+    if ds_domain == "sync":
+        data_fifo = SyncFIFO(width=64, depth=4)
+    else:
+        data_fifo = AsyncFIFO(width=64, depth=16, r_domain="sync", w_domain=ds_domain)
+
+    m = Module()
+    if ds_domain != "sync":
+        m.domains += ClockDomain(ds_domain)
+    m.submodules += data_fifo
+
+    data_source = TestDataSource(data_fifo, domain=ds_domain)
+    m.submodules += data_source
+
+    axi_writer = AXIWriter(axi_mem_bus, data_fifo)
+    m.submodules += axi_writer
+
+    dma_perf = DMAPerf([ axi_mem_bus ])
+    m.submodules += dma_perf
+
+    # NOTE: bit 0 of the writer status register is BUSY
+    m.d.comb += dma_perf.busy_in.eq(axi_writer.status_reg.data_out[0])
+    m.d.comb += dma_perf.data_stall_in.eq(axi_writer.data_req_out & ~data_fifo.r_rdy)
+
+    regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+             axi_writer.config_reg, axi_writer.int_status_reg ]
+
+    regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+    regs += [ dma_perf.control_reg, dma_perf.busy_cycles_reg, dma_perf.aw_stall_cycles_reg, dma_perf.w_stall_cycles_reg,
+              dma_perf.data_stall_cycles_reg, dma_perf.bytes_reg, dma_perf.outstanding_reg ]
+
+    axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+    m.submodules += axi_reg_bank
+
+    sim = Simulator(m)
+    sim.add_clock(10e-9)
+    if ds_domain != "sync":
+        sim.add_clock(pix_period*1e-9, domain=ds_domain)
+    sim.add_sync_process(mem_sim_process)
+    sim.add_sync_process(monitor_process)
+    sim.add_sync_process(test_process)
+    with sim.write_vcd("sim.vcd"):
+        sim.run()
@@ -0,0 +1,204 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO, AsyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+from fifo_monitor import FIFOMonitor
+
+DMA_ADDR_REG =        0x40000000
+DMA_COUNT_REG =       0x40000004
+DMA_STATUS_REG =      0x40000008
+DMA_CONTROL_REG =     0x4000000C
+DMA_CONFIG_REG =      0x40000010
+DMA_INT_STATUS_REG =  0x40000014
+
+DS_DATA_REG =         0x40000018
+DS_COUNT_REG =        0x4000001C
+DS_STATUS_REG =       0x40000020
+DS_CONTROL_REG =      0x40000024
+
+FM_LEVEL_REG =        0x40000028
+FM_HIGH_WATER_REG =   0x4000002C
+FM_OVERFLOW_REG =     0x40000030
+FM_UNDERFLOW_REG =    0x40000034
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Probability of a stall on the write channels of the memory bus
+stall = None
+
+# Reference values, computed by the monitor processes below
+ref = { "high_water": 0, "overflow": 0, "underflow": 0 }
+
+def test_process():
+    global stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    for s in (None, 0.5, 0.8):
+        stall = s
+        for num_words in (1, 40, 1000):
+            yield from dma_test(0x50000000, num_words)
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def dma_test(addr, num_words):
+    memory.clear()
+
+    # clear telemetry registers (while idle, so the reference values do not
+    # change around the clear)
+    axi_transact = [
+        TWrite(FM_HIGH_WATER_REG, 0, exp_resp=AXI3Response.OKAY),
+        TWrite(FM_OVERFLOW_REG, 0, exp_resp=AXI3Response.OKAY),
+        TWrite(FM_UNDERFLOW_REG, 0, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    ref["high_water"] = 0
+    ref["overflow"] = 0
+    ref["underflow"] = 0
+
+    axi_transact = [
+        TRead(FM_LEVEL_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(FM_HIGH_WATER_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(FM_OVERFLOW_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(FM_UNDERFLOW_REG, exp_data=0, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    start = random.randrange(2**32)
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    # give the overflow counter time to cross the clock domains
+    for _ in range(0, 10):
+        yield Tick()
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(FM_LEVEL_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(FM_HIGH_WATER_REG, exp_data=ref["high_water"], exp_resp=AXI3Response.OKAY),
+        TRead(FM_OVERFLOW_REG, exp_data=ref["overflow"], exp_resp=AXI3Response.OKAY),
+        TRead(FM_UNDERFLOW_REG, exp_data=ref["underflow"], exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:5], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[5:], delay=0)
+
+    for i in range(0, num_words):
+        exp_data = ((start+2*i+1) & 0xFFFFFFFF) << 32 | ((start+2*i) & 0xFFFFFFFF)
+        if memory.get(addr+8*i) != exp_data:
+            print("Error: memory content mismatch @0x%x" % (addr+8*i))
+            break
+
+    if num_words == 1000:
+        print("%s, stall=%s: high-water mark %d, %d overflow cycles, %d underflow cycles" %
+            (name, str(stall), ref["high_water"], ref["overflow"], ref["underflow"]))
+
+def read_monitor_process():
+    """Computes the reference high-water mark and underflow count"""
+    yield Passive()
+
+    while True:
+        ref["high_water"] = max(ref["high_water"], (yield data_fifo.r_level))
+        if (yield axi_writer.data_req_out) == 1 and (yield data_fifo.r_rdy) == 0:
+            ref["underflow"] += 1
+        yield Tick()
+
+def write_monitor_process():
+    """Computes the reference overflow count"""
+    yield Passive()
+
+    while True:
+        if (yield data_fifo.w_en) == 1 and (yield data_fifo.w_rdy) == 0:
+            ref["overflow"] += 1
+        yield Tick(w_domain)
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, stall=lambda: stall or 0.0)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# (name, write domain, pixel clock period in ns): same clock, pixel clock
+# faster and slower than the AXI clock (10 ns)
+for (name, w_domain, pix_period) in (("sync", "sync", None), ("pix 7 ns", "pix", 7), ("pix 25 ns", "pix", 25)):
+    # AXI bus for AXI writer to access memory
+    axi_mem_bus = AXI3Bus(data_bits=64)
+
+    # AXI bus to control AXI writer, data source and FIFO monitor
+    axi_reg_bus = AXI3Bus()
+
+    # FIFO used to feed data into AXI writer
+    if w_domain == "sync":
+        data_fifo = SyncFIFO(width=64, depth=16)
+    else:
+        data_fifo = AsyncFIFO(width=64, depth=16, r_domain="sync", w_domain=w_domain)
+
+    m = Module()
+    if w_domain != "sync":
+        m.domains += ClockDomain(w_domain)
+    m.submodules += data_fifo
+
+    data_source = TestDataSource(data_fifo, domain=w_domain)
+    m.submodules += data_source
+
+    axi_writer = AXIWriter(axi_mem_bus, data_fifo)
+    m.submodules += axi_writer
+
+    fifo_monitor = FIFOMonitor(data_fifo, w_domain=w_domain)
+    m.submodules += fifo_monitor
+
+    m.d.comb += fifo_monitor.r_req_in.eq(axi_writer.data_req_out)
+
+    regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+             axi_writer.config_reg, axi_writer.int_status_reg ]
+
+    regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+    regs += [ fifo_monitor.level_reg, fifo_monitor.high_water_reg, fifo_monitor.overflow_count_reg,
+              fifo_monitor.underflow_count_reg ]
+
+    axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+    m.submodules += axi_reg_bank
+
+    sim = Simulator(m)
+    sim.add_clock(10e-9)
+    if w_domain != "sync":
+        sim.add_clock(pix_period*1e-9, domain=w_domain)
+    sim.add_sync_process(mem_sim_process)
+    sim.add_sync_process(read_monitor_process)
+    sim.add_sync_process(write_monitor_process, domain=w_domain)
+    sim.add_sync_process(test_process)
+    with sim.write_vcd("sim.vcd"):
+        sim.run()
@@ -9,11 +9,37 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from axi import *
 from axi_sim import *
 from axi_reg_bank import AXIRegBank
-from int_ctrl import IntCtrl
+from int_ctrl import IntCtrl, VecIntCtrl
 
 INT_ENABLE_REG = 0x40000000
 INT_STATUS_REG = 0x40000004
 INT_COUNT_REG  = 0x40000008
+INT_COALESCE_COUNT_REG  = 0x4000000C
+INT_COALESCE_TIME_REG   = 0x40000010
+INT_COALESCE_MERGED_REG = 0x40000014
+
+VEC_INT_ENABLE_REG   = 0x40000100
+VEC_INT_PENDING_REG  = 0x40000104
+VEC_INT_OVERFLOW_REG = 0x40000108
+VEC_INT_ROUTE0_REG   = 0x4000010C
+VEC_INT_ROUTE1_REG   = 0x40000110
+
+VEC_N_SOURCES = 5
+
+INT_EVENT_WRITE_COUNT_REG = 0x40000018
+INT_EVENT_READ_COUNT_REG  = 0x4000001C
+INT_EVENT_LOST_REG        = 0x40000020
+
+VEC_EVENT_WRITE_COUNT_REG = 0x40000114
+VEC_EVENT_READ_COUNT_REG  = 0x40000118
+VEC_EVENT_LOST_REG        = 0x4000011C
+
+INT_EVENT_WINDOW = 0x40000200
+VEC_EVENT_WINDOW = 0x40000400
+
+EVENT_DEPTH = 4
+VEC_EVENT_DEPTH = 32
+EVENT_FIFO_DEPTH = 16
 
 def test_process():
     yield axi_bus.areset_n.eq(1)
@@ -66,16 +92,289 @@ def test_process():
     axi_read_transact = [ TRead(INT_COUNT_REG, exp_resp=AXI3Response.OKAY, exp_data=3) ]
     yield from axi_read(axi_bus, axi_read_transact, delay=0)
 
+    # test coalescing: interrupt after 4 events
+    axi_write_transact = [ TWrite(INT_COALESCE_COUNT_REG, 4, exp_resp=AXI3Response.OKAY) ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+
+    for i in range(0, 4):
+        assert((yield int_ctrl.int_pending_out) == 0)
+        yield int_ctrl.int_req_in.eq(1)
+        yield Tick()
+        yield int_ctrl.int_req_in.eq(0)
+        for _ in range(0, 5):
+            yield Tick()
+
+    assert((yield int_ctrl.int_pending_out) == 1)
+
+    axi_read_transact = [
+        TRead(INT_STATUS_REG, exp_resp=AXI3Response.OKAY, exp_data=0x1),
+        TRead(INT_COALESCE_MERGED_REG, exp_resp=AXI3Response.OKAY, exp_data=0x20004)
+    ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+    axi_write_transact = [ TWrite(INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY) ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+
+    axi_read_transact = [ TRead(INT_COALESCE_MERGED_REG, exp_resp=AXI3Response.OKAY, exp_data=0x40000) ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+    assert((yield int_ctrl.int_pending_out) == 0)
+
+    # test coalescing: interrupt after timeout if event threshold is not reached
+    axi_write_transact = [ TWrite(INT_COALESCE_TIME_REG, 50, exp_resp=AXI3Response.OKAY) ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+
+    for i in range(0, 2):
+        yield int_ctrl.int_req_in.eq(1)
+        yield Tick()
+        yield int_ctrl.int_req_in.eq(0)
+        yield Tick()
+
+    cycles = 0
+    while (yield int_ctrl.int_pending_out) == 0:
+        yield Tick()
+        cycles += 1
+    assert(45 <= cycles <= 50)
+
+    axi_read_transact = [ TRead(INT_COALESCE_MERGED_REG, exp_resp=AXI3Response.OKAY, exp_data=0x40002) ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+    axi_write_transact = [
+        TWrite(INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(INT_COALESCE_COUNT_REG, 1, exp_resp=AXI3Response.OKAY),
+        TWrite(INT_COALESCE_TIME_REG, 0, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+
+    axi_read_transact = [ TRead(INT_COALESCE_MERGED_REG, exp_resp=AXI3Response.OKAY, exp_data=0x20000) ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+    assert((yield int_ctrl.int_pending_out) == 0)
+
+    # all enabled requests were recorded
+    axi_read_transact = [
+        TRead(INT_EVENT_WRITE_COUNT_REG, exp_resp=AXI3Response.OKAY, exp_data=[ EVENT_DEPTH, 0, 0 ]),
+        TRead(INT_EVENT_WINDOW, exp_resp=AXI3Response.OKAY, burst_len=4, exp_data=[ 0x1, None, None, 0x0 ])
+    ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+    yield from vec_test()
+
+    yield from event_log_test()
+
+def vec_req(sources):
+    """Interrupt request from the given sources (list of lists, one per cycle)"""
+    for cycle_sources in sources:
+        yield vec_ctrl.int_req_in.eq(sum(1 << i for i in cycle_sources))
+        yield Tick()
+    yield vec_ctrl.int_req_in.eq(0)
+    yield Tick()
+
+def vec_test():
+    all_sources = 2**VEC_N_SOURCES-1
+
+    # default: all sources disabled, all sources on line 0
+    axi_read_transact = [
+        TRead(VEC_INT_ENABLE_REG, exp_resp=AXI3Response.OKAY,
+              exp_data=[ 0x0, 0x0, 0x0, all_sources, 0x0 ])
+    ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+    yield from vec_req([ [ 0, 1, 2, 3, 4 ] ])
+    assert((yield vec_ctrl.int_out) == 0)
+
+    # enabled sources only
+    axi_write_transact = [ TWrite(VEC_INT_ENABLE_REG, 0x1b, exp_resp=AXI3Response.OKAY) ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+
+    yield from vec_req([ [ 1, 2 ], [ 4 ] ])
+    assert((yield vec_ctrl.int_out) == 0x1)
+
+    # several sources in a single read, overflow of a source requesting
+    # twice
+    yield from vec_req([ [ 0, 3 ], [ 0 ] ])
+
+    axi_read_transact = [
+        TRead(VEC_INT_PENDING_REG, exp_resp=AXI3Response.OKAY, exp_data=[ 0x1b, 0x01 ])
+    ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+    # acknowledge some sources
+    axi_write_transact = [
+        TWrite(VEC_INT_PENDING_REG, 0x0a, exp_resp=AXI3Response.OKAY),
+        TWrite(VEC_INT_OVERFLOW_REG, 0x01, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+
+    axi_read_transact = [
+        TRead(VEC_INT_PENDING_REG, exp_resp=AXI3Response.OKAY, exp_data=[ 0x11, 0x00 ])
+    ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+    assert((yield vec_ctrl.int_out) == 0x1)
+
+    # route sources 0 and 1 to line 1, source 4 to both lines
+    axi_write_transact = [
+        TWrite(VEC_INT_ROUTE0_REG, [ 0x1c, 0x13 ], exp_resp=AXI3Response.OKAY),
+        TWrite(VEC_INT_PENDING_REG, 0x10, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+    assert((yield vec_ctrl.int_out) == 0x2)
+
+    axi_write_transact = [ TWrite(VEC_INT_PENDING_REG, 0x01, exp_resp=AXI3Response.OKAY) ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+    assert((yield vec_ctrl.int_out) == 0x0)
+
+    yield from vec_req([ [ 3 ] ])
+    assert((yield vec_ctrl.int_out) == 0x1)
+    yield from vec_req([ [ 1 ] ])
+    assert((yield vec_ctrl.int_out) == 0x3)
+    yield from vec_req([ [ 4 ] ])
+    assert((yield vec_ctrl.int_out) == 0x3)
+
+    axi_write_transact = [ TWrite(VEC_INT_PENDING_REG, 0x0a, exp_resp=AXI3Response.OKAY) ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+    assert((yield vec_ctrl.int_out) == 0x3)
+
+    # requests during the acknowledge stay pending
+    yield vec_ctrl.int_req_in.eq(0x10)
+    axi_write_transact = [ TWrite(VEC_INT_PENDING_REG, 0x10, exp_resp=AXI3Response.OKAY) ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+    yield vec_ctrl.int_req_in.eq(0)
+    yield Tick()
+
+    axi_read_transact = [
+        TRead(VEC_INT_PENDING_REG, exp_resp=AXI3Response.OKAY, exp_data=[ 0x10, 0x10 ])
+    ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+def event_req(events):
+    """Events from the vectored interrupt controller in consecutive cycles
+
+    events -- list of (sources, payload).
+
+    Returns the expected records.
+    """
+    records = []
+    for (sources, payload) in events:
+        yield vec_ctrl.int_req_in.eq(sources)
+        yield vec_ctrl.event_payload_in.eq(payload)
+        # the record gets the timestamp of the cycle of the event
+        yield Settle()
+        t = (yield timestamp)
+        records.append([ sources, t & 0xFFFFFFFF, t >> 32, payload ])
+        yield Tick()
+    yield vec_ctrl.int_req_in.eq(0)
+    yield Tick()
+    return records
+
+def event_read(records, first):
+    """Reads the records starting with record number first from the event window"""
+    axi_read_transact = []
+    for (i, record) in enumerate(records):
+        slot = (first + i) % VEC_EVENT_DEPTH
+        axi_read_transact.append(TRead(VEC_EVENT_WINDOW + 16*slot, exp_resp=AXI3Response.OKAY, exp_data=record))
+    yield from axi_read(axi_bus, axi_read_transact, delay='rand')
+
+def event_log_test():
+    axi_write_transact = [ TWrite(VEC_INT_ENABLE_REG, 2**VEC_N_SOURCES-1, exp_resp=AXI3Response.OKAY) ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+
+    # skip the records of the previous tests
+    first = None
+    while first != (yield vec_ctrl.event_log._write_count):
+        first = (yield vec_ctrl.event_log._write_count)
+
+        axi_write_transact = [ TWrite(VEC_EVENT_READ_COUNT_REG, first, exp_resp=AXI3Response.OKAY) ]
+        yield from axi_write(axi_bus, axi_write_transact, delay=0)
+
+        for _ in range(0, 20):
+            yield Tick()
+
+    lost = (yield vec_ctrl.event_log._lost)
+
+    # events in consecutive cycles
+    events = [ (0x01, 0x100), (0x06, 0x101), (0x10, 0x102), (0x1f, 0x103), (0x08, 0x104), (0x02, 0x105) ]
+    records = yield from event_req(events)
+
+    axi_read_transact = [
+        TRead(VEC_EVENT_WRITE_COUNT_REG, exp_resp=AXI3Response.OKAY, exp_data=[ first+6, first, lost ])
+    ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+    yield from event_read(records, first)
+
+    # no events are lost while the event window has space, even if there
+    # are more events in consecutive cycles than fit into the FIFO
+    first += 6
+    axi_write_transact = [ TWrite(VEC_EVENT_READ_COUNT_REG, first, exp_resp=AXI3Response.OKAY) ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+
+    n = 2*EVENT_FIFO_DEPTH
+    events = [ (1 << (i % VEC_N_SOURCES), 0x300+i) for i in range(0, n) ]
+    records = yield from event_req(events)
+
+    axi_read_transact = [
+        TRead(VEC_EVENT_WRITE_COUNT_REG, exp_resp=AXI3Response.OKAY, exp_data=[ first+n, first, lost ])
+    ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+    yield from event_read(records, first)
+
+    # events are only lost if the event window and the FIFO are full
+    first += n
+    axi_write_transact = [ TWrite(VEC_EVENT_READ_COUNT_REG, first, exp_resp=AXI3Response.OKAY) ]
+    yield from axi_write(axi_bus, axi_write_transact, delay=0)
+
+    n = VEC_EVENT_DEPTH + EVENT_FIFO_DEPTH + 12
+    events = [ (1 << (i % VEC_N_SOURCES), 0x200+i) for i in range(0, n) ]
+    records = yield from event_req(events)
+
+    n_kept = VEC_EVENT_DEPTH + EVENT_FIFO_DEPTH
+
+    axi_read_transact = [
+        TRead(VEC_EVENT_WRITE_COUNT_REG, exp_resp=AXI3Response.OKAY, exp_data=[ first+VEC_EVENT_DEPTH, first, lost+n-n_kept ])
+    ]
+    yield from axi_read(axi_bus, axi_read_transact, delay=0)
+
+    # drain the log like an interrupt handler, the records from the FIFO
+    # follow
+    n_read = 0
+    while n_read < n_kept:
+        count = (yield vec_ctrl.event_log._write_count) - first
+        yield from event_read(records[n_read:count], first+n_read)
+
+        axi_write_transact = [ TWrite(VEC_EVENT_READ_COUNT_REG, first+count, exp_resp=AXI3Response.OKAY) ]
+        yield from axi_write(axi_bus, axi_write_transact, delay=0)
+        n_read = count
+
+        for _ in range(0, 10):
+            yield Tick()
+
+    assert((yield vec_ctrl.event_log._write_count) == first+n_kept)
+
 m = Module()
 
+timestamp = Signal(64, reset=0xFFFFFFF0)
+m.d.sync += timestamp.eq(timestamp + 1)
+
 axi_bus = AXI3Bus()
 
-int_ctrl = IntCtrl()
+int_ctrl = IntCtrl(timestamp=timestamp, event_depth=EVENT_DEPTH)
 m.submodules += int_ctrl
 
-regs = [ int_ctrl.enable_reg, int_ctrl.status_reg, int_ctrl.count_reg ]
+regs = [ int_ctrl.enable_reg, int_ctrl.status_reg, int_ctrl.count_reg,
+         int_ctrl.coalesce_count_reg, int_ctrl.coalesce_time_reg, int_ctrl.coalesce_merged_reg,
+         int_ctrl.event_log.write_count_reg, int_ctrl.event_log.read_count_reg, int_ctrl.event_log.lost_reg ]
+
+# Vectored interrupt controller
+vec_ctrl = VecIntCtrl(VEC_N_SOURCES, n_lines=2, timestamp=timestamp, event_depth=VEC_EVENT_DEPTH)
+m.submodules += vec_ctrl
+
+vec_regs = [ vec_ctrl.enable_reg, vec_ctrl.pending_reg, vec_ctrl.overflow_reg ] + vec_ctrl.route_regs
+vec_regs += [ vec_ctrl.event_log.write_count_reg, vec_ctrl.event_log.read_count_reg, vec_ctrl.event_log.lost_reg ]
 
-axi_slave = AXIRegBank(axi_bus, regs, 0x40000000)
+axi_slave = AXIRegBank(axi_bus, [ (0x000, regs), (0x100, vec_regs), (0x200, int_ctrl.event_log.window),
+                                  (0x400, vec_ctrl.event_log.window) ], 0x40000000)
 m.submodules += axi_slave
 
 sim = Simulator(m)
@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from pixel_packer import PixelPacker
+from pixel_format import *
+
+PP_MODE_REG = 0x40000000
+
+# Probability of a gap between input pixels, and of a stall on the read side
+# of the FIFO
+gap = 0.0
+stall = 0.0
+
+# Words read from the FIFO
+words = []
+
+def test_process():
+    global gap, stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    for mode in range(0, len(MODE_BITS)):
+        # full speed, and with random gaps and stalls; frame lengths that are
+        # not a multiple of a word
+        for (g, s) in ((0.0, 0.0), (0.3, 0.3)):
+            gap = g
+            stall = s
+            for n_pixels in (1, 7, 32, 33, 1000):
+                yield from pack_test(mode, n_pixels)
+
+    # several frames in a row start on word boundaries
+    gap = 0.0
+    stall = 0.0
+    yield from pack_test(1, 45, n_frames=3)
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def pack_test(mode, n_pixels, n_frames=1):
+    bits = MODE_BITS[mode]
+
+    axi_transact = [
+        TWrite(PP_MODE_REG, mode, exp_resp=AXI3Response.OKAY),
+        TRead(PP_MODE_REG, exp_data=mode, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact[:1], delay=0)
+    yield from axi_read(axi_reg_bus, axi_transact[1:], delay=0)
+
+    words.clear()
+
+    # bits above the pixel size must be ignored
+    frames = [ [ random.randrange(2**16) for _ in range(0, n_pixels) ] for _ in range(0, n_frames) ]
+
+    exp_words = []
+    for pixels in frames:
+        exp_words += pack_pixels(pixels, bits)
+
+    cycles = 0
+    for pixels in frames:
+        for (i, p) in enumerate(pixels):
+            while random.random() < gap:
+                yield pixel_packer.valid_in.eq(0)
+                yield Tick()
+                cycles += 1
+            yield pixel_packer.pixel_in.eq(p)
+            yield pixel_packer.last_in.eq(i == len(pixels)-1)
+            yield pixel_packer.valid_in.eq(1)
+            yield Tick()
+            cycles += 1
+            while (yield pixel_packer.ready_out) == 0:
+                yield Tick()
+                cycles += 1
+        yield pixel_packer.valid_in.eq(0)
+        yield pixel_packer.last_in.eq(0)
+
+    while len(words) < len(exp_words):
+        yield Tick()
+
+    for _ in range(0, 10):
+        yield Tick()
+
+    if words != exp_words:
+        print("Error: packed data mismatch (mode %d, %d pixels)" % (mode, n_pixels))
+
+    n = packed_words(n_pixels, bits)
+    for (j, pixels) in enumerate(frames):
+        mask = (1 << bits) - 1
+        if unpack_pixels(words[j*n:(j+1)*n], bits, n_pixels) != [ p & mask for p in pixels ]:
+            print("Error: unpacked data mismatch (mode %d, %d pixels)" % (mode, n_pixels))
+
+    if n_pixels == 1000 and n_frames == 1:
+        print("%d bit, gap=%.1f, stall=%.1f: %d pixels in %d cycles (%.3f pixels/cycle), %d words (%.1f%% less than 16 bit)" %
+            (bits, gap, stall, n_pixels, cycles, n_pixels/cycles, len(words), 100.0 - 100.0*len(words)/packed_words(n_pixels, 16)))
+
+def fifo_process():
+    """Reads words from the FIFO, stalling randomly"""
+    yield Passive()
+
+    while True:
+        r_en = random.random() >= stall
+        yield data_fifo.r_en.eq(r_en)
+        yield Tick()
+        if r_en and (yield data_fifo.r_rdy) == 1:
+            words.append((yield data_fifo.r_data))
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# Reference model
+for bits in MODE_BITS:
+    pixels = [ random.randrange(2**bits) for _ in range(0, 100) ]
+    data = pack_bytes(pixels, bits)
+    if len(data) != 8*packed_words(100, bits) or unpack_bytes(data, bits, 100) != pixels:
+        print("Error: reference model mismatch (%d bit)" % bits)
+
+if pack_pixels([ 0x3FF, 0x001, 0x155 ], 10) != [ 0x155 << 20 | 0x001 << 10 | 0x3FF ]:
+    print("Error: reference model layout")
+
+# AXI bus to control the pixel packer
+axi_reg_bus = AXI3Bus()
+
+# FIFO fed by the pixel packer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+m = Module()
+m.submodules += data_fifo
+
+pixel_packer = PixelPacker(data_fifo)
+m.submodules += pixel_packer
+
+regs = [ pixel_packer.mode_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(fifo_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from snapshot import Snapshot
+
+SS_CONTROL_REG =      0x40000000
+SS_MASK_REG =         0x40000004
+SS_SEQ_REG =          0x40000008
+SS_VALUE_REG =        0x4000000C
+
+N_VALUES = 5
+
+def test_process():
+    yield axi_reg_bus.areset_n.eq(1)
+
+    axi_transact = [
+        TRead(SS_MASK_REG, exp_data=2**N_VALUES-1, exp_resp=AXI3Response.OKAY),
+        TRead(SS_SEQ_REG, exp_data=[ 0 ] * (N_VALUES+1), exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    seq = 0
+    last = [ 0 ] * N_VALUES
+
+    for i in range(0, 20):
+        if i < 10:
+            mask = 2**N_VALUES-1
+        else:
+            mask = random.randrange(2**N_VALUES)
+
+        axi_transact = [
+            TWrite(SS_MASK_REG, mask, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+        if i % 4 == 3:
+            # snapshot from the gateware
+            yield snapshot.trigger_in.eq(1)
+            yield Tick()
+            yield snapshot.trigger_in.eq(0)
+        else:
+            axi_transact = [
+                TWrite(SS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+            ]
+            yield from axi_write(axi_reg_bus, axi_transact, delay='rand')
+
+        seq += 1
+
+        # the counters keep running while the values are read
+        for _ in range(0, random.randrange(20)):
+            yield Tick()
+
+        # all values in a single burst
+        axi_transact = [
+            TRead(SS_SEQ_REG, burst_len=N_VALUES+1, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_read(axi_reg_bus, axi_transact, delay='rand')
+        yield Tick()
+
+        (s, values) = (burst[0], burst[1:])
+        if s != seq:
+            print("Error: sequence number mismatch: got=%d, exp=%d" % (s, seq))
+
+        # values that are not in the mask keep their previous content
+        for j in range(0, N_VALUES):
+            if (mask >> j) & 1 == 0 and values[j] != last[j]:
+                print("Error: value %d changed, but not in mask" % j)
+
+        # the latched values are consistent with each other
+        if mask & 0x3 == 0x3 and values[1] != (3 * values[0]) & 0xFFFFFFFF:
+            print("Error: values 0 and 1 inconsistent (0x%08x, 0x%08x)" % (values[0], values[1]))
+        if mask & 0x9 == 0x9 and values[3] != (values[0] - values[0] % 16) & 0xFFFFFFFF:
+            print("Error: values 0 and 3 inconsistent (0x%08x, 0x%08x)" % (values[0], values[3]))
+
+        last = values
+
+    for _ in range(0, 10):
+        yield Tick()
+
+burst = []
+
+def read_monitor_process():
+    """Records the data of the read bursts"""
+    yield Passive()
+
+    while True:
+        if (yield axi_reg_bus.rvalid) == 1 and (yield axi_reg_bus.rready) == 1:
+            burst.append((yield axi_reg_bus.rdata))
+            if (yield axi_reg_bus.rlast) == 1:
+                burst[:] = burst[-(N_VALUES+1):]
+        yield Tick()
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# AXI bus to control the snapshot block
+axi_reg_bus = AXI3Bus()
+
+m = Module()
+
+# Free-running counters, some derived from each other, so the values in a
+# snapshot are consistent only if they were latched in the same cycle
+cnt = Signal(32)
+m.d.sync += cnt.eq(cnt + 1)
+
+values = [ cnt, (3 * cnt)[0:32], Const(0x12345678, 32), Cat(Const(0, 4), cnt[4:32]), cnt[16:32] ]
+
+snapshot = Snapshot(values)
+m.submodules += snapshot
+
+regs = [ snapshot.control_reg, snapshot.mask_reg, snapshot.seq_reg ] + snapshot.value_regs
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(read_monitor_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import TestDataSource
+from axi_writer import AXIWriter
+from stream_crc import StreamCRC, crc32_words
+
+DMA_ADDR_REG =        0x40000000
+DMA_COUNT_REG =       0x40000004
+DMA_STATUS_REG =      0x40000008
+DMA_CONTROL_REG =     0x4000000C
+DMA_CONFIG_REG =      0x40000010
+DMA_INT_STATUS_REG =  0x40000014
+
+DS_DATA_REG =         0x40000018
+DS_COUNT_REG =        0x4000001C
+DS_STATUS_REG =       0x40000020
+DS_CONTROL_REG =      0x40000024
+
+CRC_CONTROL_REG =     0x40000028
+CRC_CRC_REG =         0x4000002C
+CRC_BYTES_REG =       0x40000030
+
+# Python dictionary backing the simulated memory
+memory = dict()
+
+# Probability of a stall on the write channels of the memory bus
+stall = None
+
+def test_process():
+    global stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    # CRC register after reset is the CRC of no data
+    axi_transact = [
+        TRead(CRC_CRC_REG, exp_data=[ crc32_words([]), 0 ], exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    for s in (None, 0.3):
+        stall = s
+        for num_words in (1, 2, 17, 1000):
+            yield from crc_test(0x50000000 + 8*random.randrange(0, 512), num_words)
+
+    # without CLEAR, the CRC continues over several transfers
+    stall = None
+    start = random.randrange(2**32)
+    yield from crc_test(0x50000000, 100, start=start)
+    yield from crc_test(0x50001000, 50, start=(start+200) & 0xFFFFFFFF, clear=False, prev=[ (0x50000000, 100) ])
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def crc_test(addr, num_words, start=None, clear=True, prev=[]):
+    if start is None:
+        start = random.randrange(2**32)
+
+    if clear:
+        memory.clear()
+        axi_transact = [
+            TWrite(CRC_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+        ]
+        yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    axi_transact = [
+        TWrite(DMA_ADDR_REG, addr, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONFIG_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_DATA_REG, start, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield axi_writer.int_out) == 0):
+        yield Tick()
+
+    # CRC of the memory written by the DMA
+    words = []
+    for (a, n) in prev + [ (addr, num_words) ]:
+        words += [ memory.get(a+8*i, 0) for i in range(0, n) ]
+    exp_crc = crc32_words(words)
+
+    # CRC of the data generated by the test data source
+    data = [ ((start+2*i+1) & 0xFFFFFFFF) << 32 | ((start+2*i) & 0xFFFFFFFF) for i in range(0, num_words) ]
+    if clear and crc32_words(data) != exp_crc:
+        print("Error: memory content mismatch")
+
+    axi_transact = [
+        TRead(DMA_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY),
+        TRead(CRC_CRC_REG, exp_data=[ exp_crc, 8*len(words) ], exp_resp=AXI3Response.OKAY),
+        TWrite(DMA_INT_STATUS_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact[:2], delay=0)
+    yield from axi_write(axi_reg_bus, axi_transact[2:], delay=0)
+
+    print("stall=%s, %d words: CRC 0x%08x" % (str(stall), len(words), exp_crc))
+
+def mem_sim_process():
+    yield from axi_mem_sim(axi_mem_bus, memory, stall=lambda: stall or 0.0)
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# AXI bus for AXI writer to access memory
+axi_mem_bus = AXI3Bus(data_bits=64)
+
+# AXI bus to control AXI writer, data source and CRC
+axi_reg_bus = AXI3Bus()
+
+# FIFO used to feed data into AXI writer
+data_fifo = SyncFIFO(width=64, depth=4)
+
+m = Module()
+m.submodules += data_fifo
+
+data_source = TestDataSource(data_fifo)
+m.submodules += data_source
+
+axi_writer = AXIWriter(axi_mem_bus, data_fifo)
+m.submodules += axi_writer
+
+stream_crc = StreamCRC()
+m.submodules += stream_crc
+
+m.d.comb += stream_crc.data_in.eq(data_fifo.r_data)
+m.d.comb += stream_crc.valid_in.eq(data_fifo.r_en & data_fifo.r_rdy)
+
+regs = [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg,
+         axi_writer.config_reg, axi_writer.int_status_reg ]
+
+regs += [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg ]
+
+regs += [ stream_crc.control_reg, stream_crc.crc_reg, stream_crc.bytes_reg ]
+
+axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+m.submodules += axi_reg_bank
+
+sim = Simulator(m)
+sim.add_clock(1e-6)
+sim.add_sync_process(mem_sim_process)
+sim.add_sync_process(test_process)
+with sim.write_vcd("sim.vcd"):
+    sim.run()
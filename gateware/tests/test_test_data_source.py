@@ -0,0 +1,241 @@
+#!/usr/bin/python3
+import random
+import sys
+import os.path
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.sim import *
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from axi import *
+from axi_sim import *
+from axi_reg_bank import AXIRegBank
+from test_data_source import *
+
+DS_DATA_REG =         0x40000000
+DS_COUNT_REG =        0x40000004
+DS_STATUS_REG =       0x40000008
+DS_CONTROL_REG =      0x4000000C
+DS_PATTERN_REG =      0x40000010
+DS_THROTTLE_REG =     0x40000014
+DS_LINE_REG =         0x40000018
+DS_FRAME_REG =        0x4000001C
+
+# Probability of a stall on the read side of the FIFO
+stall = 0.0
+
+# Cycle counter, and (cycle, word) of each word written into the FIFO
+cycle = 0
+writes = []
+
+def test_process():
+    global stall
+
+    yield axi_reg_bus.areset_n.eq(1)
+
+    if fifo_words > 1:
+        yield from wide_test()
+        return
+
+    for s in (0.0, 0.3):
+        stall = s
+
+        # patterns at full speed
+        for pattern in (PATTERN_RAMP, PATTERN_LFSR):
+            for num_words in (1, 2, 100):
+                yield from source_test(pattern, num_words)
+
+        # throttle: 1 word in 4 cycles, 3 words in 8 cycles, 5 words in 5
+        # cycles (no effect)
+        for (period, words) in ((4, 1), (8, 3), (5, 5)):
+            yield from source_test(PATTERN_RAMP, 100, period=period, words=words)
+
+        # frames with and without blanking, several frames per transfer
+        yield from source_test(PATTERN_FRAME, 60, line_words=5, n_lines=4)
+        yield from source_test(PATTERN_FRAME, 60, line_words=5, n_lines=4, h_blank=3, v_blank=10)
+        yield from source_test(PATTERN_FRAME, 100, line_words=8, n_lines=2, h_blank=2, v_blank=7, period=3, words=2)
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def wide_test():
+    """Several words per FIFO entry (counts in entries for throttle and
+    blanking)"""
+    global stall
+
+    for s in (0.0, 0.3):
+        stall = s
+
+        for pattern in (PATTERN_RAMP, PATTERN_LFSR):
+            for num_words in (1, fifo_words, fifo_words+1, 100):
+                yield from source_test(pattern, num_words)
+
+        yield from source_test(PATTERN_RAMP, 100, period=4, words=1)
+        yield from source_test(PATTERN_FRAME, 64, line_words=2*fifo_words, n_lines=4, h_blank=3, v_blank=10)
+
+    for _ in range(0, 10):
+        yield Tick()
+
+def source_test(pattern, num_words, period=0, words=0, line_words=1, n_lines=1, h_blank=0, v_blank=0):
+    if pattern == PATTERN_LFSR:
+        data = random.randrange(1, 2**32)
+    else:
+        data = random.randrange(2**32)
+
+    axi_transact = [
+        TWrite(DS_DATA_REG, data, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_COUNT_REG, num_words-1, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_PATTERN_REG, pattern, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_THROTTLE_REG, words << 16 | period, exp_resp=AXI3Response.OKAY),
+        TWrite(DS_LINE_REG, h_blank << 16 | (line_words-1), exp_resp=AXI3Response.OKAY),
+        TWrite(DS_FRAME_REG, v_blank << 16 | (n_lines-1), exp_resp=AXI3Response.OKAY),
+        TRead(DS_PATTERN_REG, exp_data=pattern, exp_resp=AXI3Response.OKAY),
+        TRead(DS_THROTTLE_REG, exp_data=words << 16 | period, exp_resp=AXI3Response.OKAY),
+        TRead(DS_LINE_REG, exp_data=[ h_blank << 16 | (line_words-1), v_blank << 16 | (n_lines-1) ], exp_resp=AXI3Response.OKAY),
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact[:6], delay=0)
+    yield from axi_read(axi_reg_bus, axi_transact[6:], delay=0)
+
+    writes.clear()
+
+    axi_transact = [
+        TWrite(DS_CONTROL_REG, 0x1, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_write(axi_reg_bus, axi_transact, delay=0)
+
+    while ((yield data_source.status_reg.data_out) & 0x1) == 1:
+        yield Tick()
+
+    axi_transact = [
+        TRead(DS_STATUS_REG, exp_data=0, exp_resp=AXI3Response.OKAY)
+    ]
+    yield from axi_read(axi_reg_bus, axi_transact, delay=0)
+
+    # the last entry is filled up with further words of the pattern
+    num_entries = (num_words + fifo_words - 1) // fifo_words
+    exp_words = pattern_words(pattern, data, num_entries*fifo_words, line_words, n_lines)
+    got_words = [ (w >> 64*j) & (2**64-1) for (_, w) in writes for j in range(0, fifo_words) ]
+    if got_words != exp_words:
+        print("Error: data mismatch (pattern %d, %d words, %d words per entry)" % (pattern, num_words, fifo_words))
+        return
+
+    # timing in entries
+    (num_words, line_words) = (num_entries, max(1, line_words // fifo_words))
+
+    # Cycles of the writes, relative to the first one
+    cycles = [ c - writes[0][0] for (c, _) in writes ]
+
+    # Throttle: at most `words' words in each period (the first word is
+    # written in the first cycle of a period)
+    if period != 0:
+        for p in range(0, cycles[-1]//period + 1):
+            n = len([ c for c in cycles if p*period <= c < (p+1)*period ])
+            if n > words:
+                print("Error: %d words in throttle period %d (pattern %d, %d/%d)" % (n, p, pattern, words, period))
+                break
+
+    # Blanking: idle cycles after each line and frame
+    for i in range(1, num_words):
+        if i % line_words == 0:
+            blank = v_blank if (i // line_words) % n_lines == 0 else h_blank
+            if cycles[i] - cycles[i-1] <= blank:
+                print("Error: blanking too short after word %d (pattern %d)" % (i-1, pattern))
+                break
+
+    # Without stalls, the timing is exact
+    if stall == 0.0:
+        exp_cycles = pattern_cycles(num_words, period, words, line_words, n_lines, h_blank, v_blank)
+        if cycles != exp_cycles:
+            print("Error: timing mismatch (pattern %d, %d words)" % (pattern, num_words))
+
+    print("pattern %d, %d entries of %d words, stall=%.1f, throttle %d/%d, blank %d/%d: %d cycles" %
+        (pattern, num_words, fifo_words, stall, words, period, h_blank, v_blank, cycles[-1] + 1))
+
+def pattern_cycles(num_words, period, words, line_words, n_lines, h_blank, v_blank):
+    """Cycles of the writes, relative to the first one, if the FIFO never stalls"""
+    cycles = []
+    (c, blank, t_words) = (0, 0, 0)
+    while len(cycles) < num_words:
+        if blank == 0 and (period == 0 or t_words < words):
+            cycles.append(c)
+            t_words += 1
+            n_line = len(cycles) // line_words
+            if len(cycles) % line_words == 0:
+                blank = v_blank if n_line % n_lines == 0 else h_blank
+        elif blank != 0:
+            blank -= 1
+        c += 1
+        if period != 0 and c % period == 0:
+            t_words = 0
+    return cycles
+
+def fifo_process():
+    """Reads words from the FIFO, stalling randomly"""
+    yield Passive()
+
+    while True:
+        yield data_fifo.r_en.eq(random.random() >= stall)
+        yield Tick()
+
+def monitor_process():
+    """Records the words written into the FIFO"""
+    global cycle
+    yield Passive()
+
+    while True:
+        if (yield data_fifo.w_en) == 1 and (yield data_fifo.w_rdy) == 1:
+            writes.append((cycle, (yield data_fifo.w_data)))
+        yield Tick()
+        cycle += 1
+
+if len(sys.argv) > 1:
+    seed = int(sys.argv[1])
+else:
+    seed = random.randrange(2**32)
+
+print("seed = %d" % seed)
+
+random.seed(seed)
+
+# Reference model
+if pattern_words(PATTERN_RAMP, 0xFFFFFFFF, 2) != [ 0x00000000FFFFFFFF, 0x0000000200000001 ]:
+    print("Error: reference model (ramp)")
+
+if pattern_words(PATTERN_FRAME, 7, 5, line_words=2, n_lines=2) != [ 7 << 32, 7 << 32 | 1, 7 << 32 | 1 << 16, 7 << 32 | 1 << 16 | 1, 8 << 32 ]:
+    print("Error: reference model (frame)")
+
+state = 1
+for _ in range(0, 2**16):
+    state = lfsr32_next(state)
+    if state == 1:
+        print("Error: reference model (LFSR period too short)")
+        break
+
+# 64 bit FIFO, and FIFO with 4 words per entry
+for fifo_words in (1, 4):
+    # AXI bus to control the data source
+    axi_reg_bus = AXI3Bus()
+
+    # FIFO fed by the data source
+    data_fifo = SyncFIFO(width=64*fifo_words, depth=4)
+
+    m = Module()
+    m.submodules += data_fifo
+
+    data_source = TestDataSource(data_fifo)
+    m.submodules += data_source
+
+    regs = [ data_source.data_reg, data_source.count_reg, data_source.status_reg, data_source.control_reg,
+             data_source.pattern_reg, data_source.throttle_reg, data_source.line_reg, data_source.frame_reg ]
+
+    axi_reg_bank = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+    m.submodules += axi_reg_bank
+
+    sim = Simulator(m)
+    sim.add_clock(1e-6)
+    sim.add_sync_process(fifo_process)
+    sim.add_sync_process(monitor_process)
+    sim.add_sync_process(test_process)
+    with sim.write_vcd("sim.vcd"):
+        sim.run()
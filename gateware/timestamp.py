@@ -0,0 +1,52 @@
+from nmigen import *
+
+class Timestamp_LowReg:
+    """Timestamp: low register (read-only)
+
+    Bits 31-0 of the timestamp counter.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class Timestamp_HighReg:
+    """Timestamp: high register (read-only)
+
+    Bits 63-32 of the timestamp counter.
+
+    The two halves of the counter cannot be read at the same time. To get a
+    consistent value, read the high register, the low register and the high
+    register again, and repeat if the two values of the high register
+    differ.
+    """
+    def __init__(self):
+        self.data_in = Signal(32)
+        self.wstrb_in = Signal(4)
+        self.data_out = Signal(32)
+
+class Timestamp(Elaboratable):
+    """Timestamp
+
+    64 bit free-running counter of `sync' clock cycles, counting from 0 after
+    reset. It does not wrap around in practice (more than 5000 years at 100
+    MHz), so it can be used as a common time base for all timestamps in the
+    gateware (see value).
+    """
+    def __init__(self):
+        # Registers
+        self.low_reg = Timestamp_LowReg()
+        self.high_reg = Timestamp_HighReg()
+
+        # Current counter value
+        self.value = Signal(64)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.d.sync += self.value.eq(self.value + 1)
+
+        m.d.comb += self.low_reg.data_out.eq(self.value[0:32])
+        m.d.comb += self.high_reg.data_out.eq(self.value[32:64])
+
+        return m
@@ -1,13 +1,51 @@
 from nmigen import *
-from nmigen.lib.fifo import SyncFIFO
+from nmigen.lib.fifo import SyncFIFO, AsyncFIFO
 import axi
 from axi_reg_bank import AXIRegBank, Register_RO, Register_RW
-from int_ctrl import IntCtrl
+from int_ctrl import IntCtrl, VecIntCtrl
 from test_data_source import TestDataSource
+from test_data_sink import TestDataSink
 from axi_writer import AXIWriter
+from axi_stripe_writer import AXIStripeWriter
+from axi_reader import AXIReader
+from fifo_monitor import FIFOMonitor
+from dma_perf import DMAPerf
+from stream_crc import StreamCRC
+from snapshot import Snapshot
+from axi_latency import AXIWriteLatency
+from timestamp import Timestamp
 from ps7 import PS7
 
 class Top(Elaboratable):
+    """Top level
+
+    n_dma_ports -- number of HP ports used by the DMA writer. 1: AXI writer on
+        HP0. 2 or 4: AXI stripe writer on HP0 - HP1 or HP0 - HP3. The data
+        source and the FIFO provide one 64 bit word per port and cycle.
+    fifo_depth -- depth of the asynchronous FIFO between the data source
+        (`pix' clock domain) and the DMA writer (power of 2, in entries of
+        n_dma_ports words). The FIFO is implemented in block RAM and absorbs
+        stalls of the HP ports.
+    read_dma -- True to include the read DMA (AXI reader and test data
+        sink). The reader gets an HP port of its own (HP1 with one DMA port,
+        HP2 with two), so it does not compete with the writer for a port.
+        With four DMA ports, no HP port is left, so read_dma must be False;
+        the registers of the reader and the data sink then read as 0.
+    """
+    def __init__(self, n_dma_ports=1, fifo_depth=512, read_dma=None):
+        if not n_dma_ports in (1, 2, 4):
+            raise ValueError("n_dma_ports must be 1, 2, or 4")
+        if fifo_depth < 4 or fifo_depth & (fifo_depth-1) != 0:
+            raise ValueError("fifo_depth must be a power of 2 and at least 4")
+        if read_dma is None:
+            read_dma = n_dma_ports < 4
+        if read_dma and n_dma_ports == 4:
+            raise ValueError("the read DMA needs an HP port of its own, use read_dma=False with 4 DMA ports")
+
+        self.n_dma_ports = n_dma_ports
+        self.fifo_depth = fifo_depth
+        self.read_dma = read_dma
+
     def elaborate(self, platform):
         m = Module()
 
@@ -26,6 +64,16 @@ class Top(Elaboratable):
 
         platform.add_clock_constraint(clk_, 100000000)
 
+        # Pixel clock (provided by PS7), for the data source of the DMA writer
+        m.domains.pix = ClockDomain("pix")
+        pix_clk = ClockSignal("pix")
+        m.d.comb += pix_clk.eq(ps7.fclk[1])
+
+        pix_clk_ = Signal()
+        m.d.comb += pix_clk_.eq(pix_clk)
+
+        platform.add_clock_constraint(pix_clk_, 100000000)
+
         # ZedBoard platform
         led = [ platform.request("led", i) for i in range(0, 8) ]
         switch = [ platform.request("switch", i) for i in range(0, 8) ]
@@ -34,9 +82,20 @@ class Top(Elaboratable):
         axi_reg_bus = ps7.m_axi_gp0
         m.d.comb += axi_reg_bus.aclk.eq(clk)
 
-        # AXI bus for writer to access main memory (gateware is master)
-        axi_mem_bus = ps7.s_axi_hp0
-        m.d.comb += axi_mem_bus.aclk.eq(clk)
+        # AXI buses for writer to access main memory (gateware is master)
+        for bus in ps7.s_axi_hp:
+            m.d.comb += bus.aclk.eq(clk)
+
+        axi_mem_buses = ps7.s_axi_hp[0:self.n_dma_ports]
+
+        # AXI bus for coherent writer to access main memory through the ACP
+        # (gateware is master)
+        axi_acp_bus = ps7.s_axi_acp
+        m.d.comb += axi_acp_bus.aclk.eq(clk)
+
+        # AXI bus for reader to access main memory (gateware is master), the
+        # first HP port not used by the writer
+        axi_rd_bus = ps7.s_axi_hp[self.n_dma_ports] if self.read_dma else None
 
         # Synchronize switch input to `sync' clock
         sw_tmp1 = Signal(len(switch))
@@ -48,8 +107,17 @@ class Top(Elaboratable):
         m.d.sync += sw_tmp2.eq(sw_tmp1)
         m.d.sync += sw_data.eq(sw_tmp2)
 
-        # Interrupt
-        int_ctrl = IntCtrl()
+        # Timer
+        # (low 32 bits of the 64 bit timestamp, which is also used for the
+        # timestamps of the DMA writers and the interrupt event log)
+        timestamp = Timestamp()
+        m.submodules += timestamp
+
+        timer_sync = timestamp.value[0:32]
+
+        # Interrupt (the event log records the new switch state with each
+        # change)
+        int_ctrl = IntCtrl(timestamp=timestamp.value)
         m.submodules += int_ctrl
 
         sw_last = Signal(len(switch))
@@ -60,38 +128,136 @@ class Top(Elaboratable):
         with m.Else():
             m.d.sync += int_ctrl.int_req_in.eq(0)
 
+        m.d.comb += int_ctrl.event_payload_in.eq(sw_last)
         m.d.comb += ps7.irqf2p[0].eq(int_ctrl.int_pending_out)
         m.d.comb += led[1].o.eq(int_ctrl.int_pending_out)
 
-        # Timer
-        timer_sync = Signal(32)
-        m.d.sync += timer_sync.eq(timer_sync+1)
-
-        # DMA
-        fifo = SyncFIFO(width=64, depth=4)
+        # DMA (data source in `pix' clock domain)
+        fifo = AsyncFIFO(width=64*self.n_dma_ports, depth=self.fifo_depth, r_domain="sync", w_domain="pix")
         m.submodules += fifo
 
-        data_source = TestDataSource(fifo)
+        data_source = TestDataSource(fifo, domain="pix")
         m.submodules += data_source
 
-        axi_writer = AXIWriter(axi_mem_bus, fifo)
+        if self.n_dma_ports == 1:
+            axi_writer = AXIWriter(axi_mem_buses[0], fifo, timestamp=timestamp.value)
+        else:
+            axi_writer = AXIStripeWriter(axi_mem_buses, fifo)
         m.submodules += axi_writer
 
         m.d.comb += ps7.irqf2p[1].eq(axi_writer.int_out)
 
-        # Transaction counters (memory bus)
+        # Read DMA
+        if self.read_dma:
+            rd_fifo = SyncFIFO(width=64, depth=4)
+            m.submodules += rd_fifo
+
+            axi_reader = AXIReader(axi_rd_bus, rd_fifo)
+            m.submodules += axi_reader
+
+            data_sink = TestDataSink(rd_fifo)
+            m.submodules += data_sink
+
+            m.d.comb += ps7.irqf2p[2].eq(axi_reader.int_out)
+
+        # Coherent DMA (ACP) for small transfers
+        acp_fifo = SyncFIFO(width=64, depth=4)
+        m.submodules += acp_fifo
+
+        acp_data_source = TestDataSource(acp_fifo)
+        m.submodules += acp_data_source
+
+        acp_writer = AXIWriter(axi_acp_bus, acp_fifo, coherent=True, timestamp=timestamp.value)
+        m.submodules += acp_writer
+
+        m.d.comb += ps7.irqf2p[3].eq(acp_writer.int_out)
+
+        # Vectored interrupt controller (IRQF2P lines 4-7), sources: switch
+        # change, AXI writer, AXI reader, ACP writer (rising edge of the
+        # interrupt outputs)
+        vec_int_ctrl = VecIntCtrl(4, n_lines=4)
+        m.submodules += vec_int_ctrl
+
+        vec_int_last = Signal(3)
+        vec_int_lines = Cat(axi_writer.int_out, axi_reader.int_out if self.read_dma else Const(0, 1), acp_writer.int_out)
+        m.d.sync += vec_int_last.eq(vec_int_lines)
+
+        m.d.comb += vec_int_ctrl.int_req_in.eq(Cat(int_ctrl.int_req_in, vec_int_lines & ~vec_int_last))
+        m.d.comb += ps7.irqf2p[4:8].eq(vec_int_ctrl.int_out)
+
+        # Transaction counters (memory bus, all HP ports used by the writer)
         cnt_mem_aw = Signal(32)
         cnt_mem_w = Signal(32)
         cnt_mem_b = Signal(32)
 
-        with m.If((axi_mem_bus.awvalid == 1) & (axi_mem_bus.awready == 1)):
-            m.d.sync += cnt_mem_aw.eq(cnt_mem_aw + 1)
+        m.d.sync += cnt_mem_aw.eq(cnt_mem_aw + sum([ bus.awvalid & bus.awready for bus in axi_mem_buses ]))
+        m.d.sync += cnt_mem_w.eq(cnt_mem_w + sum([ bus.wvalid & bus.wready for bus in axi_mem_buses ]))
+        m.d.sync += cnt_mem_b.eq(cnt_mem_b + sum([ bus.bvalid & bus.bready for bus in axi_mem_buses ]))
 
-        with m.If((axi_mem_bus.wvalid == 1) & (axi_mem_bus.wready == 1)):
-            m.d.sync += cnt_mem_w.eq(cnt_mem_w + 1)
+        # Fill level telemetry for the DMA data FIFO
+        fifo_monitor = FIFOMonitor(fifo, w_domain="pix")
+        m.submodules += fifo_monitor
 
-        with m.If((axi_mem_bus.bvalid == 1) & (axi_mem_bus.bready == 1)):
-            m.d.sync += cnt_mem_b.eq(cnt_mem_b + 1)
+        m.d.comb += fifo_monitor.r_req_in.eq(axi_writer.data_req_out)
+
+        # CRC of the data taken from the DMA data FIFO by the writer (whole
+        # FIFO entries, i.e. including the words that fill up the last entry
+        # with several DMA ports)
+        dma_crc = StreamCRC(width=64*self.n_dma_ports)
+        m.submodules += dma_crc
+
+        m.d.comb += dma_crc.data_in.eq(fifo.r_data)
+        m.d.comb += dma_crc.valid_in.eq(fifo.r_en & fifo.r_rdy)
+
+        # Performance counters (DMA writer and ACP writer)
+        # NOTE: bit 0 of the writer status register is BUSY
+        dma_perf = DMAPerf(axi_mem_buses)
+        m.submodules += dma_perf
+
+        m.d.comb += dma_perf.busy_in.eq(axi_writer.status_reg.data_out[0])
+        m.d.comb += dma_perf.data_stall_in.eq(axi_writer.data_req_out & ~fifo.r_rdy)
+
+        acp_perf = DMAPerf([ axi_acp_bus ])
+        m.submodules += acp_perf
+
+        m.d.comb += acp_perf.busy_in.eq(acp_writer.status_reg.data_out[0])
+        m.d.comb += acp_perf.data_stall_in.eq(acp_writer.data_req_out & ~acp_fifo.r_rdy)
+
+        # Write latency histogram (HP0)
+        hp0_latency = AXIWriteLatency(axi_mem_buses[0])
+        m.submodules += hp0_latency
+
+        # Write data counters (per HP port)
+        cnt_hp_w = [ Signal(32) for _ in ps7.s_axi_hp ]
+
+        for (cnt, bus) in zip(cnt_hp_w, ps7.s_axi_hp):
+            with m.If((bus.wvalid == 1) & (bus.wready == 1)):
+                m.d.sync += cnt.eq(cnt + 1)
+
+        # Transaction counters (read DMA bus)
+        cnt_rd_ar = Signal(32)
+        cnt_rd_r = Signal(32)
+
+        if self.read_dma:
+            with m.If((axi_rd_bus.arvalid == 1) & (axi_rd_bus.arready == 1)):
+                m.d.sync += cnt_rd_ar.eq(cnt_rd_ar + 1)
+
+            with m.If((axi_rd_bus.rvalid == 1) & (axi_rd_bus.rready == 1)):
+                m.d.sync += cnt_rd_r.eq(cnt_rd_r + 1)
+
+        # Snapshot of the counters and status values
+        # NOTE: the order of the values is the order of the value registers
+        snapshot = Snapshot([
+            timestamp.value[0:32], timestamp.value[32:64],
+            cnt_mem_aw, cnt_mem_w, cnt_mem_b, cnt_rd_ar, cnt_rd_r,
+            int_ctrl.status_reg.data_out, int_ctrl.count_reg.data_out,
+            axi_writer.status_reg.data_out, acp_writer.status_reg.data_out,
+            fifo_monitor.level_reg.data_out, fifo_monitor.high_water_reg.data_out,
+            fifo_monitor.overflow_count_reg.data_out, fifo_monitor.underflow_count_reg.data_out,
+            dma_perf.busy_cycles_reg.data_out, dma_perf.bytes_reg.data_out,
+            acp_perf.busy_cycles_reg.data_out, acp_perf.bytes_reg.data_out
+        ])
+        m.submodules += snapshot
 
         regs = []
 
@@ -150,7 +316,250 @@ class Top(Elaboratable):
         # Register #25 (0x40000064): AXI writer: interrupt status register
         regs += [ axi_writer.addr_reg, axi_writer.count_reg, axi_writer.status_reg, axi_writer.control_reg, axi_writer.config_reg, axi_writer.int_status_reg ]
 
-        axi_slave = AXIRegBank(axi_reg_bus, regs, 0x40000000)
+        # Register #26 (0x40000068): AXI writer: descriptor address register
+        # Register #27 (0x4000006C): AXI writer: completion count register
+        # Register #28 (0x40000070): AXI writer: ring slots register
+        # Register #29 (0x40000074): AXI writer: ring write pointer register
+        # (not available with the AXI stripe writer, read as 0)
+        if self.n_dma_ports == 1:
+            regs += [ axi_writer.desc_addr_reg, axi_writer.done_count_reg, axi_writer.ring_slots_reg, axi_writer.ring_wr_ptr_reg ]
+        else:
+            for i in range(0, 4):
+                reg = Register_RO(0)
+                regs.append(reg)
+                m.submodules += reg
+
+        # Register #30 (0x40000078): interrupt coalescing: event threshold register
+        # Register #31 (0x4000007C): interrupt coalescing: timeout register
+        # Register #32 (0x40000080): interrupt coalescing: merged events register
+        regs += [ int_ctrl.coalesce_count_reg, int_ctrl.coalesce_time_reg, int_ctrl.coalesce_merged_reg ]
+
+        # Register #33 (0x40000084): AXI writer: interrupt coalescing: event threshold register
+        # Register #34 (0x40000088): AXI writer: interrupt coalescing: timeout register
+        # Register #35 (0x4000008C): AXI writer: interrupt coalescing: merged events register
+        regs += [ axi_writer.int_coalesce_count_reg, axi_writer.int_coalesce_time_reg, axi_writer.int_coalesce_merged_reg ]
+
+        # Register #36 (0x40000090): AXI reader: address register
+        # Register #37 (0x40000094): AXI reader: count register
+        # Register #38 (0x40000098): AXI reader: status register
+        # Register #39 (0x4000009C): AXI reader: control register
+        # Register #40 (0x400000A0): AXI reader: config register
+        # Register #41 (0x400000A4): AXI reader: interrupt status register
+        # Register #42 (0x400000A8): AXI reader: interrupt coalescing: event threshold register
+        # Register #43 (0x400000AC): AXI reader: interrupt coalescing: timeout register
+        # Register #44 (0x400000B0): AXI reader: interrupt coalescing: merged events register
+        # Register #45 (0x400000B4): test data sink: data register
+        # Register #46 (0x400000B8): test data sink: count register
+        # Register #47 (0x400000BC): test data sink: error count register
+        # Register #48 (0x400000C0): test data sink: control register
+        # (not available without the read DMA, read as 0)
+        if self.read_dma:
+            regs += [ axi_reader.addr_reg, axi_reader.count_reg, axi_reader.status_reg, axi_reader.control_reg, axi_reader.config_reg, axi_reader.int_status_reg ]
+            regs += [ axi_reader.int_coalesce_count_reg, axi_reader.int_coalesce_time_reg, axi_reader.int_coalesce_merged_reg ]
+            regs += [ data_sink.data_reg, data_sink.count_reg, data_sink.error_count_reg, data_sink.control_reg ]
+        else:
+            for i in range(0, 13):
+                reg = Register_RO(0)
+                regs.append(reg)
+                m.submodules += reg
+
+        # Register #49 (0x400000C4): memory read address count (read DMA bus)
+        reg = Register_RO(cnt_rd_ar)
+        regs.append(reg)
+        m.submodules += reg
+
+        # Register #50 (0x400000C8): memory read data count (read DMA bus)
+        reg = Register_RO(cnt_rd_r)
+        regs.append(reg)
+        m.submodules += reg
+
+        # Register #51 (0x400000CC): memory write data count (HP0)
+        # Register #52 (0x400000D0): memory write data count (HP1)
+        # Register #53 (0x400000D4): memory write data count (HP2)
+        # Register #54 (0x400000D8): memory write data count (HP3)
+        for cnt in cnt_hp_w:
+            reg = Register_RO(cnt)
+            regs.append(reg)
+            m.submodules += reg
+
+        # Register #55 (0x400000DC): ACP writer: address register
+        # Register #56 (0x400000E0): ACP writer: count register
+        # Register #57 (0x400000E4): ACP writer: status register
+        # Register #58 (0x400000E8): ACP writer: control register
+        # Register #59 (0x400000EC): ACP writer: config register
+        # Register #60 (0x400000F0): ACP writer: interrupt status register
+        # Register #61 (0x400000F4): ACP writer: descriptor address register
+        # Register #62 (0x400000F8): ACP writer: completion count register
+        # Register #63 (0x400000FC): ACP writer: ring slots register
+        # Register #64 (0x40000100): ACP writer: ring write pointer register
+        # Register #65 (0x40000104): ACP writer: interrupt coalescing: event threshold register
+        # Register #66 (0x40000108): ACP writer: interrupt coalescing: timeout register
+        # Register #67 (0x4000010C): ACP writer: interrupt coalescing: merged events register
+        regs += [ acp_writer.addr_reg, acp_writer.count_reg, acp_writer.status_reg, acp_writer.control_reg, acp_writer.config_reg, acp_writer.int_status_reg ]
+        regs += [ acp_writer.desc_addr_reg, acp_writer.done_count_reg, acp_writer.ring_slots_reg, acp_writer.ring_wr_ptr_reg ]
+        regs += [ acp_writer.int_coalesce_count_reg, acp_writer.int_coalesce_time_reg, acp_writer.int_coalesce_merged_reg ]
+
+        # Register #68 (0x40000110): ACP test data source: data register
+        # Register #69 (0x40000114): ACP test data source: count register
+        # Register #70 (0x40000118): ACP test data source: status register
+        # Register #71 (0x4000011C): ACP test data source: control register
+        regs += [ acp_data_source.data_reg, acp_data_source.count_reg, acp_data_source.status_reg, acp_data_source.control_reg ]
+
+        # Register #72 (0x40000120): AXI writer: line length register
+        # Register #73 (0x40000124): AXI writer: line count register
+        # Register #74 (0x40000128): AXI writer: line stride register
+        # (not available with the AXI stripe writer, read as 0)
+        if self.n_dma_ports == 1:
+            regs += [ axi_writer.line_len_reg, axi_writer.line_count_reg, axi_writer.line_stride_reg ]
+        else:
+            for i in range(0, 3):
+                reg = Register_RO(0)
+                regs.append(reg)
+                m.submodules += reg
+
+        # Register #75 (0x4000012C): ACP writer: line length register
+        # Register #76 (0x40000130): ACP writer: line count register
+        # Register #77 (0x40000134): ACP writer: line stride register
+        regs += [ acp_writer.line_len_reg, acp_writer.line_count_reg, acp_writer.line_stride_reg ]
+
+        # Register #78 (0x40000138): DMA data FIFO: fill level register
+        # Register #79 (0x4000013C): DMA data FIFO: high-water mark register
+        # Register #80 (0x40000140): DMA data FIFO: overflow count register
+        # Register #81 (0x40000144): DMA data FIFO: underflow count register
+        regs += [ fifo_monitor.level_reg, fifo_monitor.high_water_reg, fifo_monitor.overflow_count_reg, fifo_monitor.underflow_count_reg ]
+
+        # Register #82 (0x40000148): DMA writer performance counters: control register
+        # Register #83 (0x4000014C): DMA writer performance counters: busy cycles register
+        # Register #84 (0x40000150): DMA writer performance counters: write address stall register
+        # Register #85 (0x40000154): DMA writer performance counters: write data stall register
+        # Register #86 (0x40000158): DMA writer performance counters: data stall register
+        # Register #87 (0x4000015C): DMA writer performance counters: bytes register
+        # Register #88 (0x40000160): DMA writer performance counters: outstanding writes register
+        regs += [ dma_perf.control_reg, dma_perf.busy_cycles_reg, dma_perf.aw_stall_cycles_reg, dma_perf.w_stall_cycles_reg,
+                  dma_perf.data_stall_cycles_reg, dma_perf.bytes_reg, dma_perf.outstanding_reg ]
+
+        # Register #89 (0x40000164): ACP writer performance counters: control register
+        # Register #90 (0x40000168): ACP writer performance counters: busy cycles register
+        # Register #91 (0x4000016C): ACP writer performance counters: write address stall register
+        # Register #92 (0x40000170): ACP writer performance counters: write data stall register
+        # Register #93 (0x40000174): ACP writer performance counters: data stall register
+        # Register #94 (0x40000178): ACP writer performance counters: bytes register
+        # Register #95 (0x4000017C): ACP writer performance counters: outstanding writes register
+        regs += [ acp_perf.control_reg, acp_perf.busy_cycles_reg, acp_perf.aw_stall_cycles_reg, acp_perf.w_stall_cycles_reg,
+                  acp_perf.data_stall_cycles_reg, acp_perf.bytes_reg, acp_perf.outstanding_reg ]
+
+        # Register #96 (0x40000180): HP0 write latency: control register
+        # Register #97 (0x40000184): HP0 write latency: count register
+        # Register #98 (0x40000188): HP0 write latency: sum register
+        # Register #99 (0x4000018C): HP0 write latency: minimum register
+        # Register #100 (0x40000190): HP0 write latency: maximum register
+        # Register #101 - #108 (0x40000194 - 0x400001B0): HP0 write latency: histogram bin registers
+        regs += [ hp0_latency.control_reg, hp0_latency.count_reg, hp0_latency.sum_reg, hp0_latency.min_reg, hp0_latency.max_reg ]
+        regs += hp0_latency.bin_regs
+
+        # Register #109 (0x400001B4): timestamp: low register
+        # Register #110 (0x400001B8): timestamp: high register
+        regs += [ timestamp.low_reg, timestamp.high_reg ]
+
+        # Register #111 (0x400001BC): AXI writer: start time register (low)
+        # Register #112 (0x400001C0): AXI writer: start time register (high)
+        # Register #113 (0x400001C4): AXI writer: first data time register (low)
+        # Register #114 (0x400001C8): AXI writer: first data time register (high)
+        # Register #115 (0x400001CC): AXI writer: last response time register (low)
+        # Register #116 (0x400001D0): AXI writer: last response time register (high)
+        # (not available with the AXI stripe writer, read as 0)
+        if self.n_dma_ports == 1:
+            regs += [ axi_writer.start_time_lo_reg, axi_writer.start_time_hi_reg,
+                      axi_writer.first_data_time_lo_reg, axi_writer.first_data_time_hi_reg,
+                      axi_writer.last_resp_time_lo_reg, axi_writer.last_resp_time_hi_reg ]
+        else:
+            for i in range(0, 6):
+                reg = Register_RO(0)
+                regs.append(reg)
+                m.submodules += reg
+
+        # Register #117 (0x400001D4): ACP writer: start time register (low)
+        # Register #118 (0x400001D8): ACP writer: start time register (high)
+        # Register #119 (0x400001DC): ACP writer: first data time register (low)
+        # Register #120 (0x400001E0): ACP writer: first data time register (high)
+        # Register #121 (0x400001E4): ACP writer: last response time register (low)
+        # Register #122 (0x400001E8): ACP writer: last response time register (high)
+        regs += [ acp_writer.start_time_lo_reg, acp_writer.start_time_hi_reg,
+                  acp_writer.first_data_time_lo_reg, acp_writer.first_data_time_hi_reg,
+                  acp_writer.last_resp_time_lo_reg, acp_writer.last_resp_time_hi_reg ]
+
+        # Register #123 (0x400001EC): AXI writer: completion address register
+        # Register #124 (0x400001F0): AXI writer: completion slots register
+        # (not available with the AXI stripe writer, read as 0)
+        if self.n_dma_ports == 1:
+            regs += [ axi_writer.comp_addr_reg, axi_writer.comp_slots_reg ]
+        else:
+            for i in range(0, 2):
+                reg = Register_RO(0)
+                regs.append(reg)
+                m.submodules += reg
+
+        # Register #125 (0x400001F4): ACP writer: completion address register
+        # Register #126 (0x400001F8): ACP writer: completion slots register
+        regs += [ acp_writer.comp_addr_reg, acp_writer.comp_slots_reg ]
+
+        # Register #127 (0x400001FC): AXI writer: command status register
+        # Register #128 - #143 (0x40000200 - 0x4000023C): AXI writer: command address/count registers
+        # (not available with the AXI stripe writer, read as 0)
+        if self.n_dma_ports == 1:
+            regs += [ axi_writer.cmd_status_reg ] + axi_writer.cmd_regs
+        else:
+            for i in range(0, 17):
+                reg = Register_RO(0)
+                regs.append(reg)
+                m.submodules += reg
+
+        # Register #144 (0x40000240): ACP writer: command status register
+        # Register #145 - #160 (0x40000244 - 0x40000280): ACP writer: command address/count registers
+        regs += [ acp_writer.cmd_status_reg ] + acp_writer.cmd_regs
+
+        # Register #161 (0x40000284): DMA data CRC: control register
+        # Register #162 (0x40000288): DMA data CRC: CRC register
+        # Register #163 (0x4000028C): DMA data CRC: bytes register
+        regs += [ dma_crc.control_reg, dma_crc.crc_reg, dma_crc.bytes_reg ]
+
+        # Register #164 (0x40000290): DMA test data source: pattern register
+        # Register #165 (0x40000294): DMA test data source: throttle register
+        # Register #166 (0x40000298): DMA test data source: line register
+        # Register #167 (0x4000029C): DMA test data source: frame register
+        regs += [ data_source.pattern_reg, data_source.throttle_reg, data_source.line_reg, data_source.frame_reg ]
+
+        # Register #168 (0x400002A0): ACP test data source: pattern register
+        # Register #169 (0x400002A4): ACP test data source: throttle register
+        # Register #170 (0x400002A8): ACP test data source: line register
+        # Register #171 (0x400002AC): ACP test data source: frame register
+        regs += [ acp_data_source.pattern_reg, acp_data_source.throttle_reg, acp_data_source.line_reg,
+                  acp_data_source.frame_reg ]
+
+        # Register #172 (0x400002B0): snapshot: control register
+        # Register #173 (0x400002B4): snapshot: mask register
+        # Register #174 (0x400002B8): snapshot: sequence register
+        # Register #175 - #193 (0x400002BC - 0x40000304): snapshot: value registers
+        #   timestamp (low, high), memory write address/data/response count,
+        #   memory read address/data count (read DMA bus), interrupt status,
+        #   interrupt count, AXI writer status, ACP writer status, DMA FIFO
+        #   level/high-water mark/overflow count/underflow count, AXI writer
+        #   busy cycles/bytes, ACP writer busy cycles/bytes
+        regs += [ snapshot.control_reg, snapshot.mask_reg, snapshot.seq_reg ] + snapshot.value_regs
+
+        # Register #194 (0x40000308): vectored interrupt controller: enable register
+        # Register #195 (0x4000030C): vectored interrupt controller: pending register
+        # Register #196 (0x40000310): vectored interrupt controller: overflow register
+        # Register #197 - #200 (0x40000314 - 0x40000320): vectored interrupt controller: routing registers (lines 4-7)
+        regs += [ vec_int_ctrl.enable_reg, vec_int_ctrl.pending_reg, vec_int_ctrl.overflow_reg ] + vec_int_ctrl.route_regs
+
+        # Register #201 (0x40000324): interrupt event log: write count register
+        # Register #202 (0x40000328): interrupt event log: read count register
+        # Register #203 (0x4000032C): interrupt event log: lost events register
+        regs += [ int_ctrl.event_log.write_count_reg, int_ctrl.event_log.read_count_reg, int_ctrl.event_log.lost_reg ]
+
+        # Interrupt event log window (0x40001000 - 0x40001FFF, read-only)
+        axi_slave = AXIRegBank(axi_reg_bus, [ (0x0000, regs), (0x1000, int_ctrl.event_log.window) ], 0x40000000)
         m.submodules += axi_slave
 
         # Transaction counters (register bus)
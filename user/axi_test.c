@@ -262,6 +262,22 @@ int main(int argc, char *argv[])
             return -2;
         }
         printf("MEM_B_COUNT:  %u\n", ioc_arg.val);
+
+        ioc_arg.sr = XASR_INT_EVENT_LOST;
+        if(ioctl(fd, XAIOC_SR_READ, &ioc_arg) < 0) {
+            perror("ioctl");
+            close(fd);
+            return -2;
+        }
+        printf("INT_LOST:     %u\n", ioc_arg.val);
+
+        ioc_arg.sr = XASR_INT_EVENT_OVERRUN;
+        if(ioctl(fd, XAIOC_SR_READ, &ioc_arg) < 0) {
+            perror("ioctl");
+            close(fd);
+            return -2;
+        }
+        printf("INT_OVERRUN:  %u\n", ioc_arg.val);
     } else if(op == OP_TEST_REG) {
         struct xatest_test_result ioc_arg;
         if(ioctl(fd, XAIOC_TEST_SMALL, &ioc_arg) < 0) {
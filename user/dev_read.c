@@ -11,6 +11,12 @@
 
 #include <xrp_axi_test_api.h>
 
+void print_event(const struct xatest_event *ev)
+{
+    uint64_t timestamp = (uint64_t) ev->timestamp_hi << 32 | ev->timestamp;
+    printf("%02x (%llu, src %x)  ", ev->swdata, (unsigned long long) timestamp, ev->source);
+}
+
 int do_blocking_read()
 {
     int fd = open("/dev/xrp_axi_test", O_RDONLY);
@@ -33,7 +39,7 @@ int do_blocking_read()
         size_t n = ret/sizeof(struct xatest_event);
 
         for(size_t i=0; i<n; i++) {
-            printf("%02x (%u)  ", buf[i].swdata, buf[i].timestamp);
+            print_event(&buf[i]);
         }
         printf("\n");
     }
@@ -83,7 +89,7 @@ int do_nonblocking_read()
                 was_waiting = 0;
 
                 for(size_t i=0; i<n; i++) {
-                    printf("%02x (%u)  ", buf[i].swdata, buf[i].timestamp);
+                    print_event(&buf[i]);
                 }
             }
         }
@@ -148,7 +154,7 @@ int do_select()
             size_t n = r_ret/sizeof(struct xatest_event);
 
             for(size_t i=0; i<n; i++) {
-                printf("%02x (%u)  ", buf[i].swdata, buf[i].timestamp);
+                print_event(&buf[i]);
             }
             printf("\n");
         }